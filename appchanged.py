@@ -2,10 +2,142 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
+import io
 import os
-from functions import *
+import time
+from billing.db import DB_PATH
+from billing.crud import (get_table_data, insert_user, update_user, delete_user, insert_bill, update_bill,
+                          delete_bill, fetch_complete_bill, get_previous_billing_months, bill_tax_rates)
+from billing.table_query import count_rows, fetch_page
+from billing.aggregates import get_monthly_summary, get_flat_summary
+from billing.rates import (rate_cache, get_cached_table, get_gst_rates, get_electric_duty_rates, get_surcharge_rates,
+                           in_force_position,
+                           get_surcharge_data, upsert_gst_rate, upsert_electric_duty_rate, upsert_surcharge_rate)
+from billing.surcharges import get_surcharge_amounts, record_month_surcharges
+from billing.pdf_cache import get_bill_cache
+from billing.jobs import ACTIVE_STATUSES, OPERATIONS, JobRunner, latest_job
+from billing.schema import open_database
+from billing.writer import WriteQueue
+from billing import profiling
+
+# Pages that render PDFs, import CSVs or read/write Parquet import billing.bill_pdf (reportlab),
+# billing.reading_import and billing.archive (pyarrow) when first opened, not on every cold start.
+# Python keeps them in sys.modules, so later reruns of those pages don't pay for the import again.
+
+# Database connection pool, cached across Streamlit reruns. Lookup indexes, full-text search
+# indexes and billing summaries are created on first open, then kept current by triggers.
+@st.cache_resource
+def get_db():
+    return open_database()
+
+# Job results are written under the app's static folder so that, with server.enableStaticServing
+# (.streamlit/config.toml), the browser downloads them straight from disk
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+JOB_RESULTS_DIR = os.path.join(STATIC_DIR, "jobs")
+
+# Background job runner shared by every session; jobs left queued by a previous run are resumed.
+# Its Jobs table writes share the sessions' writer.
+@st.cache_resource
+def get_job_runner():
+    return JobRunner(get_db(), jobs_dir=JOB_RESULTS_DIR, writer=get_writer())
+
+# Single writer shared by every session: saves from concurrent admins are queued and committed
+# together by one thread instead of contending for SQLite's write lock
+@st.cache_resource
+def get_writer():
+    return WriteQueue(get_db())
+
+def submit_bill_job(operation, month, **params):
+    job_id, created = get_job_runner().submit(operation, month, **params)
+    if created:
+        st.success(f"✅ Job {job_id} queued for {month}.")
+    else:
+        st.info(f"ℹ️ Job {job_id} for {month} is already in progress.")
+
+# Status of the newest job for an operation and month, refreshed every 2 seconds
+@st.fragment(run_every=2)
+def show_job_panel(operation, month):
+    job = latest_job(get_db(), operation, month)
+    if job is None:
+        return
+    _, file_name, mime = OPERATIONS[operation]
+    if job["Status"] in ACTIVE_STATUSES:
+        fraction = job["Done"] / job["Total"] if job["Total"] else 0.0
+        st.progress(fraction, text=f"Job {job['JobID']} {job['Status'].lower()}: {job['Done']}/{job['Total'] or '?'} bills")
+    elif job["Status"] == "Failed":
+        st.error(f"Job {job['JobID']} failed: {job['Error']}")
+    elif job["ResultPath"] and os.path.exists(job["ResultPath"]):
+        label = f"Download {file_name.format(month=month)} (generated {job['FinishedAt']} UTC)"
+        relative_path = os.path.relpath(os.path.abspath(job["ResultPath"]), STATIC_DIR)
+        if st.get_option("server.enableStaticServing") and not relative_path.startswith(".."):
+            # Served by the web server from the file; the result never passes through this process
+            st.link_button(label, "app/static/" + relative_path.replace(os.sep, "/"))
+            return
+        st.download_button(
+            label=label,
+            data=lambda path=job["ResultPath"]: open(path, "rb").read(),  # read only when clicked
+            file_name=file_name.format(month=month),
+            mime=mime,
+            key=f"job_download_{operation}",
+        )
+
+# Bytes of a spooled export, read when its download button is clicked rather than on every rerun
+def read_export(export_file):
+    export_file.seek(0)
+    return export_file.read()
+
+# Debug panel: latency per instrumented call, this rerun's SQL count and the slowest statements
+def show_profiling_panel(container):
+    run = profiling.current_run()
+    snapshot = profiling.snapshot(slowest=10)
+    with container.expander("🛠️ Profiling", expanded=True):
+        if run:
+            st.caption(f"This rerun so far: {run['queries']} queries, {run['sql_seconds'] * 1000:.1f} ms SQL, "
+                       f"{run['seconds'] * 1000:.1f} ms total")
+        if snapshot["histograms"]:
+            st.dataframe(pd.DataFrame([
+                {"Call": name, "Count": h["count"], "Mean ms": h["total_seconds"] / h["count"] * 1000,
+                 "p95 ms ≤": h["p95_seconds"] * 1000, "Max ms": h["max_seconds"] * 1000}
+                for name, h in snapshot["histograms"].items()
+            ]), hide_index=True)
+        if snapshot["slowest_sql"]:
+            st.dataframe(pd.DataFrame([
+                {"Max ms": q["max"] * 1000, "Count": q["count"], "SQL": q["sql"][:200]} for q in snapshot["slowest_sql"]
+            ]), hide_index=True)
+        if snapshot["recent_runs"]:
+            st.dataframe(pd.DataFrame(snapshot["recent_runs"])[["queries", "sql_seconds", "seconds"]], hide_index=True)
+        col1, col2, col3 = st.columns(3)
+        col1.download_button("JSON", profiling.to_json(), file_name="billing_metrics.json", mime="application/json")
+        col2.download_button("Prometheus", profiling.to_prometheus(), file_name="billing_metrics.prom",
+                             mime="text/plain")
+        if col3.button("Reset"):
+            profiling.reset()
+
+# Later months re-billed because a corrected or back-filled reading changed their PreviousReading
+def show_rebilled(bill):
+    if bill and bill["Rebilled"]:
+        st.info(f"🔁 Re-billed with the corrected previous reading: {', '.join(bill['Rebilled'])}")
+
+# Paginated grid backed by a server-side query; only the visible page is read
+def show_paginated_table(table_name, filters=None, search=None, order_by=None, key="table"):
+    with get_db().connection() as conn:
+        total = count_rows(conn, table_name, filters, search)
+        if not total:
+            return 0
+        col1, col2 = st.columns(2)
+        with col1:
+            page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1, key=f"{key}_page_size")
+        page_count = -(-total // page_size)
+        with col2:
+            page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1, key=f"{key}_page")
+        page_df = fetch_page(conn, table_name, filters, search, order_by, page=page, page_size=page_size)
+    st.dataframe(page_df)
+    st.caption(f"Page {page} of {page_count} ({total} records)")
+    return total
+
 # Streamlit UI 
 st.set_page_config(page_title="Electricity Billing System", layout="wide")
+profiling.start_run()
 st.sidebar.title("⚡ Electricity Billing System")
 st.sidebar.markdown("---")  # Add a separator
 
@@ -16,14 +148,15 @@ menu_options = {
         "📊 Report Logs": ["User Directory"]
     },
     "📊 Billing Management": {
-        "Billing Operations": ["Enter Bill Record", "Update/Delete Bill Record"],
-        "Billing Actions": ["Generate Bill"],
-        "📊 Report Logs": ["Billing Records"]
+        "Billing Operations": ["Enter Bill Record", "Import Readings", "Update/Delete Bill Record"],
+        "Billing Actions": ["Generate Bill", "Archive Months"],
+        "📊 Report Logs": ["Billing Records", "Billing Summary"]
     },
     "⚡ Rate Management": {
         "GST": ["Set GST Rate", "Update GST Rate", "View GST Rate"],
         "Electric Duty": ["Set Electric Duty", "Update Electric Duty", "View Electric Duty"],
-        "Surcharge": ["Set Surcharge Rate", "Update Surcharge Rate", "View Surcharge Rate"]
+        "Surcharge": ["Set Surcharge Rate", "Update Surcharge Rate", "View Surcharge Rate"],
+        "What-If": ["Tariff What-If"]
     }
 }
 
@@ -43,6 +176,15 @@ selected_option = st.sidebar.radio("Menu", submenu_options)
 
 st.sidebar.markdown("---")  # Add a separator
 
+# Rate cache counters
+cache_stats = rate_cache.stats()
+st.sidebar.caption(f"🗃️ Rate cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%})")
+
+# Opt-in profiling (also on when BILLING_PROFILE=1); the panel is filled in after the page has run
+st.sidebar.toggle("🛠️ Profiling", value=profiling.enabled(), key="profiling_enabled",
+                  on_change=lambda: profiling.enable(st.session_state.profiling_enabled))
+profiling_panel = st.sidebar.container()
+
 # Main logic
 # User Management
 if selected_section == "👤 User Management":
@@ -55,14 +197,15 @@ if selected_section == "👤 User Management":
     load_sanctioned = st.number_input("Load Sanctioned (kW)", min_value=0.0, step=0.1)
     phase = st.selectbox("Phase", ["1-Phase", "3-Phase"], index=0)
     if st.button("✅ Add User"):
-        insert_user(person_id, name, flat_no, user_type, load_sanctioned, phase)
+        get_writer().call(insert_user, person_id, name, flat_no, user_type, load_sanctioned, phase)
+        rate_cache.invalidate(DB_PATH, "Users")
         st.success("User added successfully!")
 
  # Update or Delete User
   elif selected_option == "Update User" or selected_option == "Delete User":
     st.title("✏️ Update or 🗑️ Delete User")
     # Placeholder for fetching users
-    users_df = get_table_data("Users")
+    users_df = get_table_data(get_db(), "Users")
     if not users_df.empty:
         selected_user_id = st.selectbox("Select a User ID", users_df["PersonID"].tolist())
         user_data = users_df[users_df["PersonID"] == selected_user_id].iloc[0]
@@ -73,50 +216,44 @@ if selected_section == "👤 User Management":
         phase = st.selectbox("Phase", ["1-Phase", "3-Phase"], index=["1-Phase", "3-Phase"].index(user_data["Phase"]))
         
         if selected_option == "Update User" and st.button("✏️ Update User"):
-            update_user(selected_user_id, name, flat_no, user_type, load_sanctioned, phase)
+            get_writer().call(update_user, selected_user_id, name, flat_no, user_type, load_sanctioned, phase)
+            rate_cache.invalidate(DB_PATH, "Users")
             st.success("User updated successfully!")
         elif selected_option == "Delete User" and st.button("🗑️ Delete User"):
-            delete_user(selected_user_id)
+            get_writer().call(delete_user, selected_user_id)
+            rate_cache.invalidate(DB_PATH, "Users")
             st.warning("User deleted!")
     else:
         st.warning("No users found!")
  # Report Logs to view all users     and allowing searching by persno and name   
   elif selected_option == "User Directory":
+     from billing.archive import EXPORT_MIME_TYPES, table_batches, write_export
      st.title("📜 User Directory")
 
-     # Fetch Users Data
-     users_df = get_table_data("Users")
-
-     if not users_df.empty:
-        st.write("### 🔍 Search Users (Optional)")
-        col1, col2 = st.columns(2)
-
-        with col1:
-            person_id_filter = st.text_input("Search by Person ID (exact match):", key="person_id")
-        with col2:
-            name_filter = st.text_input("Search by Name (contains, case-insensitive):", key="name")
-
-        # Initialize filtered DataFrame with all users
-        filtered_users_df = users_df.copy()
-
-        # Apply search filters if provided
-        if person_id_filter:
-            filtered_users_df = filtered_users_df[filtered_users_df["PersonID"].astype(str) == person_id_filter]
-        if name_filter:
-            filtered_users_df = filtered_users_df[filtered_users_df["Name"].str.contains(name_filter, case=False, na=False)]
+     st.write("### 🔍 Search Users (Optional)")
+     col1, col2 = st.columns(2)
 
-        # Display full dataset or filtered results
-        if filtered_users_df.empty:
-            st.warning("No users found matching your search criteria.")
-        else:
-            st.write(f"### Users ({len(filtered_users_df)} records found)")
-            st.dataframe(filtered_users_df.sort_values(by="Name"))
+     with col1:
+         person_id_filter = st.text_input("Search by Person ID (exact match):", key="person_id")
+     with col2:
+         name_filter = st.text_input("Search by Name (contains, case-insensitive):", key="name")
 
-        # Download Option
-        st.download_button("📥 Download CSV", filtered_users_df.to_csv(index=False), "users.csv", "text/csv")
+     # Filters and ordering run in SQL; only the visible page is fetched
+     user_filters = {"PersonID": person_id_filter, "Name": name_filter}
+     st.write("### Users")
+     total_users = show_paginated_table("Users", user_filters, order_by="Name", key="users")
 
+     if not total_users:
+        st.warning("No users found matching your search criteria.")
      else:
-        st.warning("No users available!")
+        export_format = st.radio("Export Format", list(EXPORT_MIME_TYPES), horizontal=True, key="users_export_format")
+        if st.button("📄 Prepare Export"):
+            # Rows are streamed from the cursor as Arrow batches into a spooled file
+            with get_db().connection() as conn:
+                schema, batches = table_batches(conn, "Users", user_filters, order_by="Name")
+                export_file = write_export(schema, batches, export_format)
+            st.download_button(f"📥 Download {export_format.upper()}", lambda f=export_file: read_export(f),
+                               f"users.{export_format}", EXPORT_MIME_TYPES[export_format])
 
 # Rate Management Logic
 elif selected_section == "⚡ Rate Management":
@@ -128,20 +265,20 @@ elif selected_section == "⚡ Rate Management":
         if "Set" in selected_option or "Update" in selected_option:
             gst_rate = st.number_input("Enter GST Rate (%)", min_value=0.0, step=0.1)
             if st.button("💾 Save GST Rate"):
-                upsert_gst_rate(gst_rate, effective_date)
+                get_writer().call(upsert_gst_rate, gst_rate, effective_date)
                 st.success("GST Rate updated!")
         elif "View" in selected_option:
-            st.dataframe(get_gst_rates())
+            st.dataframe(get_gst_rates(get_db()))
     
     elif "Electric Duty" in selected_option:
         st.subheader("Electric Duty Rates")
         if "Set" in selected_option or "Update" in selected_option:
             duty_rate = st.number_input("Enter Electric Duty Rate (%)", min_value=0.0, step=0.1)
             if st.button("💾 Save Electric Duty Rate"):
-                upsert_electric_duty_rate(duty_rate, effective_date)
+                get_writer().call(upsert_electric_duty_rate, duty_rate, effective_date)
                 st.success("Electric Duty Rate updated!")
         elif "View" in selected_option:
-            st.dataframe(get_electric_duty_rates())
+            st.dataframe(get_electric_duty_rates(get_db()))
     
     elif "Surcharge" in selected_option:
         st.subheader("Surcharge Rates")
@@ -151,21 +288,55 @@ elif selected_section == "⚡ Rate Management":
             units_from = st.number_input("Units From", min_value=0, step=1)
             units_to = st.number_input("Units To", min_value=0, step=1)
             if st.button("💾 Save Surcharge Rate"):
-                upsert_surcharge_rate(surcharge_type_id, rate_per_unit, units_from, units_to, effective_date)
+                get_writer().call(upsert_surcharge_rate, surcharge_type_id, rate_per_unit, units_from, units_to, effective_date)
                 st.success("Surcharge Rate updated!")
         elif "View" in selected_option:
-            st.dataframe(get_surcharge_rates())
+            st.dataframe(get_surcharge_rates(get_db()))
+
+    # Candidate tariffs re-priced over every recorded bill; nothing is saved
+    elif selected_option == "Tariff What-If":
+        from billing.rate_index import SURCHARGE_COLUMNS, SURCHARGE_QUERY
+        from billing.what_if import SLAB_COLUMNS, BillingHistory, scaled_slabs, simulate
+        st.subheader("Tariff What-If")
+        st.write("Re-prices every recorded bill, archived months included, under candidate slabs and surcharge "
+                 "rates and compares them with today's tables. Electric Duty and GST follow the re-priced charges.")
+        with get_db().connection() as conn:
+            current_slabs = pd.read_sql_query(
+                f"SELECT {', '.join(SLAB_COLUMNS)} FROM TariffSlabs ORDER BY RateEffectiveDate, MinUnits", conn)
+            current_surcharges = pd.read_sql_query(SURCHARGE_QUERY, conn)[SURCHARGE_COLUMNS]
+
+        scale = st.number_input("Scenario A: every slab rate ×", min_value=0.0, value=1.10, step=0.01)
+        st.write("Scenario B: edited slabs and surcharge rates")
+        edited_slabs = st.data_editor(current_slabs, num_rows="dynamic", key="what_if_slabs")
+        edited_surcharges = st.data_editor(current_surcharges, num_rows="dynamic", key="what_if_surcharges")
+
+        if st.button("▶️ Run What-If"):
+            with get_db().connection() as conn:
+                history = BillingHistory.load(conn)
+                scenarios = {f"Slabs x{scale:g}": {"slabs": scaled_slabs(conn, scale)},
+                             "Edited": {"slabs": edited_slabs, "surcharges": edited_surcharges}}
+            results = simulate(history, scenarios)
+            st.caption(f"{len(history)} bills over {len(history.months)} months")
+            st.dataframe(results["summary"], hide_index=True)
+            st.write("### Revenue change per month")
+            st.line_chart(results["by_month"].pivot(index="BillingMonth", columns="Scenario", values="Delta"))
+            st.write("### Largest changes per flat")
+            by_flat = results["by_flat"]
+            st.dataframe(by_flat.reindex(by_flat["Delta"].abs().sort_values(ascending=False).index).head(50),
+                         hide_index=True)
+            st.download_button("📥 Download per-flat deltas (CSV)", by_flat.to_csv(index=False), "what_if_by_flat.csv",
+                               "text/csv")
 # Handling Billing Management section
-elif selected_section == "⚡ Billing Management":
+elif selected_section == "📊 Billing Management":
     if selected_option == "Enter Bill Record":
      st.title("📋 Insert Billing Data")
 
-     # Fetch necessary data
-     users_df = get_table_data("Users") 
-     flats_df = get_table_data("Flats")
-     gst_rates_df = get_table_data("GSTRates")
-     duty_rates_df = get_table_data("ElectricDutyRates")
-     surcharge_types_df = get_surcharge_data()
+     # Fetch necessary data (served from the rate cache on reruns)
+     users_df = get_cached_table(get_db(), "Users")
+     flats_df = get_cached_table(get_db(), "Flats")
+     gst_rates_df = get_gst_rates(get_db())
+     duty_rates_df = get_electric_duty_rates(get_db())
+     surcharge_types_df = get_surcharge_data(get_db())
 
      # Select user and flat
      person_id = st.selectbox("Select Person ID", users_df["PersonID"].tolist())
@@ -183,15 +354,17 @@ elif selected_section == "⚡ Billing Management":
      # Meter Reading Inputs
      present_reading = st.number_input("Present Reading (kWh)", min_value=0.0, step=0.01)
 
-     # GST Selection
+     # GST Selection, defaulting to the rate in force for the billing month
      gst_options = gst_rates_df["GST"].tolist() if not gst_rates_df.empty else []
-     gst_selected = st.selectbox("Select GST (%)", gst_options + ["Manual Entry"], index=0)
+     gst_selected = st.selectbox("Select GST (%)", gst_options + ["Manual Entry"],
+                                 index=in_force_position(get_db(), gst_rates_df, "GSTRates", billing_month))
      gst_value = st.number_input("Enter GST (%)", min_value=0.0, step=0.01) if gst_selected == "Manual Entry" else gst_selected
 
-     # Electric Duty Selection
+     # Electric Duty Selection, defaulting to the rate in force for the billing month
      duty_options = duty_rates_df["ElectricDuty"].tolist() if not duty_rates_df.empty else []
-     duty_selected = st.selectbox("Select Electric Duty", duty_options + ["Manual Entry"], index=0)
-     electric_duty = st.number_input("Enter Electric Duty", min_value=0.0, step=0.01) if duty_selected == "Manual Entry" else duty_selected
+     duty_selected = st.selectbox("Select Electric Duty (%)", duty_options + ["Manual Entry"],
+                                  index=in_force_position(get_db(), duty_rates_df, "ElectricDutyRates", billing_month))
+     electric_duty = st.number_input("Enter Electric Duty (%)", min_value=0.0, step=0.01) if duty_selected == "Manual Entry" else duty_selected
 
      # **Units Adjusted (for previous months)**
      units_adjusted = st.number_input("Units Adjusted (if any)", min_value=0.0, step=0.01, value=0.0)
@@ -205,22 +378,12 @@ elif selected_section == "⚡ Billing Management":
      if selected_surcharge_type == "Manual Entry":
        manual_surcharge = st.number_input("Enter Surcharge for Current Billing Month (if any)", min_value=0.0, step=0.01)
      
-     # Fetch surcharge for the current month
-     if selected_surcharge_type != "Manual Entry":
-      try:
-        month_surcharge = get_surcharge_amount(flat_no, billing_month, selected_surcharge_type)
-      except Exception as e:
-        st.error(f"Error fetching current month surcharge: {e}")
-        month_surcharge = 0.0
-     else:
-      month_surcharge = manual_surcharge
-     
      # **📌 Step 2: Select Adjusted Months for Surcharge Adjustments**
-     previous_months = get_previous_billing_months(flat_no, billing_month)   
+     previous_months = get_previous_billing_months(get_db(), flat_no, billing_month)   
      adjusted_months = st.multiselect("Select Adjusted Billing Months", previous_months)
      
      # **📌 Step 3: Select Surcharge Type for Each Adjusted Month**
-     adjusted_surcharge_total = 0
+     adjusted_selections = {}
 
      for adjusted_month in adjusted_months:
         st.markdown(f"**Adjusted Billing Month: {adjusted_month}**")
@@ -239,17 +402,31 @@ elif selected_section == "⚡ Billing Management":
               step=0.01,
               key=f"manual_surcharge_{adjusted_month}"
              )
+        adjusted_selections[adjusted_month] = (selected_adjusted_surcharge_type, manual_adjusted_surcharge)
+
+     # Fetch every non-manual (month, surcharge type) amount in one query
+     month_types = [(month, surcharge_type)
+                    for month, (surcharge_type, _) in [(billing_month, (selected_surcharge_type, manual_surcharge)), *adjusted_selections.items()]
+                    if surcharge_type != "Manual Entry"]
+     try:
+        with get_db().connection() as conn:
+            amounts = get_surcharge_amounts(conn, flat_no, month_types)
+        fetched = dict(zip(zip(amounts["BillingMonth"], amounts["SurchargeType"]), amounts["SurchargeAmount"]))
+     except Exception as e:
+        st.error(f"Error fetching surcharges: {e}")
+        fetched = {}
 
-        if selected_adjusted_surcharge_type != "Manual Entry":
-          try:
-            adjusted_surcharge = get_surcharge_amount(flat_no, adjusted_month, selected_adjusted_surcharge_type)
-          except Exception as e:
-            st.error(f"Error fetching surcharge for {adjusted_month}: {e}")
-            adjusted_surcharge = 0.0
-        else:
-           adjusted_surcharge = manual_adjusted_surcharge
+     if selected_surcharge_type != "Manual Entry":
+      month_surcharge = float(fetched.get((billing_month, selected_surcharge_type), 0.0))
+     else:
+      month_surcharge = manual_surcharge
 
-        adjusted_surcharge_total += adjusted_surcharge
+     adjusted_surcharge_total = 0
+     for adjusted_month, (surcharge_type, manual_amount) in adjusted_selections.items():
+        if surcharge_type != "Manual Entry":
+           adjusted_surcharge_total += float(fetched.get((adjusted_month, surcharge_type), 0.0))
+        else:
+           adjusted_surcharge_total += manual_amount
 
      
      # **📌 Step 4: Compute Total Surcharge**
@@ -263,84 +440,130 @@ elif selected_section == "⚡ Billing Management":
 
      # **Insert Record Button**
      if st.button("📌 Insert Record"):
-      insert_bill(person_id, flat_no, billing_month, present_reading, electric_duty, gst_value, units_adjusted, computed_surcharge)
+      bill = get_writer().call(insert_bill, person_id, flat_no, billing_month, present_reading, electric_duty, gst_value, units_adjusted, computed_surcharge)
       st.success("✅ Billing record inserted successfully!")
+      show_rebilled(bill)
+
+    elif selected_option == "Import Readings":
+     from billing.reading_import import import_readings
+     st.title("📥 Import Meter Readings")
+     st.write("Upload a CSV with columns FlatNo, BillingMonth (YYYY-MM), PresentReading and optionally UnitsAdjusted. "
+              "Valid rows are billed like single entries; rejected rows can be downloaded with the reason.")
+
+     readings_file = st.file_uploader("Readings CSV", type=["csv"])
+     rates_in_force = st.checkbox("Electric Duty and GST in force for each billing month", value=True)
+     col1, col2, col3 = st.columns(3)
+     with col1:
+        import_duty = None if rates_in_force else st.number_input("Electric Duty (%)", min_value=0.0, step=0.01,
+                                                                  key="import_duty")
+     with col2:
+        import_gst = None if rates_in_force else st.number_input("GST (%)", min_value=0.0, step=0.01, key="import_gst")
+     with col3:
+        import_surcharge = st.number_input("Surcharge", min_value=0.0, step=0.01, key="import_surcharge")
+
+     if st.button("📥 Import Readings") and readings_file:
+        # The import runs on the writer thread, which can't draw on the page; this session shows its counts
+        progress_text = st.empty()
+        counts = {"imported": 0, "rejected": 0}
+        def report_import(imported, rejected):
+            counts.update(imported=imported, rejected=rejected)
+
+        rejected_rows = io.StringIO()
+        pending = get_writer().submit(import_readings, readings_file, rejected_rows, import_duty, import_gst,
+                                      import_surcharge, progress=report_import)
+        while not pending.done():
+            progress_text.text(f"Imported {counts['imported']} readings, rejected {counts['rejected']}...")
+            time.sleep(0.2)
+        try:
+            result = pending.result()
+        except ValueError as e:
+            st.error(f"❌ {e}")
+        else:
+            st.success(f"✅ Imported {result['imported']} readings!")
+            if result["rebilled"]:
+                st.info(f"🔁 Re-billed {result['rebilled']} later bill(s) with the imported previous readings.")
+            if result["rejected"]:
+                st.warning(f"{result['rejected']} rows were rejected.")
+                st.download_button("📥 Download Rejected Rows", rejected_rows.getvalue(), "rejected_readings.csv",
+                                   "text/csv")
 
     elif selected_option== "Update/Delete Bill Record":
      st.title("✏️ Update or 🗑️ Delete Bill Record")
 
-     conn = get_connection()
-     cursor = conn.cursor()
+     with get_db().connection() as conn:
+       cursor = conn.cursor()
 
-     # Fetch all unique flat numbers & months for selection
-     cursor.execute("SELECT DISTINCT FlatNo FROM BillingReadings")
-     flat_list = [row[0] for row in cursor.fetchall()]
-     flat_no = st.selectbox("Select Flat No", flat_list)
+       # Fetch all unique flat numbers & months for selection
+       cursor.execute("SELECT DISTINCT FlatNo FROM BillingReadings")
+       flat_list = [row[0] for row in cursor.fetchall()]
+       flat_no = st.selectbox("Select Flat No", flat_list)
 
     
-     cursor.execute("SELECT DISTINCT BillingMonth FROM BillingReadings WHERE FlatNo=?", (flat_no,))
-     month_list = [row[0] for row in cursor.fetchall()]
-     month = st.selectbox("Select Billing Month", month_list)
-
-
-     # Fetch person details (handling multiple users in a flat)
-     cursor.execute("SELECT PersonID, Name FROM Users WHERE FlatNo=?", (flat_no,))
-     users = cursor.fetchall()
-
-     if users:
-        user_dict = {f"{row[1]} (ID: {row[0]})": row for row in users}  # Map Name & ID
-        selected_user = st.selectbox("Select Person", list(user_dict.keys()))
-        person_id, person_name = user_dict[selected_user]  # Extract selected ID & Name
-     else:
-        st.warning("⚠️ No user found for this flat!")
-        person_id, person_name = None, "Unknown"
-
-     # Display Person ID and Name
-     st.text(f"👤 Person ID: {person_id}")
-     st.text(f"📛 Name: {person_name}")
-
-     cursor.execute("""
-        SELECT br.PreviousReading, br.PresentReading, bc.ElectricDuty, bc.GST, bc.TotalSurcharge 
-        FROM BillingReadings br
-        JOIN BillingCharges bc ON br.ReadingID = bc.ReadingID
-        WHERE br.FlatNo = %s AND br.BillingMonth = %s
-        """, (flat_no, month))
-
-     bill_data = cursor.fetchone()
+       cursor.execute("SELECT DISTINCT BillingMonth FROM BillingReadings WHERE FlatNo=?", (flat_no,))
+       month_list = [row[0] for row in cursor.fetchall()]
+       month = st.selectbox("Select Billing Month", month_list)
+
+
+       # Fetch person details (handling multiple users in a flat)
+       cursor.execute("SELECT PersonID, Name FROM Users WHERE FlatNo=?", (flat_no,))
+       users = cursor.fetchall()
+
+       if users:
+          user_dict = {f"{row[1]} (ID: {row[0]})": row for row in users}  # Map Name & ID
+          selected_user = st.selectbox("Select Person", list(user_dict.keys()))
+          person_id, person_name = user_dict[selected_user]  # Extract selected ID & Name
+       else:
+          st.warning("⚠️ No user found for this flat!")
+          person_id, person_name = None, "Unknown"
+
+       # Display Person ID and Name
+       st.text(f"👤 Person ID: {person_id}")
+       st.text(f"📛 Name: {person_name}")
+
+       cursor.execute("""
+          SELECT br.PreviousReading, br.PresentReading, COALESCE(br.UnitsAdjusted, 0), bc.Surcharge,
+                 bc.ElectricDutyRate, bc.GSTRate
+          FROM BillingReadings br
+          JOIN BillingCharges bc ON br.ReadingID = bc.ReadingID
+          WHERE br.FlatNo = ? AND br.BillingMonth = ?
+          """, (flat_no, month))
+
+       bill_data = cursor.fetchone()
+       # ElectricDuty and GST are edited as the percentages the bill was charged at
+       tax_rates = bill_tax_rates(conn, month, *bill_data[4:]) if bill_data else None
 
      if bill_data:
-        previous_reading, present_reading, electric_duty, gst, surcharge = bill_data
-
-         # 📌 Editable Inputs
-        present_reading = st.number_input("New Present Reading (kWh)", min_value=0.0, step=0.01, value=present_reading)
-        electric_duty = st.number_input("Electric Duty", min_value=0.0, step=0.01, value=electric_duty)
-        gst = st.number_input("GST (%)", min_value=0.0, step=0.01, value=gst)
-        units_adjusted = st.number_input("Units Adjusted", min_value=0.0, step=0.01, value=0.0)
-        surcharge = st.number_input("Surcharge", min_value=0.0, step=0.01, value=surcharge)
-
-     try: 
-                    # 📌 Update Button
-        if st.button("✏️ Update Bill Record"):
-             update_bill(flat_no, billing_month, present_reading, electric_duty, gst, units_adjusted, surcharge)
-             st.success("✅ Bill updated successfully!")
-
-                   # 📌 Delete Button
-        if st.button("🗑️ Delete Bill Record"):
-            delete_bill(flat_no, billing_month)
-            st.success("❌ Bill deleted successfully!")
+          previous_reading, present_reading, units_adjusted, surcharge = [float(value or 0.0) for value in bill_data[:4]]
+          electric_duty, gst = tax_rates
 
-        else:
-         st.warning("⚠️ No bill found for the selected Flat No and Month!")
+           # 📌 Editable Inputs
+          present_reading = st.number_input("New Present Reading (kWh)", min_value=0.0, step=0.01, value=present_reading)
+          electric_duty = st.number_input("Electric Duty (%)", min_value=0.0, step=0.01, value=electric_duty)
+          gst = st.number_input("GST (%)", min_value=0.0, step=0.01, value=gst)
+          units_adjusted = st.number_input("Units Adjusted", min_value=0.0, step=0.01, value=units_adjusted)
+          surcharge = st.number_input("Surcharge", min_value=0.0, step=0.01, value=surcharge)
 
-     except Exception as e:
-        st.error(f"❌ An error occurred: {e}")
+          try:
+             # 📌 Update Button
+             if st.button("✏️ Update Bill Record"):
+                bill = get_writer().call(update_bill, flat_no, month, present_reading, electric_duty, gst, units_adjusted, surcharge)
+                st.success("✅ Bill updated successfully!")
+                show_rebilled(bill)
 
-     finally:
-        if conn:
-            conn.close()  # Ensure the connection is always closed
+             # 📌 Delete Button
+             if st.button("🗑️ Delete Bill Record"):
+                get_writer().call(delete_bill, flat_no, month)
+                st.success("❌ Bill deleted successfully!")
+
+          except Exception as e:
+             st.error(f"❌ An error occurred: {e}")
+     else:
+        st.warning("⚠️ No bill found for the selected Flat No and Month!")
 
 
     elif selected_option == "Billing Records":
+     from billing.archive import (ARCHIVE_TABLES, EXPORT_MIME_TYPES, archived_months, history_batches, read_history,
+                                  table_batches, write_export)
      st.title("📊 View Records")
 
      # List of available tables
@@ -352,22 +575,12 @@ elif selected_section == "⚡ Billing Management":
      # Dropdown to select a table
      selected_table = st.selectbox("Select a Table", tables)
     
-     # Fetch data for the selected table
-     df = get_table_data(selected_table)
-    
-     # Display the raw dataframe
-     st.write(f"### {selected_table} Table")
-     st.dataframe(df)
-
      # Add advanced search filters
      st.markdown("---")
      st.write("### 🔍 Advanced Search")
     
      # Use columns for better alignment
      col1, col2 = st.columns(2)
-    
-     # Initialize filtered DataFrame
-     filtered_df = df.copy()
 
      # ✅ **Initialize filters to avoid NameError**
      flat_no_filter = None
@@ -381,47 +594,98 @@ elif selected_section == "⚡ Billing Management":
             flat_no_filter = st.text_input("Search by Flat No (exact match):")
         with col2:
             billing_month_filter = st.text_input("Search by Billing Month (YYYY-MM):")
-        
-        # Apply filters
-        if flat_no_filter:
-            filtered_df = filtered_df[filtered_df["FlatNo"].astype(str) == flat_no_filter]
-        if billing_month_filter:
-            filtered_df = filtered_df[filtered_df["BillingMonth"].astype(str) == billing_month_filter]
     
      elif selected_table == "BillingCharges":
         with col1:
             flat_no_filter = st.text_input("Search by Flat No (exact match):")
 
-        # Apply filters
-        if flat_no_filter:
-            filtered_df = filtered_df[filtered_df["FlatNo"].astype(str) == flat_no_filter]
-
      elif selected_table == "ConsumptionHistory":
         with col1:
             billing_month_filter = st.text_input("Search by Billing Month (YYYY-MM):")
 
-        # Apply filters
-        if billing_month_filter:
-            filtered_df = filtered_df[filtered_df["BillingMonth"].astype(str) == billing_month_filter]
+     table_filters = {"FlatNo": flat_no_filter, "BillingMonth": billing_month_filter}
+     table_filters = {name: value for name, value in table_filters.items() if value}
 
      # General Search if no specific filters are applied
-     # **Fix: Ensure variables exist before checking them**
+     search_term = None
      if not any([flat_no_filter, billing_month_filter, person_id_filter, name_filter]):
         st.markdown("---")
         st.write("### 🔍 General Search")
         search_term = st.text_input("Search within the table (all columns):")
-        if search_term:
-            filtered_df = filtered_df[filtered_df.apply(lambda row: row.astype(str).str.contains(search_term, case=False).any(), axis=1)]
     
-     # Display filtered results
-     if not filtered_df.empty:
-        st.write(f"### Filtered Results ({len(filtered_df)} records found)")
-        st.dataframe(filtered_df)
-     else:
+     # Archived months are read back from Parquet alongside the live rows
+     include_archive = False
+     if selected_table in ARCHIVE_TABLES and archived_months(selected_table):
+        include_archive = st.checkbox("Include archived months")
+
+     st.write(f"### {selected_table} Table")
+     if include_archive:
+        with get_db().connection() as conn:
+            history_df = read_history(conn, selected_table, table_filters)
+        if history_df.empty:
+           st.warning("No records found matching your search criteria.")
+        else:
+           st.dataframe(history_df)
+           st.caption(f"{len(history_df)} records (live and archived)")
+     # Display filtered results, one page at a time
+     elif not show_paginated_table(selected_table, table_filters, search_term, key=f"records_{selected_table}"):
         st.warning("No records found matching your search criteria.")
 
+     export_format = st.radio("Export Format", list(EXPORT_MIME_TYPES), horizontal=True, key="records_export_format")
+     if st.button("📄 Prepare Export"):
+        with get_db().connection() as conn:
+            if include_archive:
+                schema, batches = history_batches(conn, selected_table, table_filters)
+            else:
+                schema, batches = table_batches(conn, selected_table, table_filters, search_term)
+            export_file = write_export(schema, batches, export_format)
+        st.download_button(f"📥 Download {export_format.upper()}", lambda f=export_file: read_export(f),
+                           f"{selected_table}.{export_format}", EXPORT_MIME_TYPES[export_format])
+
+
+    elif selected_option == "Billing Summary":
+     st.title("📈 Billing Summary")
+
+     # Read from the trigger-maintained aggregates instead of rescanning history
+     with get_db().connection() as conn:
+        monthly_df = get_monthly_summary(conn)
+        flat_no_filter = st.text_input("Filter by Flat No (exact match):")
+        flat_df = get_flat_summary(conn, flat_no_filter or None)
+
+     if monthly_df.empty:
+        st.warning("No billing data available!")
+     else:
+        st.write("### Per Month")
+        st.dataframe(monthly_df)
+        st.bar_chart(monthly_df.set_index("BillingMonth")[["Revenue"]])
+        st.write("### Per Flat")
+        st.dataframe(flat_df)
+
+    elif selected_option == "Archive Months":
+     from billing.archive import archive_months, archived_months, closed_months
+     st.title("🗄️ Archive Closed Months")
+     st.write("Fully paid months older than the live window are moved to Parquet files. "
+              "They stay in the billing summaries and can still be viewed and exported from Billing Records.")
+
+     keep_months = st.number_input("Months to keep live", min_value=1, max_value=120, value=12, step=1)
+     with get_db().connection() as conn:
+        candidate_months = closed_months(conn, int(keep_months))
+     if archived_months():
+        st.caption(f"Archived: {', '.join(archived_months())}")
+
+     if not candidate_months:
+        st.info("No closed months to archive.")
+     else:
+        months_to_archive = st.multiselect("Months to Archive", candidate_months, default=candidate_months)
+        if st.button("🗄️ Archive Selected Months") and months_to_archive:
+            # One queued request per month, so a failure leaves the earlier months archived
+            archived = {}
+            for month in months_to_archive:
+                archived.update(get_writer().call(archive_months, [month]))
+            st.success(f"✅ Archived {sum(archived.values())} readings from {len(archived)} month(s)!")
 
     elif selected_option == "Generate Bill":
+     from billing.bill_pdf import bill_file_name, generate_pdf, reading_date_for
      st.title("⚡ User-Specific Electricity Bill Generation")
     
      # Option 1: Generate Bill for a specific user and month
@@ -432,14 +696,16 @@ elif selected_section == "⚡ Billing Management":
      if st.button("Fetch Bill Details"):
       if flat_no and billing_month:
         # Fetch bill details (Note: No PersonID is used here)
-        bill = fetch_complete_bill(flat_no, billing_month)  
+        bill = fetch_complete_bill(get_db(), flat_no, billing_month)  
         
         if bill:
             # Unpack bill details
-            bill_id, prev_reading, pres_reading, units_consumed, units_adjusted, rate_per_unit, var_charges, elec_duty, gst, surcharge, net_amount, payable_amount = bill
+            (reading_id, prev_reading, pres_reading, units_consumed, units_adjusted, bill_id,
+             rate_per_unit, var_charges, elec_duty, gst, surcharge, net_amount, payable_amount) = bill
 
             # Store bill details in session state
             st.session_state.bill_id = bill_id
+            st.session_state.person_id = person_id
             st.session_state.prev_reading = prev_reading
             st.session_state.pres_reading = pres_reading
             st.session_state.units_consumed = units_consumed
@@ -450,15 +716,17 @@ elif selected_section == "⚡ Billing Management":
             st.session_state.gst = gst
             st.session_state.surcharge = surcharge
             st.session_state.net_amount = net_amount
+            with get_db().connection() as conn:
+                st.session_state.duty_rate, st.session_state.gst_rate = bill_tax_rates(
+                    conn, billing_month, *conn.execute(
+                        "SELECT ElectricDutyRate, GSTRate FROM BillingCharges WHERE BillID = ?", (bill_id,)).fetchone())
             st.session_state.payable_amount = payable_amount
+            st.session_state.name = ""  # the bill is printed without a name unless a Person ID is given
 
             # Fetch user details for PDF generation (Only if person_id is given)
             if person_id:
-                conn = sqlite3.connect("billing_system.db")
-                cursor = conn.cursor()
-                cursor.execute("SELECT Name FROM Users WHERE FlatNo = ? AND PersonID = ?", (flat_no, person_id))
-                result = cursor.fetchone()
-                conn.close()
+                with get_db().connection() as conn:
+                    result = conn.execute("SELECT Name FROM Users WHERE FlatNo = ? AND PersonID = ?", (flat_no, person_id)).fetchone()
                 
                 if result:
                     st.session_state.name = result[0]
@@ -467,92 +735,125 @@ elif selected_section == "⚡ Billing Management":
         
         else:
             st.error("No bill found for the given Flat Number and Billing Month.")
-    else:
+      else:
         st.error("Please enter Flat Number and Billing Month.")  # Removed Person ID from this error
 
 
-    # If bill details are fetched, display editable fields
+     # If bill details are fetched, display editable fields
      
-    if "bill_id" in st.session_state:
-     # Editable fields with current values
-     present_reading = st.number_input("Present Reading:", value=st.session_state.pres_reading)
-     units_adjusted = st.number_input("Units Adjusted:", value=st.session_state.units_adjusted)
-     electric_duty = st.number_input("Electric Duty:", value=st.session_state.elec_duty)
-     gst = st.number_input("GST:", value=st.session_state.gst)
-     surcharge = st.number_input("Surcharge:", value=st.session_state.surcharge)
-
-     if st.button("Update Bill"):
-        # Call update_bill function with modified values
-        update_bill(
-            flat_no=flat_no,
-            month=billing_month,
-            present_reading=present_reading if present_reading != st.session_state.pres_reading else None,
-            electric_duty=electric_duty if electric_duty != st.session_state.elec_duty else None,
-            gst=gst if gst != st.session_state.gst else None,
-            units_adjusted=units_adjusted if units_adjusted != st.session_state.units_adjusted else None,
-            surcharge=surcharge if surcharge != st.session_state.surcharge else None
+     if "bill_id" in st.session_state:
+      # Editable fields with current values
+      present_reading = st.number_input("Present Reading:", value=st.session_state.pres_reading)
+      units_adjusted = st.number_input("Units Adjusted:", value=st.session_state.units_adjusted)
+      electric_duty = st.number_input("Electric Duty (%):", value=st.session_state.duty_rate)
+      gst = st.number_input("GST (%):", value=st.session_state.gst_rate)
+      surcharge = st.number_input("Surcharge:", value=st.session_state.surcharge)
+
+      if st.button("Update Bill"):
+         # Call update_bill function with modified values
+         bill = get_writer().call(update_bill,
+             flat_no=flat_no,
+             month=billing_month,
+             present_reading=present_reading if present_reading != st.session_state.pres_reading else None,
+             electric_duty=electric_duty if electric_duty != st.session_state.duty_rate else None,
+             gst=gst if gst != st.session_state.gst_rate else None,
+             units_adjusted=units_adjusted if units_adjusted != st.session_state.units_adjusted else None,
+             surcharge=surcharge if surcharge != st.session_state.surcharge else None
+          )
+         show_rebilled(bill)
+         #Fetch updated bill details
+         updated_bill = fetch_complete_bill(get_db(), flat_no, billing_month)
+         if updated_bill:
+             # Unpack and store updated details
+             (reading_id, prev_reading, pres_reading, units_consumed, units_adjusted, bill_id, 
+             rate_per_unit, var_charges, elec_duty, gst, surcharge, net_amount, payable_amount) = updated_bill
+
+             st.session_state.updated_bill = {
+                 "units_consumed": units_consumed,
+                 "variable_charges": var_charges,
+                 "net_amount": net_amount,
+                 "payable_amount": payable_amount
+             }
+             st.session_state.pres_reading = pres_reading
+             st.session_state.units_adjusted = units_adjusted
+             st.session_state.elec_duty = elec_duty
+             st.session_state.gst = gst
+             st.session_state.surcharge = surcharge
+             with get_db().connection() as conn:
+                 st.session_state.duty_rate, st.session_state.gst_rate = bill_tax_rates(
+                     conn, billing_month, *conn.execute(
+                         "SELECT ElectricDutyRate, GSTRate FROM BillingCharges WHERE BillID = ?", (bill_id,)).fetchone())
+
+                 # If bill is updated, show download button
+     if "updated_bill" in st.session_state:
+         # Updated PDF; reruns reuse the cached file until a value on the bill changes
+         pdf_path = generate_pdf(
+             flat_no, st.session_state.person_id, st.session_state.name, billing_month,
+             reading_date_for(billing_month), st.session_state.prev_reading, st.session_state.pres_reading,
+             st.session_state.updated_bill["units_consumed"], st.session_state.elec_duty, st.session_state.gst, st.session_state.surcharge,
+             st.session_state.updated_bill["variable_charges"], st.session_state.updated_bill["net_amount"],
+             st.session_state.updated_bill["payable_amount"], db_path=get_db().path
          )
-        #Fetch updated bill details
-        updated_bill = fetch_complete_bill(flat_no, billing_month)
-        if updated_bill:
-            # Unpack and store updated details
-            (reading_id, prev_reading, pres_reading, units_consumed, units_adjusted, bill_id, 
-            rate_per_unit, var_charges, elec_duty, gst, surcharge, net_amount, payable_amount) = updated_bill
-
-            st.session_state.updated_bill = {
-                "units_consumed": units_consumed,
-                "variable_charges": var_charges,
-                "net_amount": net_amount,
-                "payable_amount": payable_amount
-            }
-            st.session_state.pres_reading = pres_reading
-            st.session_state.units_adjusted = units_adjusted
-            st.session_state.elec_duty = elec_duty
-            st.session_state.gst = gst
-            st.session_state.surcharge = surcharge
-
-                # If bill is updated, show download button
-    if "updated_bill" in st.session_state:
-        # Generate updated PDF
-        pdf_path = generate_pdf(
-            flat_no, st.session_state.person_id, st.session_state.name, billing_month,
-            f"01-{billing_month.split('-')[1]}-25", st.session_state.prev_reading, st.session_state.pres_reading,
-            st.session_state.updated_bill["units_consumed"], st.session_state.elec_duty, st.session_state.gst, st.session_state.surcharge,
-            st.session_state.updated_bill["variable_charges"], st.session_state.updated_bill["net_amount"],
-            st.session_state.updated_bill["payable_amount"]
-        )
-
-        # Provide download button for the updated PDF
-        with open(pdf_path, "rb") as f:
-            st.download_button(
-                "📥 Download Updated Bill PDF",
-                f,
-                file_name=os.path.basename(pdf_path),
-                mime="application/pdf"
-            )
-
-    # Separator
-    st.markdown("---")  
-
-    # Option 2: Bulk Electricity Bill Generation
-    st.title("📑 Batch Electricity Bill Generation")
-    selected_month = st.text_input("Enter Billing Month (YYYY-MM):", key="bulk_bill_month")  # Unique key added
-
-    if st.button("Generate Bills"):
-        if selected_month:
-            billing_data = fetch_billing_data(selected_month)
-            if billing_data:
-                pdf_file = Generate_bulk_bill_pdf(billing_data, selected_month)
-                st.download_button(
-                    label="Download PDF",
-                    data=pdf_file.getvalue(),  # Ensure binary data is passed
-                    file_name=f"Bulk_Bills_{selected_month}.pdf",
-                    mime="application/pdf"
-                )
-
-            else:
-                st.warning("No billing data found for the selected month!")
-        else:
-            st.error("Please enter a valid month in YYYY-MM format.")
 
+         # Provide download button for the updated PDF
+         with open(pdf_path, "rb") as f:
+             st.download_button(
+                 "📥 Download Updated Bill PDF",
+                 f,
+                 file_name=bill_file_name(flat_no, billing_month),
+                 mime="application/pdf"
+             )
 
+     # Separator
+     st.markdown("---")  
+
+     # Option 2: Bulk Electricity Bill Generation
+     st.title("📑 Batch Electricity Bill Generation")
+     selected_month = st.text_input("Enter Billing Month (YYYY-MM):", key="bulk_bill_month")  # Unique key added
+
+     # Record surcharges (and GST/duty on them) for every reading of the month in one pass
+     bulk_surcharge_types = st.multiselect("Surcharge Types to Apply", get_surcharge_data(get_db())["SurchargeType"].tolist())
+     if st.button("Apply Surcharges for Month"):
+         if selected_month and bulk_surcharge_types:
+             get_writer().call(record_month_surcharges, selected_month, bulk_surcharge_types)
+             st.success(f"✅ Surcharges recorded for {selected_month}!")
+         else:
+             st.error("Please enter a billing month and select at least one surcharge type.")
+
+     # Bills are rendered by a background job; the panel below polls it and keeps the result downloadable
+     if st.button("Generate Bills"):
+         if selected_month:
+             submit_bill_job("bulk_pdf", selected_month)
+         else:
+             st.error("Please enter a valid month in YYYY-MM format.")
+     if selected_month:
+         show_job_panel("bulk_pdf", selected_month)
+
+     # Option 3: Individual per-flat PDFs rendered in parallel and packed into a ZIP
+     st.subheader("🗂️ Individual Bills (ZIP)")
+     worker_count = st.number_input("Worker Processes", min_value=1, max_value=64, value=os.cpu_count() or 1, step=1)
+
+     if st.button("Generate Individual Bills"):
+         if selected_month:
+             submit_bill_job("bills_zip", selected_month, workers=int(worker_count))
+         else:
+             st.error("Please enter a valid month in YYYY-MM format.")
+     if selected_month:
+         show_job_panel("bills_zip", selected_month)
+
+     # Rendered bills are cached by content; unchanged bills are not rendered again
+     with st.expander("Bill PDF cache"):
+         cache_stats = get_bill_cache(get_db().path).stats()
+         col1, col2, col3 = st.columns(3)
+         col1.metric("Cached Bills", cache_stats["entries"])
+         col2.metric("Size", f"{cache_stats['bytes'] / 1024 / 1024:.1f} / {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB")
+         col3.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+         st.caption(f"{cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['evictions']} evictions since start")
+         if st.button("Clear Bill Cache"):
+             get_bill_cache(get_db().path).clear()
+             st.success("✅ Bill cache cleared.")
+
+
+if profiling.enabled():
+    show_profiling_panel(profiling_panel)
+profiling.finish_run()
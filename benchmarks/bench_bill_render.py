@@ -0,0 +1,54 @@
+# Description: ms/bill for bulk rendering with the static layer redrawn on every page versus
+# stamped from the cached Form XObject template.
+# Usage: python benchmarks/bench_bill_render.py [--bills 500]
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from billing.bill_pdf import draw_bill, draw_static_layer, stamp_bill
+
+
+def sample_bill(i):
+    return (f"Flat-{i}", 1000 + i, f"User {i}", "2025-03", "01-03-25", 1200.0 + i, 1450.0 + i,
+            250.0, 1.5, 16.97, 12.4, 8565.0, 8583.47, 8595.87)
+
+
+# Static layer drawn again on every page (the pre-template behaviour)
+def redraw_page(c, bill):
+    draw_static_layer(c)
+    stamp_bill(c, *bill)
+
+
+def run(bills, draw):
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter, pageCompression=1)
+    start = time.perf_counter()
+    for i in range(bills):
+        draw(c, sample_bill(i))
+        c.showPage()
+    c.save()
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / bills, len(buffer.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bills", type=int, default=500)
+    args = parser.parse_args()
+
+    redraw_ms, redraw_size = run(args.bills, redraw_page)
+    template_ms, template_size = run(args.bills, lambda c, bill: draw_bill(c, *bill))
+
+    print(f"full redraw : {redraw_ms:7.3f} ms/bill  {redraw_size / 1024:8.1f} KB")
+    print(f"template    : {template_ms:7.3f} ms/bill  {template_size / 1024:8.1f} KB")
+    print(f"speedup     : {redraw_ms / template_ms:7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
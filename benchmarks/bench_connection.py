@@ -0,0 +1,67 @@
+# Description: Queries/sec for a per-call sqlite3.connect() versus the pooled connection layer.
+# Usage: python benchmarks/bench_connection.py [--queries 5000]
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from billing.db import ConnectionPool
+
+
+def build_db(path, rows=2000):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE Users (PersonID INTEGER PRIMARY KEY, Name VARCHAR(255), FlatNo VARCHAR(50),
+                            UserType VARCHAR(20), LoadSanctioned FLOAT, Phase VARCHAR(10))
+    """)
+    conn.executemany(
+        "INSERT INTO Users VALUES (?, ?, ?, 'Residential', 1.0, '1-Phase')",
+        [(1000 + i, f"User {i}", f"Flat-{i}") for i in range(rows)],
+    )
+    conn.commit()
+    conn.close()
+
+
+# Old pattern: open, query, close on every helper call
+def per_call(path, queries, rows):
+    start = time.perf_counter()
+    for i in range(queries):
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("SELECT Name FROM Users WHERE PersonID=?", (1000 + i % rows,)).fetchone()
+        conn.close()
+    return queries / (time.perf_counter() - start)
+
+
+def pooled(path, queries, rows):
+    pool = ConnectionPool(path)
+    start = time.perf_counter()
+    for i in range(queries):
+        with pool.connection() as conn:
+            conn.execute("SELECT Name FROM Users WHERE PersonID=?", (1000 + i % rows,)).fetchone()
+    rate = queries / (time.perf_counter() - start)
+    pool.close()
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        build_db(path, args.rows)
+        before = per_call(path, args.queries, args.rows)
+        after = pooled(path, args.queries, args.rows)
+
+    print(f"per-call connect : {before:10.0f} queries/sec")
+    print(f"connection pool  : {after:10.0f} queries/sec")
+    print(f"speedup          : {after / before:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
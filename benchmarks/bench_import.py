@@ -0,0 +1,118 @@
+# Description: Bulk meter-reading import throughput, with the production triggers (aggregates,
+# ConsumptionHistory, FTS) in place. Rows include a slice of deliberately invalid readings.
+# Usage: python benchmarks/bench_import.py [--rows 100000]
+import argparse
+import io
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from billing.aggregates import ensure_aggregates
+from billing.db import ConnectionPool
+from billing.migrations import apply_indexes
+from billing.reading_import import import_readings
+from billing.search_index import ensure_search_indexes
+
+
+def build_db(path, flats):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE Flats (FlatNo VARCHAR(50) PRIMARY KEY, Location VARCHAR(255));
+        CREATE TABLE Users (PersonID INTEGER PRIMARY KEY, Name VARCHAR(255), FlatNo VARCHAR(50));
+        CREATE TABLE TariffSlabs (SlabID INTEGER PRIMARY KEY AUTOINCREMENT, MinUnits INTEGER NOT NULL,
+          MaxUnits INTEGER NOT NULL, RatePerUnit FLOAT NOT NULL, RateEffectiveDate DATE NOT NULL);
+        CREATE TABLE GSTRates (GSTID INTEGER PRIMARY KEY AUTOINCREMENT, EffectiveDate DATE UNIQUE, GST FLOAT NOT NULL);
+        CREATE TABLE ElectricDutyRates (DutyID INTEGER PRIMARY KEY AUTOINCREMENT, EffectiveDate DATE UNIQUE,
+          ElectricDuty FLOAT NOT NULL);
+        CREATE TABLE SurchargeType (SurchargeTypeID INTEGER PRIMARY KEY AUTOINCREMENT, TypeName VARCHAR(100) UNIQUE);
+        CREATE TABLE Surcharge (SurchargeID INTEGER PRIMARY KEY AUTOINCREMENT, SurchargeTypeID INTEGER,
+          RatePerUnit FLOAT DEFAULT 0.0, UnitsFrom INTEGER, UnitsTo INTEGER, EffectiveMonth DATE NOT NULL);
+        CREATE TABLE ReadingSurchargeMapping (ID INTEGER PRIMARY KEY AUTOINCREMENT, ReadingID INTEGER,
+          SurchargeID INTEGER, BillingMonth DATE, SurchargeAmount FLOAT, UNIQUE (ReadingID, SurchargeID, BillingMonth));
+        CREATE TABLE SurchargeGSTDuty (ID INTEGER PRIMARY KEY AUTOINCREMENT, ReadingID INTEGER UNIQUE,
+          TotalSurcharge FLOAT, GSTID INTEGER, ElectricDutyID INTEGER, GSTAmount FLOAT, ElectricDutyAmount FLOAT);
+        CREATE TABLE BillingReadings (
+          ReadingID INTEGER PRIMARY KEY AUTOINCREMENT, FlatNo VARCHAR(50), BillingMonth DATE,
+          ReadingDate DATE DEFAULT (DATE('now')), PreviousReading FLOAT DEFAULT 0.0 NOT NULL,
+          PresentReading FLOAT DEFAULT 0.0 NOT NULL, UnitsAdjusted FLOAT DEFAULT 0,
+          CorrectionStatus VARCHAR(20) DEFAULT 'Original');
+        CREATE TABLE BillingCharges (
+          BillID INTEGER PRIMARY KEY AUTOINCREMENT,
+          ReadingID INTEGER REFERENCES BillingReadings(ReadingID) ON DELETE CASCADE,
+          RatePerUnit FLOAT, VariableCharges FLOAT DEFAULT 0.0 NOT NULL, ElectricDuty FLOAT, GST FLOAT, Surcharge FLOAT,
+          NetAmount FLOAT, PayableAmount FLOAT, BillGenerationDate TEXT DEFAULT (DATE('now')),
+          Status VARCHAR(20), Remarks TEXT DEFAULT 'No remarks', VariableChargesPaisa INTEGER,
+          ElectricDutyPaisa INTEGER, GSTPaisa INTEGER, SurchargePaisa INTEGER, NetAmountPaisa INTEGER,
+          PayableAmountPaisa INTEGER, ElectricDutyRate FLOAT, GSTRate FLOAT);
+        CREATE TABLE ConsumptionHistory (
+          ConsumptionID INTEGER PRIMARY KEY AUTOINCREMENT, PersonID INTEGER, FlatNo VARCHAR(50),
+          BillingMonth DATE NOT NULL, UnitsConsumed FLOAT, RecordedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+    """)
+    conn.executemany("INSERT INTO Flats VALUES (?, 'Block A')", [(f"Flat-{i}",) for i in range(flats)])
+    conn.executemany("INSERT INTO Users VALUES (?, ?, ?)", [(1000 + i, f"User {i}", f"Flat-{i}") for i in range(flats)])
+    conn.executemany("INSERT INTO TariffSlabs (MinUnits, MaxUnits, RatePerUnit, RateEffectiveDate) VALUES (?, ?, ?, ?)",
+                     [(0, 100, 7.74, "2024-01-01"), (101, 200, 10.06, "2024-01-01"), (201, 300, 12.15, "2024-01-01"),
+                      (301, 700, 19.55, "2024-01-01"), (701, 0, 22.65, "2024-01-01")])
+    apply_indexes(conn)
+    ensure_search_indexes(conn, ["BillingReadings", "BillingCharges", "ConsumptionHistory"])
+    ensure_aggregates(conn)
+    conn.commit()
+    conn.close()
+
+
+# One reading per flat per month; about 1% of rows are bad (unknown flat, bad number, bad month)
+def readings_csv(rows, flats):
+    rng = random.Random(42)
+    out = io.StringIO()
+    out.write("FlatNo,BillingMonth,PresentReading,UnitsAdjusted\n")
+    for i in range(rows):
+        month = f"2025-{i // flats % 12 + 1:02d}"
+        flat_no, reading = f"Flat-{i % flats}", f"{(i // flats + 1) * 250 + rng.uniform(0, 200):.1f}"
+        bad = rng.random()
+        if bad < 0.004:
+            flat_no = "Flat-X"
+        elif bad < 0.007:
+            reading = "n/a"
+        elif bad < 0.01:
+            month = "2025-13"
+        out.write(f"{flat_no},{month},{reading},{rng.choice(['', '0', '1.5'])}\n")
+    out.seek(0)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--flats", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    source = readings_csv(args.rows, args.flats)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        build_db(path, args.flats)
+        db = ConnectionPool(path)
+        errors = io.StringIO()
+        start = time.perf_counter()
+        result = import_readings(db, source, errors, electric_duty=1.5, gst=16.0)
+        elapsed = time.perf_counter() - start
+        with db.connection() as conn:
+            payable = conn.execute("SELECT COALESCE(SUM(PayableAmountPaisa), 0) FROM BillingCharges").fetchone()[0]
+        db.close()
+
+    # A tariff that prices every bill at 0 would make the timings meaningless
+    assert result["imported"] and payable > 0, f"imported {result['imported']} bills totalling {payable} paisa"
+
+    print(f"rows      : {args.rows}")
+    print(f"imported  : {result['imported']}")
+    print(f"rejected  : {result['rejected']}")
+    print(f"payable   : {payable / 100:.2f}")
+    print(f"elapsed   : {elapsed:8.2f} s")
+    print(f"throughput: {args.rows / elapsed:8.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Description: General Search latency at scale: the old per-row DataFrame.apply scan versus the
+# FTS5 shadow index.
+# Usage: python benchmarks/bench_search.py [--rows 100000]
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+
+from billing.search_index import ensure_search_indexes
+from billing.table_query import fetch_page
+
+
+def build_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE BillingReadings (
+          ReadingID INTEGER PRIMARY KEY AUTOINCREMENT, FlatNo VARCHAR(50), BillingMonth DATE,
+          ReadingDate DATE, PreviousReading FLOAT DEFAULT 0.0 NOT NULL, PresentReading FLOAT DEFAULT 0.0 NOT NULL,
+          UnitsAdjusted FLOAT DEFAULT 0, CorrectionStatus VARCHAR(20) DEFAULT 'Original')
+    """)
+    rng = random.Random(42)
+    conn.executemany(
+        "INSERT INTO BillingReadings (FlatNo, BillingMonth, ReadingDate, PreviousReading, PresentReading) VALUES (?, ?, ?, ?, ?)",
+        ((f"Flat-{i % 2000}", f"{2015 + i // 24000}-{(i // 2000) % 12 + 1:02d}", "2025-03-01",
+          round(rng.uniform(0, 9000), 2), round(rng.uniform(0, 9000), 2)) for i in range(rows)))
+    ensure_search_indexes(conn, ["BillingReadings"])
+    conn.commit()
+    return conn
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) * 1000 / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--term", default="Flat-1234")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build_db(os.path.join(tmp, "bench.db"), args.rows)
+        df = pd.read_sql_query("SELECT * FROM BillingReadings", conn)
+
+        # Old behaviour: every cell stringified per keystroke
+        scan_ms, scan = timed(lambda: df[df.apply(
+            lambda row: row.astype(str).str.contains(args.term, case=False).any(), axis=1)], 1)
+        fts_ms, page = timed(lambda: fetch_page(conn, "BillingReadings", search=args.term, page_size=50), 20)
+        conn.close()
+
+    print(f"rows               : {args.rows}")
+    print(f"apply scan         : {scan_ms:9.1f} ms  ({len(scan)} matches)")
+    print(f"FTS5 (first page)  : {fts_ms:9.1f} ms  ({len(page)} shown)")
+    print(f"speedup            : {scan_ms / fts_ms:9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# Description: Cold-start cost of the Streamlit app: import time of its modules and time to first
+# render, each measured in a fresh interpreter so nothing is already in sys.modules, plus the time
+# to render each page of the sidebar menu.
+# Usage: python benchmarks/bench_startup.py [--app appchanged.py] [--rounds 5] [--top 15] [--pages]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app's own imports, i.e. what a cold container pays before the first page can render
+APP_IMPORTS = "import streamlit, pandas, billing.crud, billing.rates, billing.schema, billing.jobs, billing.table_query"
+
+IMPORT_SNIPPET = """
+import sys, time
+sys.path.insert(0, {repo!r})
+sys.stderr.write("-- app imports --\\n")
+start = time.perf_counter()
+{imports}
+print(time.perf_counter() - start)
+"""
+
+# Streamlit itself is imported before timing starts: the server has it loaded before any script runs
+RENDER_SNIPPET = """
+import sys, time
+sys.path.insert(0, {repo!r})
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=120).run()
+elapsed = time.perf_counter() - start
+if at.exception:
+    sys.exit("App raised: " + at.exception[0].message)
+print(elapsed)
+"""
+
+# Every section and page of the sidebar menu in turn, after the first render
+PAGES_SNIPPET = """
+import json, sys, time
+sys.path.insert(0, {repo!r})
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120).run()
+seconds = {{}}
+for section in at.sidebar.radio[0].options:
+    at.sidebar.radio[0].set_value(section).run()
+    for page in at.sidebar.radio[1].options:
+        start = time.perf_counter()
+        at.sidebar.radio[1].set_value(page).run()
+        if at.exception:
+            sys.exit(f"{{section}} / {{page}} raised: " + at.exception[0].message)
+        seconds[f"{{section}} / {{page}}"] = time.perf_counter() - start
+print(json.dumps(seconds))
+"""
+
+
+def _run(snippet, cwd, *flags):
+    result = subprocess.run([sys.executable, *flags, "-c", snippet], cwd=cwd, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return result
+
+
+# Seconds to import the app's modules in a fresh interpreter
+def cold_import_seconds(imports=APP_IMPORTS, cwd=None):
+    return float(_run(IMPORT_SNIPPET.format(repo=REPO_DIR, imports=imports), cwd or REPO_DIR).stdout)
+
+
+# Seconds from starting the script to the end of its first run (first page rendered), fresh interpreter.
+# The app opens its database relative to cwd, so pass a directory holding the database to measure.
+def first_render_seconds(app="appchanged.py", cwd=None):
+    app = os.path.join(REPO_DIR, app)
+    with tempfile.TemporaryDirectory() as tmp:
+        return float(_run(RENDER_SNIPPET.format(repo=REPO_DIR, app=app), cwd or tmp).stdout.splitlines()[-1])
+
+
+# Seconds to render each page of the menu ("section / page"), fresh interpreter; raises when a
+# page raises. Like first_render_seconds, the database is opened relative to cwd.
+def page_render_seconds(app="appchanged.py", cwd=None):
+    app = os.path.join(REPO_DIR, app)
+    with tempfile.TemporaryDirectory() as tmp:
+        return json.loads(_run(PAGES_SNIPPET.format(repo=REPO_DIR, app=app), cwd or tmp).stdout.splitlines()[-1])
+
+
+# Heaviest top-level imports from `python -X importtime`: [(module, cumulative seconds)]
+def import_profile(imports=APP_IMPORTS, top=15):
+    stderr = _run(IMPORT_SNIPPET.format(repo=REPO_DIR, imports=imports), REPO_DIR, "-X", "importtime").stderr
+    modules = []
+    # Interpreter startup (site, encodings) is logged before the marker and left out
+    for line in stderr.split("-- app imports --", 1)[1].splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # indentation marks modules imported by another module
+            modules.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(modules, key=lambda module: module[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app", default="appchanged.py", help="Streamlit script, relative to the repo root")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="number of modules in the import profile")
+    parser.add_argument("--pages", action="store_true", help="also time rendering every page of the menu")
+    args = parser.parse_args()
+
+    print("Heaviest imports (python -X importtime, cumulative):")
+    for name, seconds in import_profile(top=args.top):
+        print(f"  {name:<40}{seconds * 1000:>9.1f} ms")
+
+    for label, measure in (("cold import", cold_import_seconds),
+                           ("first render", lambda: first_render_seconds(args.app))):
+        times = [measure() for _ in range(args.rounds)]
+        print(f"{label:<14} median {statistics.median(times) * 1000:.0f} ms, "
+              f"min {min(times) * 1000:.0f} ms over {args.rounds} runs")
+
+    if args.pages:
+        print("Page renders:")
+        for page, seconds in page_render_seconds(args.app).items():
+            print(f"  {page:<60}{seconds * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
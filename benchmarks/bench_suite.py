@@ -0,0 +1,222 @@
+# Description: Hot-path benchmark suite on a synthetic colony database, compared against stored
+# baselines. Each benchmark runs a warm-up round then N timed rounds; the median is compared with
+# the baseline for the same scale and the run fails when it is slower by more than the threshold.
+# Usage: python benchmarks/bench_suite.py [--flats 1000] [--months 12] [--rounds 20]
+#        [--only insert_bill update_bill ...] [--save-baseline] [--threshold 0.25]
+# tests/test_benchmarks.py runs every benchmark once on a small colony; the comparison with the
+# baselines runs under pytest only with BILLING_BENCHMARKS=1, or by hand with this script.
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from billing.bill_pdf import render_bills_zip, render_bulk_bills
+from billing.crud import get_consumption_history, get_table_data, insert_bill, update_bill
+from billing.schema import open_database
+from billing.table_query import count_rows, fetch_page
+from billing.writer import WriteQueue
+from bench_startup import cold_import_seconds, first_render_seconds
+from synthetic_data import generate
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DATA_DIR = os.path.join(tempfile.gettempdir(), "billing_bench")
+SESSIONS = 8  # admins saving at the same time in concurrent_updates
+
+
+# Generated databases are cached by scale and seed; each run works on a fresh copy
+def synthetic_db(flats, months, seed):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"synthetic_{flats}x{months}_seed{seed}.db")
+    if not os.path.exists(path):
+        print(f"Generating {flats} flats x {months} months into {path} ...")
+        generate(path + ".tmp", flats, months, seed=seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+class Context:
+    def __init__(self, db, seed):
+        self.db = db
+        self.rng = random.Random(seed)
+        with db.connection() as conn:
+            self.flats = [row[0] for row in conn.execute("SELECT FlatNo FROM Flats ORDER BY FlatNo")]
+            self.people = dict(conn.execute("SELECT FlatNo, MIN(PersonID) FROM Users GROUP BY FlatNo"))
+            self.last_month = conn.execute("SELECT MAX(BillingMonth) FROM BillingReadings").fetchone()[0]
+        year, month = map(int, self.last_month.split("-"))
+        self.next_month = f"{year + month // 12}-{month % 12 + 1:02d}"
+        self.unbilled = list(self.flats)
+        self.rng.shuffle(self.unbilled)
+        self.writer = None  # started by the first benchmark that writes through the queue
+
+
+# Each benchmark takes the Context and runs one operation
+def bench_insert_bill(ctx):
+    flat_no = ctx.unbilled.pop()
+    insert_bill(ctx.db, ctx.people[flat_no], flat_no, ctx.next_month, 1e6, 1.5, 17.0, 0.0, 310.0)
+
+
+def bench_update_bill(ctx):
+    update_bill(ctx.db, ctx.rng.choice(ctx.flats), ctx.last_month, gst=ctx.rng.uniform(5, 20))
+
+
+# A burst of bill corrections from several sessions at once, saved through the shared write queue
+def bench_concurrent_updates(ctx):
+    if ctx.writer is None:
+        ctx.writer = WriteQueue(ctx.db)
+    updates = [(ctx.rng.choice(ctx.flats), ctx.rng.uniform(5, 20)) for _ in range(SESSIONS * 10)]
+
+    def session(updates):
+        for flat_no, gst in updates:
+            ctx.writer.call(update_bill, flat_no, ctx.last_month, gst=gst)
+
+    with ThreadPoolExecutor(SESSIONS) as pool:
+        list(pool.map(session, [updates[i::SESSIONS] for i in range(SESSIONS)]))
+
+
+def bench_get_table_data(ctx):
+    get_table_data(ctx.db, "Users")
+
+
+def bench_get_consumption_history(ctx):
+    get_consumption_history(ctx.db, flat_no=ctx.rng.choice(ctx.flats))
+
+
+# The Billing Records page's General Search: count plus first page of matches
+def bench_billing_records_search(ctx):
+    term = ctx.rng.choice(ctx.flats)
+    with ctx.db.connection() as conn:
+        count_rows(conn, "BillingReadings", search=term)
+        fetch_page(conn, "BillingReadings", search=term, page=1, page_size=50)
+
+
+def bench_bulk_pdf(ctx):
+    with ctx.db.connection() as conn:
+        render_bulk_bills(conn, ctx.last_month).close()
+
+
+def bench_bills_zip(ctx):
+    with ctx.db.connection() as conn:
+        render_bills_zip(conn, ctx.last_month).close()
+
+
+# Cold start, measured in a fresh interpreter; these return their own timing so process
+# start-up isn't counted
+def bench_cold_import(ctx):
+    return cold_import_seconds()
+
+
+def bench_first_render(ctx):
+    return first_render_seconds()
+
+
+# name -> (benchmark, default rounds)
+BENCHMARKS = {
+    "insert_bill": (bench_insert_bill, 50),
+    "update_bill": (bench_update_bill, 50),
+    "concurrent_updates": (bench_concurrent_updates, 10),
+    "get_table_data": (bench_get_table_data, 20),
+    "get_consumption_history": (bench_get_consumption_history, 50),
+    "billing_records_search": (bench_billing_records_search, 50),
+    "bulk_pdf": (bench_bulk_pdf, 3),
+    "bills_zip": (bench_bills_zip, 3),
+    "cold_import": (bench_cold_import, 5),
+    "first_render": (bench_first_render, 5),
+}
+
+
+def run_benchmark(func, ctx, rounds):
+    func(ctx)  # warm-up: caches, tariff index, first-use imports
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        elapsed = func(ctx)
+        times.append(time.perf_counter() - start if elapsed is None else elapsed)
+    return {"rounds": rounds, "min": min(times), "max": max(times), "mean": statistics.mean(times),
+            "median": statistics.median(times), "stddev": statistics.stdev(times) if rounds > 1 else 0.0}
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flats", type=int, default=1000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rounds", type=int, help="timed rounds per benchmark (default: per benchmark)")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline for its scale")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fail when a median is this much slower than the baseline (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    scale = f"flats={args.flats},months={args.months},seed={args.seed}"
+    source = synthetic_db(args.flats, args.months, args.seed)
+    baselines = load_baselines(args.baseline)
+    baseline = baselines.get(scale, {}).get("results", {})
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        shutil.copyfile(source, path)
+        db = open_database(path)  # as the app opens it; brings databases generated earlier up to date
+        ctx = Context(db, args.seed)
+        cwd = os.getcwd()
+        os.chdir(tmp)  # keep the bill cache and any PDFs out of the working tree
+        try:
+            for name in args.only or BENCHMARKS:
+                func, rounds = BENCHMARKS[name]
+                results[name] = run_benchmark(func, ctx, args.rounds or rounds)
+        finally:
+            os.chdir(cwd)
+            if ctx.writer is not None:
+                ctx.writer.close()
+            db.close()
+
+    print(f"\n{scale}")
+    print(f"{'benchmark':<26}{'rounds':>7}{'min ms':>10}{'median ms':>11}{'mean ms':>10}{'stddev':>9}"
+          f"{'baseline':>10}{'change':>9}")
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name, {}).get("median")
+        change = stats["median"] / base - 1 if base else None
+        flag = ""
+        if change is not None and change > args.threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<26}{stats['rounds']:>7}{stats['min'] * 1000:>10.2f}{stats['median'] * 1000:>11.2f}"
+              f"{stats['mean'] * 1000:>10.2f}{stats['stddev'] * 1000:>9.2f}"
+              f"{f'{base * 1000:.2f}' if base else '-':>10}{f'{change:+.0%}' if change is not None else '-':>9}{flag}")
+
+    if args.save_baseline:
+        entry = baselines.setdefault(scale, {"results": {}})
+        entry.update({"saved": date.today().isoformat(), "python": platform.python_version(),
+                      "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs"})
+        entry["results"].update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline saved to {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} benchmark(s) more than {args.threshold:.0%} slower than baseline: "
+              + ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+# Description: Synthetic colony database for benchmarks: Flats, Users, tariff/GST/duty/surcharge
+# rates and several years of BillingReadings, surcharges and BillingCharges. The same seed and scale
+# always produce the same data. Loads go through the production triggers' deferred bulk paths.
+# Usage: python benchmarks/synthetic_data.py synthetic.db [--flats 100000] [--months 36]
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from billing.aggregates import deferred_aggregates
+from billing.batch_billing import compute_bills
+from billing.db import ConnectionPool, PRAGMAS
+from billing.money import CHARGE_COLUMNS, bill_columns, bill_lines
+from billing.schema import prepare_database
+from billing.search_index import deferred_search_index
+from billing.surcharges import populate_month_surcharges
+from billing.tariff import get_tariff_index
+
+# Base tables as the app expects them (indexes, search indexes and summaries come from prepare_database)
+SCHEMA = """
+CREATE TABLE Flats (
+  FlatNo VARCHAR(50) PRIMARY KEY,
+  Location VARCHAR(255)
+);
+CREATE TABLE Users (
+  PersonID INTEGER PRIMARY KEY,
+  Name VARCHAR(255),
+  FlatNo VARCHAR(50) REFERENCES Flats(FlatNo) ON DELETE SET NULL,
+  UserType VARCHAR(20) DEFAULT 'Residential',
+  AutoClassification VARCHAR(20) CHECK (AutoClassification IN ('Protected', 'Unprotected')) DEFAULT NULL,
+  ManualClassification VARCHAR(20) CHECK (ManualClassification IN ('Protected', 'Unprotected')) DEFAULT NULL,
+  LoadSanctioned FLOAT,
+  Phase VARCHAR(10) CHECK (Phase IN ('1-Phase', '3-Phase'))
+);
+CREATE TABLE UserClassification (
+  ClassificationID INTEGER PRIMARY KEY AUTOINCREMENT,
+  PersonID INTEGER REFERENCES Users(PersonID) ON DELETE SET NULL,
+  FlatNo VARCHAR(50) REFERENCES Flats(FlatNo) ON DELETE SET NULL,
+  ClassificationType VARCHAR(20) CHECK (ClassificationType IN ('Auto', 'Manual')),
+  ClassificationValue VARCHAR(20) CHECK (ClassificationValue IN ('Protected', 'Unprotected')),
+  UpdatedByAdmin INTEGER DEFAULT NULL,
+  UpdateDate TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE TariffSlabs (
+  SlabID INTEGER PRIMARY KEY AUTOINCREMENT,
+  MinUnits INTEGER NOT NULL,
+  MaxUnits INTEGER NOT NULL,
+  RatePerUnit FLOAT NOT NULL,
+  RateEffectiveDate DATE NOT NULL
+);
+CREATE TABLE SurchargeType (
+  SurchargeTypeID INTEGER PRIMARY KEY AUTOINCREMENT,
+  TypeName VARCHAR(100) UNIQUE CHECK (TypeName IN ('Uniform Quarterly', 'Additional PHL', 'Fuel Charge'))
+);
+CREATE TABLE Surcharge (
+  SurchargeID INTEGER PRIMARY KEY AUTOINCREMENT,
+  SurchargeTypeID INTEGER REFERENCES SurchargeType(SurchargeTypeID),
+  RatePerUnit FLOAT DEFAULT 0.0,
+  UnitsFrom INTEGER CHECK (SurchargeTypeID = 1 OR UnitsFrom IS NULL),
+  UnitsTo INTEGER CHECK (SurchargeTypeID = 1 OR UnitsTo IS NULL),
+  EffectiveMonth DATE NOT NULL,
+  UNIQUE (SurchargeTypeID, EffectiveMonth, UnitsFrom, UnitsTo)
+);
+CREATE TABLE ReadingSurchargeMapping (
+  ID INTEGER PRIMARY KEY AUTOINCREMENT,
+  ReadingID INTEGER REFERENCES BillingReadings(ReadingID) ON DELETE CASCADE,
+  SurchargeID INTEGER REFERENCES Surcharge(SurchargeID) ON DELETE CASCADE,
+  BillingMonth DATE NOT NULL,
+  SurchargeAmount FLOAT DEFAULT 0,
+  UNIQUE (ReadingID, SurchargeID, BillingMonth)
+);
+CREATE TABLE SurchargeGSTDuty (
+  ID INTEGER PRIMARY KEY AUTOINCREMENT,
+  ReadingID INTEGER REFERENCES BillingReadings(ReadingID) ON DELETE CASCADE,
+  TotalSurcharge FLOAT DEFAULT 0 CHECK (TotalSurcharge >= 0),
+  GSTID INTEGER REFERENCES GSTRates(GSTID) ON DELETE SET NULL,
+  ElectricDutyID INTEGER REFERENCES ElectricDutyRates(DutyID) ON DELETE SET NULL,
+  GSTAmount FLOAT DEFAULT 0,
+  ElectricDutyAmount FLOAT DEFAULT 0,
+  UNIQUE (ReadingID)
+);
+CREATE TABLE GSTRates (
+  GSTID INTEGER PRIMARY KEY AUTOINCREMENT,
+  EffectiveDate DATE UNIQUE DEFAULT CURRENT_DATE,
+  GST FLOAT NOT NULL CHECK (GST >= 0)
+);
+CREATE TABLE ElectricDutyRates (
+  DutyID INTEGER PRIMARY KEY AUTOINCREMENT,
+  EffectiveDate DATE UNIQUE DEFAULT CURRENT_DATE,
+  ElectricDuty FLOAT NOT NULL CHECK (ElectricDuty >= 0)
+);
+CREATE TABLE BillingReadings (
+  ReadingID INTEGER PRIMARY KEY AUTOINCREMENT,
+  FlatNo VARCHAR(50) REFERENCES Flats(FlatNo) ON DELETE SET NULL,
+  BillingMonth DATE DEFAULT (DATE('now', 'start of month')),
+  ReadingDate DATE DEFAULT (DATE('now')),
+  PreviousReading FLOAT DEFAULT 0.0 NOT NULL,
+  PresentReading FLOAT DEFAULT 0.0 NOT NULL,
+  UnitsConsumed FLOAT GENERATED ALWAYS AS (ABS(PresentReading - PreviousReading)) VIRTUAL,
+  UnitsAdjusted FLOAT DEFAULT 0,
+  CorrectionStatus VARCHAR(20) DEFAULT 'Original' CHECK (CorrectionStatus IN ('Original', 'Corrected'))
+);
+CREATE TABLE AdditionalCharges (
+  ChargeID INTEGER PRIMARY KEY AUTOINCREMENT,
+  ReadingID INTEGER REFERENCES BillingReadings(ReadingID) ON DELETE CASCADE,
+  GSTID INTEGER REFERENCES GSTRates(GSTID) ON DELETE SET NULL,
+  ElectricDutyID INTEGER REFERENCES ElectricDutyRates(DutyID) ON DELETE SET NULL,
+  UNIQUE (ReadingID)
+);
+CREATE TABLE BillingCharges (
+  BillID INTEGER PRIMARY KEY AUTOINCREMENT,
+  ReadingID INTEGER REFERENCES BillingReadings(ReadingID) ON DELETE CASCADE,
+  RatePerUnit FLOAT, VariableCharges FLOAT DEFAULT 0.0 NOT NULL, ElectricDuty FLOAT, GST FLOAT, Surcharge FLOAT,
+  NetAmount FLOAT, PayableAmount FLOAT, BillGenerationDate TEXT DEFAULT (DATE('now')),
+  Status VARCHAR(20) CHECK (Status IN ('Paid', 'Unpaid', 'Due')), Remarks TEXT DEFAULT 'No remarks'
+);
+CREATE TABLE ConsumptionHistory (
+  ConsumptionID INTEGER PRIMARY KEY AUTOINCREMENT,
+  PersonID INTEGER REFERENCES Users(PersonID) ON DELETE SET NULL,
+  FlatNo VARCHAR(50) REFERENCES Flats(FlatNo) ON DELETE SET NULL,
+  BillingMonth DATE NOT NULL,
+  UnitsConsumed FLOAT,
+  RecordedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE Administrators (
+  AdminID INTEGER PRIMARY KEY AUTOINCREMENT,
+  Name VARCHAR(255),
+  Role VARCHAR(50)
+);
+"""
+
+BLOCKS = ["Block-A", "Block-B", "Block-C", "Block-D", "Block-E", "Block-F"]
+FIRST_NAMES = ["Ali", "Amna", "Bilal", "Fatima", "Hamza", "Hina", "Imran", "Sana", "Usman", "Zainab"]
+LAST_NAMES = ["Khan", "Ahmed", "Malik", "Qureshi", "Raza", "Shah", "Siddiqui", "Butt"]
+
+# (MinUnits, MaxUnits, RatePerUnit); a new schedule takes effect each January, 8% dearer
+TARIFF_SLABS = [(0, 100, 23.59), (101, 200, 30.07), (201, 300, 34.26), (301, 400, 39.15),
+                (401, 500, 41.36), (501, 600, 42.78), (601, 700, 43.92), (701, 1000000, 48.84)]
+PHL_SLABS = [(1, 200, 0.43), (201, 1000000, 3.23)]
+SURCHARGE_TYPES = ["Additional PHL", "Uniform Quarterly", "Fuel Charge"]
+GST_PERCENT = 17.0
+DUTY_PERCENT = 1.5
+
+
+def billing_months(start_month, months):
+    return [str(period) for period in pd.period_range(start_month, periods=months, freq="M")]
+
+
+# Statement by statement: executescript would commit the caller's transaction
+def create_schema(conn):
+    for statement in SCHEMA.split(";"):
+        if statement.strip():
+            conn.execute(statement)
+
+
+def insert_rates(conn, months):
+    years = sorted({month[:4] for month in months})
+    conn.executemany(
+        "INSERT INTO TariffSlabs (MinUnits, MaxUnits, RatePerUnit, RateEffectiveDate) VALUES (?, ?, ?, ?)",
+        [(low, high, round(rate * 1.08 ** i, 2), f"{year}-01-01")
+         for i, year in enumerate(years) for low, high, rate in TARIFF_SLABS])
+    conn.executemany("INSERT INTO GSTRates (EffectiveDate, GST) VALUES (?, ?)",
+                     [(f"{year}-01-01", GST_PERCENT) for year in years])
+    conn.executemany("INSERT INTO ElectricDutyRates (EffectiveDate, ElectricDuty) VALUES (?, ?)",
+                     [(f"{year}-01-01", DUTY_PERCENT) for year in years])
+    conn.executemany("INSERT INTO SurchargeType (TypeName) VALUES (?)", [(name,) for name in SURCHARGE_TYPES])
+
+    # Slab-based PHL per year, a quarterly uniform charge and a monthly fuel adjustment
+    rows = [(1, rate, low, high, f"{year}-01") for year in years for low, high, rate in PHL_SLABS]
+    rows += [(2, 1.7432, None, None, month) for month in months if int(month[5:]) % 3 == 1]
+    rows += [(3, round(0.5 + 0.1 * (i % 12), 2), None, None, month) for i, month in enumerate(months)]
+    conn.executemany("""
+        INSERT INTO Surcharge (SurchargeTypeID, RatePerUnit, UnitsFrom, UnitsTo, EffectiveMonth)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+
+
+# One flat per FlatNo, one user per flat plus a second occupant in ~5% of flats
+def insert_people(conn, rng, flats):
+    flat_nos = np.array([f"Flat-{i:07d}" for i in range(1, flats + 1)])
+    conn.executemany("INSERT INTO Flats (FlatNo, Location) VALUES (?, ?)",
+                     zip(flat_nos, rng.choice(BLOCKS, flats)))
+
+    owners = np.arange(flats)
+    occupants = np.flatnonzero(rng.random(flats) < 0.05)
+    person_flats = np.concatenate([owners, occupants])
+    names = [f"{first} {last}" for first, last in zip(rng.choice(FIRST_NAMES, len(person_flats)),
+                                                        rng.choice(LAST_NAMES, len(person_flats)))]
+    conn.executemany("""
+        INSERT INTO Users (PersonID, Name, FlatNo, UserType, LoadSanctioned, Phase)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, zip(range(100001, 100001 + len(person_flats)), names, flat_nos[person_flats],
+             np.where(rng.random(len(person_flats)) < 0.9, "Residential", "Commercial"),
+             rng.choice([1.0, 2.0, 3.0, 5.0], len(person_flats)),
+             np.where(rng.random(len(person_flats)) < 0.8, "1-Phase", "3-Phase")))
+    return flat_nos
+
+
+# One month of readings, surcharges and charges. Older months are mostly paid; the latest is due.
+def insert_month(conn, rng, month, flat_nos, present, months_left):
+    units = np.round(rng.gamma(2.0, 120.0, len(flat_nos)), 1)
+    adjusted = np.where(rng.random(len(flat_nos)) < 0.02, np.round(rng.uniform(1, 50, len(flat_nos)), 1), 0.0)
+    readings = pd.DataFrame({"FlatNo": flat_nos, "PresentReading": np.round(present + units, 1),
+                             "UnitsAdjusted": adjusted, "ElectricDuty": DUTY_PERCENT, "GST": GST_PERCENT,
+                             "Surcharge": 0.0})
+    previous = pd.DataFrame({"FlatNo": flat_nos, "PreviousReading": present})
+    bills = compute_bills(readings, previous, get_tariff_index(conn), month)
+
+    before = conn.execute("SELECT COALESCE(MAX(ReadingID), 0) FROM BillingReadings").fetchone()[0]
+    conn.executemany("""
+        INSERT INTO BillingReadings (FlatNo, BillingMonth, ReadingDate, PreviousReading, PresentReading, UnitsAdjusted)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, zip(bills["FlatNo"], [month] * len(bills), [f"{month}-01"] * len(bills), bills["PreviousReading"],
+             bills["PresentReading"], bills["UnitsAdjusted"]))
+    bills["ReadingID"] = [row[0] for row in conn.execute(
+        "SELECT ReadingID FROM BillingReadings WHERE ReadingID > ? ORDER BY ReadingID", (before,))]
+
+    populate_month_surcharges(conn, month, SURCHARGE_TYPES)
+    surcharges = pd.read_sql_query("""
+        SELECT ReadingID, TotalSurcharge + GSTAmount + ElectricDutyAmount AS Surcharge
+        FROM SurchargeGSTDuty WHERE ReadingID > ?
+    """, conn, params=(before,))
+    bills = bills.drop(columns="Surcharge").merge(surcharges, on="ReadingID", how="left")
+    surcharge = bills["Surcharge"].fillna(0.0).to_numpy()
+    bills = bills.assign(**bill_columns(bill_lines(
+        bills["UnitsConsumed"].to_numpy(), bills["RatePerUnit"].to_numpy(), DUTY_PERCENT, GST_PERCENT, surcharge)))
+
+    if months_left == 0:
+        status = np.full(len(bills), "Due")
+    else:
+        paid_share = 0.6 if months_left == 1 else 0.97
+        status = np.where(rng.random(len(bills)) < paid_share, "Paid", "Unpaid")
+    conn.executemany(f"""
+        INSERT INTO BillingCharges (ReadingID, RatePerUnit, {", ".join(CHARGE_COLUMNS)}, BillGenerationDate, Status)
+        VALUES (?, ?, {", ".join("?" * len(CHARGE_COLUMNS))}, ?, ?)
+    """, zip(*(bills[column].tolist() for column in ["ReadingID", "RatePerUnit", *CHARGE_COLUMNS]),
+             [f"{month}-01"] * len(bills), status.tolist()))
+    return bills["PresentReading"].to_numpy()
+
+
+# Build a database at `path` (which must not exist). Returns the billing months generated.
+def generate(path, flats=1000, months=24, start_month="2023-01", seed=42, progress=None):
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    rng = np.random.default_rng(seed)
+    month_list = billing_months(start_month, months)
+
+    db = ConnectionPool(path, size=1, pragmas=dict(PRAGMAS, synchronous="OFF"))
+    with db.transaction() as conn:
+        create_schema(conn)
+        prepare_database(conn)
+        insert_rates(conn, month_list)
+        with deferred_search_index(conn, ["Users"]):
+            flat_nos = insert_people(conn, rng, flats)
+
+    present = np.round(rng.uniform(1000, 20000, flats), 1)
+    for i, month in enumerate(month_list):
+        with db.transaction() as conn, deferred_search_index(conn), deferred_aggregates(conn):
+            present = insert_month(conn, rng, month, flat_nos, present, len(month_list) - 1 - i)
+        if progress:
+            progress(month, i + 1, len(month_list))
+
+    with db.connection() as conn:
+        conn.execute("ANALYZE")
+    db.close()
+    return month_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic billing database.")
+    parser.add_argument("path")
+    parser.add_argument("--flats", type=int, default=1000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--start-month", default="2023-01")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+
+    def report(month, done, total):
+        print(f"\r{month}: {done}/{total} months, {time.perf_counter() - start:.1f} s", end="", flush=True)
+
+    generate(args.path, args.flats, args.months, args.start_month, args.seed, progress=report)
+    print(f"\n{args.flats} flats x {args.months} months written to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+# Description: Electricity billing core: database access, tariff and bill calculation, bill PDFs,
+# imports, exports and archiving. Nothing here imports Streamlit; the apps and the CLI
+# (python -m billing) are clients of this package.
@@ -0,0 +1,256 @@
+# Description: Trigger-maintained ConsumptionHistory and materialized per-month / per-flat billing
+# aggregates. Every BillingReadings or BillingCharges write adjusts one row of each summary.
+# Revenue is summed exactly in integer paisa (RevenuePaisa); the rupee Revenue column follows it.
+from contextlib import contextmanager
+
+import pandas as pd
+
+SUMMARY_TABLES = {"MonthlyBillingSummary": "BillingMonth", "FlatBillingSummary": "FlatNo"}
+
+# Payable paisa of a group of charge rows `c`; integer SUM is exact, and 0 for no rows
+_PAYABLE_PAISA = "COALESCE(SUM(c.PayableAmountPaisa), 0)"
+_REVENUE_UPDATE = ("RevenuePaisa = RevenuePaisa + excluded.RevenuePaisa, "
+                   "Revenue = (RevenuePaisa + excluded.RevenuePaisa) / 100.0")
+
+
+# Units a reading bills, same as the bill calculation
+def _units(row):
+    return f"ABS({row}.PresentReading - {row}.PreviousReading) + COALESCE({row}.UnitsAdjusted, 0)"
+
+
+# Add (sign=+1) or remove (sign=-1) one reading's units from a summary row
+def _units_delta(table_name, key, row, sign):
+    return f"""
+        INSERT INTO {table_name} ({key}, TotalUnits) SELECT {row}.{key}, {sign} * ({_units(row)})
+        WHERE {row}.{key} IS NOT NULL
+        ON CONFLICT({key}) DO UPDATE SET TotalUnits = TotalUnits + excluded.TotalUnits;"""
+
+
+# Add or remove charges from a summary row; `source` yields one row of charge columns
+def _charges_delta(table_name, key, key_value, source, sign):
+    return f"""
+        INSERT INTO {table_name} ({key}, Bills, RevenuePaisa, Revenue, PaidCount, UnpaidCount, DueCount)
+        SELECT {key_value}, {sign} * COUNT(*), {sign} * {_PAYABLE_PAISA}, {sign} * {_PAYABLE_PAISA} / 100.0,
+               {sign} * TOTAL(c.Status IS 'Paid'), {sign} * TOTAL(c.Status IS 'Unpaid'), {sign} * TOTAL(c.Status IS 'Due')
+        FROM {source}
+        GROUP BY 1 HAVING {key_value} IS NOT NULL
+        ON CONFLICT({key}) DO UPDATE SET Bills = Bills + excluded.Bills, {_REVENUE_UPDATE},
+            PaidCount = PaidCount + excluded.PaidCount, UnpaidCount = UnpaidCount + excluded.UnpaidCount,
+            DueCount = DueCount + excluded.DueCount;"""
+
+
+# A charge row together with its reading; empty once the reading is gone (cascade deletes)
+def _charge_source(row):
+    return (f"(SELECT {row}.PayableAmountPaisa AS PayableAmountPaisa, {row}.Status AS Status) c"
+            f" JOIN BillingReadings br ON br.ReadingID = {row}.ReadingID")
+
+
+def _readings_children(row):
+    return f"BillingCharges c WHERE c.ReadingID = {row}.ReadingID"
+
+
+def _trigger_statements():
+    triggers = {}
+
+    # ConsumptionHistory follows BillingReadings
+    triggers["trg_consumption_ai"] = f"""AFTER INSERT ON BillingReadings BEGIN
+        INSERT INTO ConsumptionHistory (PersonID, FlatNo, BillingMonth, UnitsConsumed)
+        VALUES ((SELECT MIN(PersonID) FROM Users WHERE FlatNo = new.FlatNo), new.FlatNo, new.BillingMonth, {_units("new")});
+    END"""
+    triggers["trg_consumption_au"] = f"""AFTER UPDATE OF FlatNo, BillingMonth, PreviousReading, PresentReading, UnitsAdjusted
+        ON BillingReadings BEGIN
+        UPDATE ConsumptionHistory
+        SET FlatNo = new.FlatNo, BillingMonth = new.BillingMonth, UnitsConsumed = {_units("new")},
+            PersonID = (SELECT MIN(PersonID) FROM Users WHERE FlatNo = new.FlatNo), RecordedAt = CURRENT_TIMESTAMP
+        WHERE FlatNo = old.FlatNo AND BillingMonth = old.BillingMonth;
+    END"""
+    triggers["trg_consumption_ad"] = """AFTER DELETE ON BillingReadings BEGIN
+        DELETE FROM ConsumptionHistory WHERE FlatNo = old.FlatNo AND BillingMonth = old.BillingMonth;
+    END"""
+
+    readings_ai, readings_au, readings_bd, charges_ai, charges_au, charges_ad = ([] for _ in range(6))
+    for table_name, key in SUMMARY_TABLES.items():
+        readings_ai.append(_units_delta(table_name, key, "new", 1))
+        readings_au.append(_units_delta(table_name, key, "old", -1))
+        readings_au.append(_units_delta(table_name, key, "new", 1))
+        # A reading moving to another month/flat takes its charges with it
+        readings_au.append(_charges_delta(table_name, key, f"old.{key}", _readings_children("old"), -1))
+        readings_au.append(_charges_delta(table_name, key, f"new.{key}", _readings_children("new"), 1))
+        # Remove units and any charges still attached before the reading (and its cascade) goes
+        readings_bd.append(_units_delta(table_name, key, "old", -1))
+        readings_bd.append(_charges_delta(table_name, key, f"old.{key}", _readings_children("old"), -1))
+
+        charges_ai.append(_charges_delta(table_name, key, f"br.{key}", _charge_source("new"), 1))
+        charges_au.append(_charges_delta(table_name, key, f"br.{key}", _charge_source("old"), -1))
+        charges_au.append(_charges_delta(table_name, key, f"br.{key}", _charge_source("new"), 1))
+        charges_ad.append(_charges_delta(table_name, key, f"br.{key}", _charge_source("old"), -1))
+
+    triggers["trg_summary_readings_ai"] = "AFTER INSERT ON BillingReadings BEGIN" + "".join(readings_ai) + "\n    END"
+    triggers["trg_summary_readings_au"] = ("AFTER UPDATE OF FlatNo, BillingMonth, PreviousReading, PresentReading, UnitsAdjusted"
+                                           " ON BillingReadings BEGIN" + "".join(readings_au) + "\n    END")
+    triggers["trg_summary_readings_bd"] = "BEFORE DELETE ON BillingReadings BEGIN" + "".join(readings_bd) + "\n    END"
+    triggers["trg_summary_charges_ai"] = "AFTER INSERT ON BillingCharges BEGIN" + "".join(charges_ai) + "\n    END"
+    triggers["trg_summary_charges_au"] = ("AFTER UPDATE OF ReadingID, PayableAmountPaisa, Status ON BillingCharges BEGIN"
+                                          + "".join(charges_au) + "\n    END")
+    triggers["trg_summary_charges_ad"] = "AFTER DELETE ON BillingCharges BEGIN" + "".join(charges_ad) + "\n    END"
+    return triggers
+
+
+# Recompute both summaries from scratch (initial load, or after a bulk repair). Only live rows
+# are counted, so months already moved to the archive drop out of the summaries.
+def rebuild_aggregates(conn):
+    for table_name, key in SUMMARY_TABLES.items():
+        conn.execute(f"DELETE FROM {table_name}")
+        conn.execute(f"""
+            INSERT INTO {table_name} ({key}, TotalUnits)
+            SELECT br.{key}, TOTAL({_units("br")}) FROM BillingReadings br
+            WHERE br.{key} IS NOT NULL GROUP BY br.{key}
+        """)
+        conn.execute(f"""
+            INSERT INTO {table_name} ({key}, Bills, RevenuePaisa, Revenue, PaidCount, UnpaidCount, DueCount)
+            SELECT br.{key}, COUNT(*), {_PAYABLE_PAISA}, {_PAYABLE_PAISA} / 100.0, TOTAL(c.Status IS 'Paid'),
+                   TOTAL(c.Status IS 'Unpaid'), TOTAL(c.Status IS 'Due')
+            FROM BillingCharges c JOIN BillingReadings br ON br.ReadingID = c.ReadingID
+            WHERE br.{key} IS NOT NULL GROUP BY br.{key}
+            ON CONFLICT({key}) DO UPDATE SET Bills = excluded.Bills, RevenuePaisa = excluded.RevenuePaisa,
+                Revenue = excluded.Revenue,
+                PaidCount = excluded.PaidCount, UnpaidCount = excluded.UnpaidCount, DueCount = excluded.DueCount
+        """)
+
+
+# One month's share of each summary: {table: [(key, TotalUnits, Bills, RevenuePaisa, Paid, Unpaid, Due)]}.
+# Taken before a month's rows are archived so add_contributions can put it back afterwards.
+def month_contributions(conn, billing_month):
+    contributions = {}
+    for table_name, key in SUMMARY_TABLES.items():
+        contributions[table_name] = conn.execute(f"""
+            SELECT k, TOTAL(Units), TOTAL(Bills), SUM(RevenuePaisa), TOTAL(Paid), TOTAL(Unpaid), TOTAL(Due)
+            FROM (SELECT br.{key} AS k, {_units("br")} AS Units, COUNT(c.BillID) AS Bills,
+                         {_PAYABLE_PAISA} AS RevenuePaisa, TOTAL(c.Status IS 'Paid') AS Paid,
+                         TOTAL(c.Status IS 'Unpaid') AS Unpaid, TOTAL(c.Status IS 'Due') AS Due
+                  FROM BillingReadings br LEFT JOIN BillingCharges c ON c.ReadingID = br.ReadingID
+                  WHERE br.BillingMonth = ? GROUP BY br.ReadingID)
+            WHERE k IS NOT NULL GROUP BY k
+        """, (billing_month,)).fetchall()
+    return contributions
+
+
+def add_contributions(conn, contributions):
+    for table_name, rows in contributions.items():
+        key = SUMMARY_TABLES[table_name]
+        conn.executemany(f"""
+            INSERT INTO {table_name} ({key}, TotalUnits, Bills, RevenuePaisa, PaidCount, UnpaidCount, DueCount, Revenue)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?4 / 100.0)
+            ON CONFLICT({key}) DO UPDATE SET TotalUnits = TotalUnits + excluded.TotalUnits,
+                Bills = Bills + excluded.Bills, {_REVENUE_UPDATE},
+                PaidCount = PaidCount + excluded.PaidCount, UnpaidCount = UnpaidCount + excluded.UnpaidCount,
+                DueCount = DueCount + excluded.DueCount
+        """, rows)
+
+
+# Insert triggers replaced by set-based statements during deferred_aggregates
+DEFERRED_TRIGGERS = ["trg_consumption_ai", "trg_summary_readings_ai", "trg_summary_charges_ai"]
+
+
+# For insert-only bulk loads inside the caller's transaction: the per-row insert triggers are
+# dropped for the duration, then ConsumptionHistory and both summaries catch up on the new
+# readings and charges in a few set-based statements. On error the rollback restores them.
+@contextmanager
+def deferred_aggregates(conn):
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='trigger'")}
+    deferred = [name for name in DEFERRED_TRIGGERS if name in existing]
+    reading_mark = conn.execute("SELECT COALESCE(MAX(ReadingID), 0) FROM BillingReadings").fetchone()[0]
+    bill_mark = conn.execute("SELECT COALESCE(MAX(BillID), 0) FROM BillingCharges").fetchone()[0]
+    for name in deferred:
+        conn.execute(f"DROP TRIGGER {name}")
+    yield
+
+    if "trg_consumption_ai" in deferred:
+        conn.execute(f"""
+            INSERT INTO ConsumptionHistory (PersonID, FlatNo, BillingMonth, UnitsConsumed)
+            SELECT (SELECT MIN(PersonID) FROM Users u WHERE u.FlatNo = br.FlatNo), br.FlatNo, br.BillingMonth,
+                   {_units("br")}
+            FROM BillingReadings br WHERE br.ReadingID > ? ORDER BY br.ReadingID
+        """, (reading_mark,))
+    if "trg_summary_readings_ai" in deferred and "trg_summary_charges_ai" in deferred:
+        contributions = {}
+        for table_name, key in SUMMARY_TABLES.items():
+            contributions[table_name] = conn.execute(f"""
+                SELECT br.{key}, TOTAL({_units("br")}), 0, 0, 0, 0, 0 FROM BillingReadings br
+                WHERE br.ReadingID > ? AND br.{key} IS NOT NULL GROUP BY br.{key}
+            """, (reading_mark,)).fetchall() + conn.execute(f"""
+                SELECT br.{key}, 0, COUNT(*), {_PAYABLE_PAISA}, TOTAL(c.Status IS 'Paid'),
+                       TOTAL(c.Status IS 'Unpaid'), TOTAL(c.Status IS 'Due')
+                FROM BillingCharges c JOIN BillingReadings br ON br.ReadingID = c.ReadingID
+                WHERE c.BillID > ? AND br.{key} IS NOT NULL GROUP BY br.{key}
+            """, (bill_mark,)).fetchall()
+        add_contributions(conn, contributions)
+    statements = _trigger_statements()
+    for name in deferred:
+        conn.execute(f"CREATE TRIGGER {name} {statements[name]}")
+
+
+# Give summaries from before RevenuePaisa the column, in place: a rebuild from live rows would drop
+# the share of archived months. Live bills add their exact paisa; what Revenue holds beyond them
+# (the archived share) is rounded to the paisa once.
+def _add_revenue_paisa(conn, table_name, key):
+    conn.execute(f"ALTER TABLE {table_name} ADD COLUMN RevenuePaisa INTEGER DEFAULT 0 NOT NULL")
+    conn.execute(f"UPDATE {table_name} SET RevenuePaisa = CAST(ROUND(Revenue * 100) AS INTEGER)")
+    conn.execute(f"""
+        UPDATE {table_name} SET RevenuePaisa = live.Paisa + CAST(ROUND(({table_name}.Revenue - live.Rupees) * 100) AS INTEGER)
+        FROM (SELECT br.{key} AS k, {_PAYABLE_PAISA} AS Paisa, TOTAL(c.PayableAmount) AS Rupees
+              FROM BillingCharges c JOIN BillingReadings br ON br.ReadingID = c.ReadingID
+              WHERE br.{key} IS NOT NULL GROUP BY br.{key}) live
+        WHERE {table_name}.{key} = live.k
+    """)
+    conn.execute(f"UPDATE {table_name} SET Revenue = RevenuePaisa / 100.0")
+
+
+# Create the summary tables and triggers if missing; populate the summaries on first creation.
+# Summaries from before RevenuePaisa are migrated in place and get triggers that sum it. A database
+# whose BillingCharges has no PayableAmount (so no PayableAmountPaisa) has nothing to summarise and is left alone.
+def ensure_aggregates(conn):
+    if "PayableAmountPaisa" not in {row[1] for row in conn.execute("PRAGMA table_info(BillingCharges)")}:
+        return False
+    created = False
+    for table_name, key in SUMMARY_TABLES.items():
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,)).fetchone()
+        if exists and "RevenuePaisa" not in {row[1] for row in conn.execute(f"PRAGMA table_info({table_name})")}:
+            _add_revenue_paisa(conn, table_name, key)
+            for name in _trigger_statements():
+                conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        elif not exists:
+            conn.execute(f"""
+                CREATE TABLE {table_name} (
+                  {key} VARCHAR(50) PRIMARY KEY,
+                  Bills INTEGER DEFAULT 0 NOT NULL,
+                  TotalUnits FLOAT DEFAULT 0 NOT NULL,
+                  Revenue FLOAT DEFAULT 0 NOT NULL,
+                  RevenuePaisa INTEGER DEFAULT 0 NOT NULL,
+                  PaidCount INTEGER DEFAULT 0 NOT NULL,
+                  UnpaidCount INTEGER DEFAULT 0 NOT NULL,
+                  DueCount INTEGER DEFAULT 0 NOT NULL
+                )
+            """)
+            created = True
+    for name, body in _trigger_statements().items():
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+    if created:
+        rebuild_aggregates(conn)
+    return created
+
+
+def get_monthly_summary(conn, billing_month=None):
+    query, params = "SELECT * FROM MonthlyBillingSummary", []
+    if billing_month:
+        query += " WHERE BillingMonth = ?"
+        params.append(billing_month)
+    return pd.read_sql_query(query + " ORDER BY BillingMonth DESC", conn, params=params)
+
+
+def get_flat_summary(conn, flat_no=None):
+    query, params = "SELECT * FROM FlatBillingSummary", []
+    if flat_no:
+        query += " WHERE FlatNo = ?"
+        params.append(flat_no)
+    return pd.read_sql_query(query + " ORDER BY FlatNo", conn, params=params)
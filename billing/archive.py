@@ -0,0 +1,224 @@
+# Description: Columnar archive of closed billing months and streamed Arrow exports. Closed months
+# move out of the live tables into one Parquet file per table and month; history reads union the
+# live rows with the archive, and exports write Arrow record batches straight to CSV or Parquet.
+import os
+import tempfile
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .aggregates import add_contributions, month_contributions
+from .crud import delete_readings
+from .table_query import build_where, table_columns
+
+ARCHIVE_DIR = "archive"
+KEEP_LIVE_MONTHS = 12  # most recent months always stay in SQLite
+BATCH_SIZE = 10000
+
+# Archived tables and the history view of each. Every view carries FlatNo and BillingMonth so
+# archived rows can be filtered like live ones. Readings are listed first; crud.delete_readings
+# removes the rest with them.
+ARCHIVE_TABLES = {
+    "BillingReadings": "SELECT t.* FROM BillingReadings t",
+    "BillingCharges": """
+        SELECT t.*, br.FlatNo, br.BillingMonth
+        FROM BillingCharges t JOIN BillingReadings br ON br.ReadingID = t.ReadingID""",
+    "ConsumptionHistory": "SELECT t.* FROM ConsumptionHistory t",
+    "ReadingSurchargeMapping": """
+        SELECT t.*, br.FlatNo
+        FROM ReadingSurchargeMapping t JOIN BillingReadings br ON br.ReadingID = t.ReadingID""",
+    "SurchargeGSTDuty": """
+        SELECT t.*, br.FlatNo, br.BillingMonth
+        FROM SurchargeGSTDuty t JOIN BillingReadings br ON br.ReadingID = t.ReadingID""",
+    "AdditionalCharges": """
+        SELECT t.*, br.FlatNo, br.BillingMonth
+        FROM AdditionalCharges t JOIN BillingReadings br ON br.ReadingID = t.ReadingID""",
+}
+
+HISTORY_FILTERS = ("FlatNo", "BillingMonth")
+
+
+def archive_path(table_name, billing_month, archive_dir=ARCHIVE_DIR):
+    return os.path.join(archive_dir, table_name, f"{billing_month}.parquet")
+
+
+def archived_months(table_name="BillingReadings", archive_dir=ARCHIVE_DIR):
+    folder = os.path.join(archive_dir, table_name)
+    if not os.path.isdir(folder):
+        return []
+    return sorted(name[:-len(".parquet")] for name in os.listdir(folder) if name.endswith(".parquet"))
+
+
+# Months eligible for archiving: older than the newest `keep_months` and with every bill paid
+def closed_months(conn, keep_months=KEEP_LIVE_MONTHS):
+    return [row[0] for row in conn.execute("""
+        SELECT m.BillingMonth
+        FROM (SELECT DISTINCT BillingMonth FROM BillingReadings WHERE BillingMonth IS NOT NULL
+              ORDER BY BillingMonth DESC LIMIT -1 OFFSET ?) m
+        WHERE NOT EXISTS (
+            SELECT 1 FROM BillingReadings br JOIN BillingCharges c ON c.ReadingID = br.ReadingID
+            WHERE br.BillingMonth = m.BillingMonth AND c.Status IN ('Unpaid', 'Due'))
+        ORDER BY m.BillingMonth
+    """, (max(keep_months, 1),))]
+
+
+def _arrow_type(declared_type):
+    declared_type = (declared_type or "").upper()
+    if "INT" in declared_type:
+        return pa.int64()
+    if any(name in declared_type for name in ("REAL", "FLOA", "DOUB", "DEC", "NUMERIC")):
+        return pa.float64()
+    return pa.string()
+
+
+# Arrow schema for a cursor's columns, typed from the declared SQLite column types. Columns
+# the tables don't declare (expressions) are kept as strings.
+def cursor_schema(conn, cursor, tables):
+    declared = {}
+    for table_name in reversed(tables):
+        declared.update({row[1]: row[2] for row in conn.execute("SELECT * FROM pragma_table_xinfo(?)", (table_name,))})
+    return pa.schema([(column[0], _arrow_type(declared.get(column[0]))) for column in cursor.description])
+
+
+def iter_record_batches(cursor, schema, batch_size=BATCH_SIZE):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        columns = zip(*rows)
+        yield pa.record_batch([pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                              schema=schema)
+
+
+def _history_query(table_name, filters):
+    if table_name not in ARCHIVE_TABLES:
+        raise ValueError(f"No history for table: {table_name}")
+    clauses, params = [], []
+    for name, value in (filters or {}).items():
+        if value in (None, ""):
+            continue
+        if name not in HISTORY_FILTERS:
+            raise ValueError(f"Unsupported filter {name} for {table_name} history")
+        clauses.append(f'"{name}" = ?')
+        params.append(value)
+    query = f"SELECT * FROM ({ARCHIVE_TABLES[table_name]})"
+    return query + (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def _live_months(conn):
+    return {row[0] for row in conn.execute("SELECT DISTINCT BillingMonth FROM BillingReadings")}
+
+
+def _archive_key(conn, table_name):
+    return next(row[1] for row in conn.execute("SELECT * FROM pragma_table_xinfo(?)", (table_name,)) if row[5])
+
+
+# Move one month into the archive, inside the caller's transaction. Each table's rows are
+# streamed into "<archive_dir>/<table>/<month>.parquet" before the live rows are deleted; the
+# month keeps its share of the billing summaries. Returns the number of readings archived.
+def archive_month(conn, billing_month, archive_dir=ARCHIVE_DIR):
+    written = []
+    for table_name in ARCHIVE_TABLES:
+        query, params = _history_query(table_name, {"BillingMonth": billing_month})
+        cursor = conn.execute(query, params)
+        schema = cursor_schema(conn, cursor, [table_name, "BillingReadings"])
+        path = archive_path(table_name, billing_month, archive_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with pq.ParquetWriter(path + ".tmp", schema) as writer:
+            # A month archived before keeps its rows, unless they are live again (interrupted run)
+            if os.path.exists(path):
+                key = _archive_key(conn, table_name)
+                live_keys = [row[0] for row in conn.execute(f"SELECT t.{key} FROM ({query}) t", params)]
+                previous = pq.read_table(path, schema=schema)
+                relive = pc.is_in(previous[key], pa.array(live_keys, type=schema.field(key).type))
+                writer.write_table(previous.filter(pc.invert(relive)))
+            for batch in iter_record_batches(cursor, schema):
+                writer.write_batch(batch)
+        written.append(path)
+
+    for path in written:
+        os.replace(path + ".tmp", path)
+    contributions = month_contributions(conn, billing_month)
+    archived = delete_readings(conn, "BillingMonth = ?", (billing_month,))
+    conn.execute("DELETE FROM ConsumptionHistory WHERE BillingMonth = ?", (billing_month,))
+    add_contributions(conn, contributions)
+    return archived
+
+
+# Archive several months, one transaction each so a failure leaves earlier months archived
+def archive_months(db, billing_months, archive_dir=ARCHIVE_DIR):
+    archived = {}
+    for billing_month in billing_months:
+        with db.transaction() as conn:
+            archived[billing_month] = archive_month(conn, billing_month, archive_dir)
+    return archived
+
+
+# Archived record batches of a table's history. Months that still have live rows are read
+# from SQLite only.
+def iter_archived_batches(conn, table_name, filters=None, schema=None, archive_dir=ARCHIVE_DIR):
+    filters = {name: value for name, value in (filters or {}).items() if value not in (None, "")}
+    live_months = _live_months(conn)
+    months = [m for m in archived_months(table_name, archive_dir) if m not in live_months]
+    if "BillingMonth" in filters:
+        months = [m for m in months if m == filters["BillingMonth"]]
+    if not months:
+        return
+    dataset = ds.dataset([archive_path(table_name, m, archive_dir) for m in months], schema=schema, format="parquet")
+    expression = None
+    for name, value in filters.items():
+        condition = ds.field(name) == value
+        expression = condition if expression is None else expression & condition
+    yield from dataset.to_batches(filter=expression, batch_size=BATCH_SIZE)
+
+
+# Schema and record batches of a table's history: archived months first, then live rows
+def history_batches(conn, table_name, filters=None, archive_dir=ARCHIVE_DIR):
+    query, params = _history_query(table_name, filters)
+    cursor = conn.execute(query, params)
+    schema = cursor_schema(conn, cursor, [table_name, "BillingReadings"])
+
+    def batches():
+        yield from iter_archived_batches(conn, table_name, filters, schema, archive_dir)
+        yield from iter_record_batches(cursor, schema)
+    return schema, batches()
+
+
+# A table's history (live rows plus the archive) as a DataFrame
+def read_history(conn, table_name, filters=None, archive_dir=ARCHIVE_DIR):
+    schema, batches = history_batches(conn, table_name, filters, archive_dir)
+    return pa.Table.from_batches(list(batches), schema=schema).to_pandas()
+
+
+# Schema and record batches of a live table with the page filters applied (see table_query.fetch_page)
+def table_batches(conn, table_name, filters=None, search=None, order_by=None):
+    columns = table_columns(conn, table_name)
+    source, params = build_where(conn, table_name, filters, search)
+    query = f'SELECT "{table_name}".* FROM {source}'
+    if order_by:
+        if order_by not in columns:
+            raise ValueError(f"Unknown column {order_by} for {table_name}")
+        query += f' ORDER BY "{table_name}"."{order_by}"'
+    cursor = conn.execute(query, params)
+    schema = cursor_schema(conn, cursor, [table_name])
+    return schema, iter_record_batches(cursor, schema)
+
+
+EXPORT_MIME_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+# Write record batches as CSV or Parquet into a spooled temp file (memory up to `spool_size`,
+# then disk) and return the rewound handle. Only one batch is held in memory at a time.
+def write_export(schema, batches, file_format="csv", spool_size=8 * 1024 * 1024):
+    if file_format not in EXPORT_MIME_TYPES:
+        raise ValueError(f"Unsupported export format: {file_format}")
+    out = tempfile.SpooledTemporaryFile(max_size=spool_size, suffix=f".{file_format}")
+    writer = pq.ParquetWriter(out, schema) if file_format == "parquet" else pa_csv.CSVWriter(out, schema)
+    with writer:
+        for batch in batches:
+            writer.write_batch(batch)
+    out.seek(0)
+    return out
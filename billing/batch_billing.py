@@ -0,0 +1,96 @@
+# Description: Vectorized month-end billing. Computes every flat's bill for a month in one
+# pass over a DataFrame of readings and writes them with executemany in one transaction.
+import pandas as pd
+from datetime import datetime, timedelta
+
+from .money import CHARGE_COLUMNS, bill_columns, bill_lines
+from .rate_index import get_rate_index
+from .tariff import get_tariff_index
+
+READING_COLUMNS = ["FlatNo", "PresentReading", "UnitsAdjusted", "ElectricDuty", "GST", "Surcharge"]
+
+
+# Get the previous month from the current billing month
+def get_previous_month(billing_month):
+    year, month = map(int, billing_month.split('-'))
+    return (datetime(year, month, 1) - timedelta(days=1)).strftime('%Y-%m')
+
+
+# Previous month's PresentReading per flat (first row wins, like insert_bill's LIMIT 1)
+def load_previous_readings(conn, month):
+    previous = pd.read_sql_query(
+        "SELECT FlatNo, PresentReading AS PreviousReading FROM BillingReadings WHERE BillingMonth = ?",
+        conn, params=(get_previous_month(month),))
+    return previous.drop_duplicates(subset="FlatNo", keep="first")
+
+
+# Normalise the readings frame: scalar defaults fill any missing charge columns. ElectricDuty and
+# GST are percentages of the variable charges; left as None (or blank) they stay NaN for
+# compute_bills to charge at the rates in force.
+def prepare_readings(readings, electric_duty=None, gst=None, surcharge=0.0):
+    readings = pd.DataFrame(readings).copy()
+    defaults = {"UnitsAdjusted": 0.0, "ElectricDuty": electric_duty, "GST": gst, "Surcharge": surcharge}
+    for column, value in defaults.items():
+        if column not in readings:
+            readings[column] = value
+    readings = readings[READING_COLUMNS]
+    readings[READING_COLUMNS[1:]] = readings[READING_COLUMNS[1:]].astype(float)
+    filled = ["PresentReading", "UnitsAdjusted", "Surcharge"]
+    readings[filled] = readings[filled].fillna(0.0)
+    return readings
+
+
+# Same arithmetic as insert_bill (money.bill_lines), applied to whole columns at once. ElectricDuty and GST
+# are percentages of the variable charges; those not given are the rates in force for the month from
+# `rates` (a RateIndex), as insert_bill resolves them. 0 without one. The percentages charged are kept
+# as ElectricDutyRate and GSTRate, the amounts replace ElectricDuty and GST.
+def compute_bills(readings, previous, tariff, month, rates=None):
+    bills = readings.merge(previous, on="FlatNo", how="left")
+    bills["PreviousReading"] = bills["PreviousReading"].fillna(0.0)
+    if rates is not None:
+        bills["ElectricDuty"] = bills["ElectricDuty"].fillna(rates.electric_duty.rate(month))
+        bills["GST"] = bills["GST"].fillna(rates.gst.rate(month))
+    bills[["ElectricDutyRate", "GSTRate"]] = bills[["ElectricDuty", "GST"]].fillna(0.0)
+
+    units_consumed = (bills["PresentReading"] - bills["PreviousReading"]).abs() + bills["UnitsAdjusted"]
+    rate_per_unit = tariff.rate(units_consumed.to_numpy(), month)
+    bills["UnitsConsumed"] = units_consumed
+    bills["RatePerUnit"] = rate_per_unit
+    return bills.assign(**bill_columns(bill_lines(
+        units_consumed.to_numpy(), rate_per_unit, bills["ElectricDutyRate"].to_numpy(), bills["GSTRate"].to_numpy(),
+        bills["Surcharge"].to_numpy())))
+
+
+# Insert BillingReadings and BillingCharges for all bills inside the caller's transaction
+def write_bills(conn, month, bills):
+    before = conn.execute("SELECT COALESCE(MAX(ReadingID), 0) FROM BillingReadings").fetchone()[0]
+    conn.executemany("""
+        INSERT INTO BillingReadings (FlatNo, BillingMonth, PreviousReading, PresentReading, UnitsAdjusted)
+        VALUES (?, ?, ?, ?, ?)
+    """, zip(bills["FlatNo"], [month] * len(bills), bills["PreviousReading"], bills["PresentReading"],
+             bills["UnitsAdjusted"]))
+
+    # AUTOINCREMENT ids are handed out in insertion order and the write lock is held
+    reading_ids = [row[0] for row in conn.execute(
+        "SELECT ReadingID FROM BillingReadings WHERE ReadingID > ? ORDER BY ReadingID", (before,))]
+    bills = bills.assign(ReadingID=reading_ids)
+
+    conn.executemany(f"""
+        INSERT INTO BillingCharges (ReadingID, RatePerUnit, {", ".join(CHARGE_COLUMNS)}, Status)
+        VALUES (?, ?, {", ".join("?" * len(CHARGE_COLUMNS))}, 'Due')
+    """, bills[["ReadingID", "RatePerUnit", *CHARGE_COLUMNS]].itertuples(index=False, name=None))
+    return bills
+
+
+# Bill a whole month: one read of previous readings, one vectorized pass, one write transaction.
+# ElectricDuty and GST are percentages of the variable charges, by default the rates in force for the month.
+# Returns the computed bills with their ReadingIDs.
+def run_billing_month(db, month, readings, electric_duty=None, gst=None, surcharge=0.0):
+    readings = prepare_readings(readings, electric_duty, gst, surcharge)
+    if readings.empty:
+        return readings
+
+    with db.transaction() as conn:
+        previous = load_previous_readings(conn, month)
+        bills = compute_bills(readings, previous, get_tariff_index(conn), month, get_rate_index(conn))
+        return write_bills(conn, month, bills)
@@ -0,0 +1,271 @@
+# Description: Bill PDF rendering with reportlab: single-bill files and streamed bulk documents.
+import io
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+from .db import DB_PATH
+from .pdf_cache import bill_key, get_bill_cache
+from .profiling import timed
+
+# One row per bill for a billing month; the first registered user of a flat is billed
+BULK_BILLS_QUERY = """
+    SELECT br.FlatNo, u.PersonID, u.Name, br.BillingMonth, br.PreviousReading, br.PresentReading,
+           ABS(br.PresentReading - br.PreviousReading) + COALESCE(br.UnitsAdjusted, 0) AS UnitsConsumed,
+           bc.ElectricDuty, bc.GST, bc.Surcharge, bc.VariableCharges, bc.NetAmount, bc.PayableAmount
+    FROM BillingReadings br
+    JOIN BillingCharges bc ON bc.ReadingID = br.ReadingID
+    LEFT JOIN (SELECT FlatNo, MIN(PersonID) AS PersonID FROM Users GROUP BY FlatNo) fu ON fu.FlatNo = br.FlatNo
+    LEFT JOIN Users u ON u.PersonID = fu.PersonID
+    WHERE br.BillingMonth = ?
+    ORDER BY br.FlatNo
+"""
+
+BULK_BILLS_COUNT_QUERY = """
+    SELECT COUNT(*) FROM BillingReadings br
+    JOIN BillingCharges bc ON bc.ReadingID = br.ReadingID
+    WHERE br.BillingMonth = ?
+"""
+
+
+# Reading date printed on the bill, e.g. 2025-03 -> 01-03-25
+def reading_date_for(billing_month):
+    year, month = billing_month.split('-')[:2]
+    return f"01-{month}-{year[-2:]}"
+
+
+WIDTH, HEIGHT = letter
+BILL_FORM = "BillStaticLayer"
+
+# Per-bill fields stamped over the static layer: (font, size, x, y from top, label).
+# Order matches draw_bill's value arguments; the label itself lives in the static layer.
+BILL_FIELDS = [
+    ("Helvetica", 11, 50, 120, "Flat No: "),
+    ("Helvetica", 11, 50, 140, "Pers No: "),
+    ("Helvetica", 11, 50, 160, "Name: "),
+    ("Helvetica", 11, 50, 200, "Billing Month: "),
+    ("Helvetica", 11, 250, 200, "Reading Date: "),
+    ("Helvetica-Bold", 11, 50, 270, "Previous Reading: "),
+    ("Helvetica-Bold", 11, 50, 290, "Present Reading: "),
+    ("Helvetica-Bold", 11, 50, 310, "Units Consumed: "),
+    ("Helvetica-Bold", 11, 50, 350, "Billing Units: "),
+    ("Helvetica", 11, 50, 400, "Variable Charges: "),
+    ("Helvetica", 11, 50, 420, "Electric Duty: "),
+    ("Helvetica", 11, 50, 460, "GST: "),
+    ("Helvetica", 11, 50, 480, "Surcharge: "),
+    ("Helvetica", 11, 50, 500, "Net Amount: "),
+    ("Helvetica", 11, 50, 520, "Payable Amount: "),
+    ("Helvetica-Oblique", 10, 400, 590, "Bill Generated on: "),
+]
+
+# Where each value starts (just after its label), computed once
+FIELD_ORIGINS = [(font, size, x + stringWidth(label, font, size), HEIGHT - y)
+                 for font, size, x, y, label in BILL_FIELDS]
+
+
+# Everything that is identical on every bill: headers, section titles, fixed lines,
+# footer notes and the field labels
+def draw_static_layer(c):
+    # Title
+    c.setFont("Helvetica-Bold", 14)
+    c.drawCentredString(WIDTH / 2, HEIGHT - 50, "NED UNIVERSITY OF ENGINEERING & TECHNOLOGY")
+    c.drawCentredString(WIDTH / 2, HEIGHT - 70, "DIRECTORATE OF WORKS & SERVICES")
+    c.drawCentredString(WIDTH / 2, HEIGHT - 90, "ELECTRIC BILL FOR NED STAFF COLONY")
+
+    # User Details
+    c.setFont("Helvetica", 11)
+    c.drawString(250, HEIGHT - 120, "Load Sanctioned: 1 kW")
+    c.drawString(250, HEIGHT - 140, "Phase: 1")
+
+    # Table Headers
+    c.setFont("Helvetica-Bold", 12)
+    c.setFillColor(colors.blue)
+    c.drawString(50, HEIGHT - 230, "Billing Detail Residential Tariff (July 2024 - Sept 2024)")
+
+    c.setFont("Helvetica-Bold", 11)
+    c.setFillColor(colors.black)
+    c.drawString(50, HEIGHT - 250, "Units Details")
+    c.drawString(50, HEIGHT - 330, "Units Adjusted: 0")
+
+    # Charges Section
+    c.drawString(50, HEIGHT - 380, "Charges Details (PKR)")
+    c.setFont("Helvetica", 11)
+    c.drawString(50, HEIGHT - 440, "Meter Rent: 0.00")
+
+    # Footer
+    c.setFont("Helvetica-Oblique", 10)
+    c.drawString(50, HEIGHT - 550, "Note: Meter Reading will be taken on 1st of every month.")
+    c.drawString(50, HEIGHT - 570, "This is a computer-generated bill and does not require a signature.")
+
+    # Field labels
+    for font, size, x, y, label in BILL_FIELDS:
+        c.setFont(font, size)
+        c.drawString(x, HEIGHT - y, label)
+
+
+# Stamp the per-bill values in one text object
+def draw_bill_fields(c, values):
+    text = c.beginText()
+    text.setFillColor(colors.black)
+    for (font, size, x, y), value in zip(FIELD_ORIGINS, values):
+        text.setFont(font, size)
+        text.setTextOrigin(x, y)
+        text.textOut(str(value))
+    c.drawText(text)
+
+
+# Stamp one bill's values onto the current page
+def stamp_bill(c, flat_no, person_id, name, billing_month, reading_date,
+               previous_reading, present_reading, units_consumed, electric_duty,
+               gst, surcharge, variable_charges, net_amount, payable_amount):
+    draw_bill_fields(c, (flat_no, person_id, name, billing_month, reading_date,
+                         previous_reading, present_reading, units_consumed, units_consumed,
+                         variable_charges, electric_duty, gst, surcharge, net_amount,
+                         payable_amount, datetime.now().strftime('%d/%m/%Y')))
+
+
+# Draw one bill on the current page of the canvas. The static layer is compiled into a
+# Form XObject the first time a canvas draws a bill and reused for every later page.
+def draw_bill(c, *bill):
+    if not getattr(c, "_bill_form_ready", False):
+        c.beginForm(BILL_FORM)
+        draw_static_layer(c)
+        c.endForm()
+        c._bill_form_ready = True
+    c.doForm(BILL_FORM)
+    stamp_bill(c, *bill)
+
+
+# File name a bill is downloaded or zipped as
+def bill_file_name(flat_no, billing_month):
+    return f"{flat_no}_ElectricBill_{billing_month}.pdf"
+
+
+# One bill as PDF bytes
+@timed("pdf.render_bill_pdf")
+def render_bill_pdf(bill):
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter, pageCompression=1)
+    draw_bill(c, *bill)
+    c.save()
+    return buffer.getvalue()
+
+
+# Render one bill, or reuse the cached PDF (in the bill cache of the database at db_path) when
+# nothing printed on it has changed. Returns the path of the cached file; download it as
+# bill_file_name(flat_no, billing_month).
+@timed("pdf.generate_pdf")
+def generate_pdf(flat_no, person_id, name,billing_month, reading_date,
+                 previous_reading, present_reading, units_consumed, electric_duty,
+                 gst, surcharge, variable_charges, net_amount, payable_amount, db_path=DB_PATH):
+    bill = (flat_no, person_id, name, billing_month, reading_date,
+            previous_reading, present_reading, units_consumed, electric_duty,
+            gst, surcharge, variable_charges, net_amount, payable_amount)
+    return get_bill_cache(db_path).get_or_render(bill, render_bill_pdf)
+
+
+# Billing rows for a month, pulled from the cursor chunk by chunk
+def iter_bill_rows(conn, billing_month, chunk_size=200):
+    cursor = conn.execute(BULK_BILLS_QUERY, (billing_month,))
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield from rows
+
+
+# Render every bill of a month into one PDF, one page per bill. Bill rows are pulled from the
+# cursor in chunks of `chunk_size` and drawn onto a single reportlab canvas, whose document is
+# saved straight into a spooled temp file (memory up to `spool_size`, then disk). The static
+# layer is one Form XObject shared by every page, so a page costs only its stamped values until
+# the save. Returns the rewound handle, or None when the month has no bills.
+# `progress(done, total)` is called after each page.
+def render_bulk_bills(conn, billing_month, chunk_size=200, spool_size=8 * 1024 * 1024, progress=None):
+    total = conn.execute(BULK_BILLS_COUNT_QUERY, (billing_month,)).fetchone()[0] if progress else None
+    out = tempfile.SpooledTemporaryFile(max_size=spool_size, suffix=".pdf")
+    c = canvas.Canvas(out, pagesize=letter, pageCompression=1)
+    reading_date = reading_date_for(billing_month)
+    pages = 0
+
+    for (flat_no, person_id, name, month, previous_reading, present_reading, units_consumed,
+         electric_duty, gst, surcharge, variable_charges, net_amount, payable_amount) in iter_bill_rows(
+            conn, billing_month, chunk_size):
+        draw_bill(c, flat_no, person_id, name, month, reading_date,
+                  previous_reading, present_reading, units_consumed, electric_duty,
+                  gst, surcharge, variable_charges, net_amount, payable_amount)
+        c.showPage()
+        pages += 1
+        if progress:
+            progress(pages, total)
+
+    if not pages:
+        out.close()
+        return None
+    c.save()
+    out.seek(0)
+    return out
+
+
+# Render one bill to (file name, PDF bytes). Runs inside a worker process.
+def render_bill_bytes(bill):
+    return bill_file_name(bill[0], bill[3]), render_bill_pdf(bill)
+
+
+# Bill tuples in draw_bill argument order, ready to ship to worker processes
+def iter_bill_args(conn, billing_month, chunk_size=200):
+    reading_date = reading_date_for(billing_month)
+    for row in iter_bill_rows(conn, billing_month, chunk_size):
+        yield row[:4] + (reading_date,) + row[4:]
+
+
+# Render every bill of a month as its own PDF across a process pool and pack them into
+# a ZIP written to a spooled temp file. With a BillCache, bills whose PDF is already cached
+# are copied from disk and only new or changed bills are rendered (then cached).
+# `progress(done, total)` is called after each bill. Returns the rewound ZIP handle, or None
+# when the month has no bills.
+def render_bills_zip(conn, billing_month, workers=None, progress=None, chunk_size=200,
+                     spool_size=32 * 1024 * 1024, cache=None):
+    total = conn.execute(BULK_BILLS_COUNT_QUERY, (billing_month,)).fetchone()[0]
+    if not total:
+        return None
+
+    out = tempfile.SpooledTemporaryFile(max_size=spool_size, suffix=".zip")
+    done = 0
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+        misses = []
+        for bill in iter_bill_args(conn, billing_month, chunk_size):
+            path = cache.get(bill_key(bill)) if cache else None
+            if path is None:
+                misses.append(bill)
+                continue
+            try:
+                archive.write(path, bill_file_name(bill[0], bill[3]))
+            except FileNotFoundError:  # evicted since the lookup
+                misses.append(bill)
+                continue
+            done += 1
+            if progress:
+                progress(done, total)
+
+        if misses:
+            workers = min(workers or os.cpu_count() or 1, len(misses))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                rendered = pool.map(render_bill_bytes, misses,
+                                    chunksize=max(1, min(32, len(misses) // (workers * 4))))
+                for bill, (file_name, data) in zip(misses, rendered):
+                    archive.writestr(file_name, data)
+                    if cache:
+                        cache.put(bill_key(bill), data)
+                    done += 1
+                    if progress:
+                        progress(done, total)
+
+    out.seek(0)
+    return out
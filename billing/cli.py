@@ -0,0 +1,281 @@
+# Description: Headless entry point for batch jobs, e.g. month-end billing from cron or a worker.
+# Usage: python -m billing run-month 2025-03 --readings readings.csv --workers 8
+# Commands write through db.transaction() rather than a WriteQueue: the queue only orders the writers of
+# one process, and a CLI run is a process of its own. The app's writer retries while a CLI run holds the lock.
+import argparse
+import os
+import shutil
+import sys
+import time
+
+import pandas as pd
+
+from .archive import archive_months, closed_months
+from .db import ConnectionPool, DB_PATH
+from .jobs import JobRunner
+from .money import MONEY_COLUMNS, month_totals
+from .pdf_cache import get_bill_cache
+from . import profiling
+from .reading_import import import_readings
+from .schema import open_database, prepare_database
+from .surcharges import record_month_surcharges
+
+
+def _elapsed(start):
+    return time.perf_counter() - start
+
+
+def _import(db, path, errors_path, electric_duty, gst, surcharge):
+    errors_path = errors_path or os.path.splitext(path)[0] + "_errors.csv"
+    start = time.perf_counter()
+    with open(errors_path, "w", newline="") as errors_file:
+        result = import_readings(db, path, errors_file, electric_duty, gst, surcharge)
+    if not result["rejected"]:
+        os.remove(errors_path)
+    seconds = _elapsed(start)
+    print(f"✅ Imported {result['imported']} readings, rejected {result['rejected']}"
+          + (f" (see {errors_path})" if result["rejected"] else "")
+          + (f", re-billed {result['rebilled']} later bill(s)" if result["rebilled"] else "")
+          + f" in {seconds:.2f} s ({result['imported'] / seconds:.0f} readings/s)")
+    return result
+
+
+# Month-end run: import readings (optional), record surcharges (optional), render every bill
+def run_month(args):
+    db = open_database(args.db)
+    if args.readings:
+        _import(db, args.readings, args.errors, args.electric_duty, args.gst, args.surcharge)
+
+    if args.surcharge_types:
+        start = time.perf_counter()
+        record_month_surcharges(db, args.month, args.surcharge_types)
+        print(f"✅ Surcharges recorded for {args.month} in {_elapsed(start):.2f} s")
+
+    if args.no_pdf:
+        db.close()
+        return 0
+
+    from .bill_pdf import render_bills_zip  # reportlab loads only when PDFs are rendered
+
+    start = time.perf_counter()
+    rendered = [0]
+
+    def report(done, total):
+        rendered[0] = done
+        if done == total or done % 500 == 0:
+            print(f"\r   Rendered {done}/{total} bills", end="", file=sys.stderr, flush=True)
+
+    with db.connection() as conn:
+        zip_file = render_bills_zip(conn, args.month, workers=args.workers, progress=report,
+                                    cache=None if args.no_cache else get_bill_cache(args.db))
+    db.close()
+    if zip_file is None:
+        print(f"⚠️ No bills found for {args.month}")
+        return 1
+
+    output = args.output or f"Bills_{args.month}.zip"
+    with zip_file, open(output, "wb") as out:
+        shutil.copyfileobj(zip_file, out)
+    seconds = _elapsed(start)
+    print(f"\n✅ Wrote {rendered[0]} bills to {output} in {seconds:.2f} s ({rendered[0] / seconds:.0f} bills/s)")
+    return 0
+
+
+def import_command(args):
+    db = open_database(args.db)
+    _import(db, args.readings, args.errors, args.electric_duty, args.gst, args.surcharge)
+    db.close()
+    return 0
+
+
+# A month's bill totals, summed exactly from the paisa columns, reconciled with the monthly summary
+def totals_command(args):
+    db = open_database(args.db)
+    with db.connection() as conn:
+        totals = month_totals(conn, args.month)
+        summary = conn.execute("SELECT RevenuePaisa FROM MonthlyBillingSummary WHERE BillingMonth = ?",
+                               (args.month,)).fetchone()
+    db.close()
+    if not totals["Bills"]:
+        print(f"⚠️ No bills found for {args.month}")
+        return 1
+
+    print(f"{args.month}: {totals['Bills']} bills")
+    for name in MONEY_COLUMNS:
+        print(f"  {name:<18}{totals[name] / 100:>20,.2f}")
+    revenue = summary[0] if summary else 0
+    if revenue != totals["PayableAmount"]:
+        print(f"⚠️ Monthly summary revenue is {revenue / 100:,.2f}, "
+              f"{(revenue - totals['PayableAmount']) / 100:+,.2f} off the bills")
+        return 1
+    print("✅ Matches the monthly billing summary")
+    return 0
+
+
+def archive_command(args):
+    db = open_database(args.db)
+    with db.connection() as conn:
+        months = args.months or closed_months(conn, args.keep_months)
+    for month, readings in archive_months(db, months).items():
+        print(f"✅ Archived {month}: {readings} readings")
+    db.close()
+    return 0
+
+
+def migrate_command(args):
+    db = ConnectionPool(args.db)
+    with db.transaction() as conn:
+        created = prepare_database(conn)
+    db.close()
+    for name in created["indexes"]:
+        print(f"✅ Created index {name}")
+    for column in created["money_columns"]:
+        print(f"✅ Added BillingCharges.{column}")
+    for column in created["tax_rate_columns"]:
+        print(f"✅ Added BillingCharges.{column}, back-filled from the stored GST and Electric Duty amounts")
+    for table_name in created["search_indexes"]:
+        print(f"✅ Built search index for {table_name}")
+    if created["aggregates"]:
+        print("✅ Built billing summaries")
+    if created["jobs"]:
+        print("✅ Created jobs table")
+    return 0
+
+
+# Run the jobs queued from the web UI (e.g. on a worker machine), then exit
+def run_jobs_command(args):
+    db = open_database(args.db)
+    runner = JobRunner(db, workers=args.workers)
+    runner.shutdown(wait=True)
+    db.close()
+    return 0
+
+
+def bill_cache_command(args):
+    cache = get_bill_cache(args.db)
+    if args.clear:
+        cache.clear()
+        print(f"✅ Cleared {cache.cache_dir}")
+    stats = cache.stats()
+    print(f"{stats['entries']} bills, {stats['bytes'] / 1024 / 1024:.1f} of {stats['max_bytes'] / 1024 / 1024:.0f} MB")
+    return 0
+
+
+def check_plans_command(args):
+    from .query_plans import main as check_plans  # reads the bill queries from bill_pdf
+
+    return check_plans(args.db)
+
+
+# Re-price the billing history under candidate slab tables / surcharge schedules; reads only
+def what_if_command(args):
+    if not (args.slabs or args.surcharges or args.scale):
+        print("⚠️ Nothing to simulate: give --slabs, --surcharges or --scale")
+        return 2
+    from .what_if import BillingHistory, scaled_slabs, simulate
+    scenarios = {}
+    for path in args.slabs:
+        scenarios[os.path.basename(path)] = {"slabs": pd.read_csv(path)}
+    for path in args.surcharges:
+        scenarios[os.path.basename(path)] = {"surcharges": pd.read_csv(path)}
+
+    db = ConnectionPool(args.db)
+    start = time.perf_counter()
+    with db.connection() as conn:
+        history = BillingHistory.load(conn, args.first_month, args.last_month)
+        for factor in args.scale:
+            scenarios[f"slabs x{factor:g}"] = {"slabs": scaled_slabs(conn, factor)}
+    db.close()
+    print(f"Loaded {len(history)} bills over {len(history.months)} months in {_elapsed(start):.2f} s")
+
+    start = time.perf_counter()
+    results = simulate(history, scenarios)
+    print(f"Simulated {len(scenarios)} scenario(s) in {_elapsed(start):.2f} s\n")
+    print(results["summary"].to_string(index=False, float_format=lambda value: f"{value:,.2f}"))
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        for name, frame in results.items():
+            frame.to_csv(os.path.join(args.output, f"{name}.csv"), index=False)
+        print(f"\n✅ Wrote summary.csv, by_month.csv and by_flat.csv to {args.output}")
+    return 0
+
+
+def _add_charge_options(parser):
+    parser.add_argument("--electric-duty", type=float,
+                        help="percent of the variable charges (default: the rate in force for each billing month)")
+    parser.add_argument("--gst", type=float,
+                        help="percent of the variable charges (default: the rate in force for each billing month)")
+    parser.add_argument("--surcharge", type=float, default=0.0)
+    parser.add_argument("--errors", help="where to write rejected rows (default: <readings>_errors.csv)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="billing", description="Electricity billing batch jobs.")
+    parser.add_argument("--db", default=DB_PATH, help=f"SQLite database (default: {DB_PATH})")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="record call and SQL timings and write them to FILE (.json, or .prom for Prometheus text)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run-month", help="import readings, apply surcharges and render a month's bills")
+    run.add_argument("month", help="billing month, YYYY-MM")
+    run.add_argument("--readings", help="CSV with FlatNo, BillingMonth, PresentReading[, UnitsAdjusted]")
+    run.add_argument("--surcharge-types", nargs="*", default=[], metavar="TYPE",
+                     help='surcharge types to record, e.g. "Fuel Charge"')
+    run.add_argument("--workers", type=int, default=None, help="PDF worker processes (default: CPU count)")
+    run.add_argument("--output", help="ZIP of bill PDFs (default: Bills_<month>.zip)")
+    run.add_argument("--no-pdf", action="store_true", help="skip rendering bills")
+    run.add_argument("--no-cache", action="store_true", help="render every bill, ignoring the bill cache")
+    _add_charge_options(run)
+    run.set_defaults(handler=run_month)
+
+    import_parser = commands.add_parser("import-readings", help="import and bill a CSV of meter readings")
+    import_parser.add_argument("readings")
+    _add_charge_options(import_parser)
+    import_parser.set_defaults(handler=import_command)
+
+    totals = commands.add_parser("totals", help="a month's bill totals, reconciled with the billing summary")
+    totals.add_argument("month", help="billing month, YYYY-MM")
+    totals.set_defaults(handler=totals_command)
+
+    archive = commands.add_parser("archive", help="move closed months to Parquet")
+    archive.add_argument("months", nargs="*", help="months to archive (default: every closed month)")
+    archive.add_argument("--keep-months", type=int, default=12)
+    archive.set_defaults(handler=archive_command)
+
+    commands.add_parser("migrate", help="create missing indexes, columns, search indexes and aggregates").set_defaults(
+        handler=migrate_command)
+    jobs = commands.add_parser("run-jobs", help="run queued background jobs and exit")
+    jobs.add_argument("--workers", type=int, default=1, help="jobs run at once")
+    jobs.set_defaults(handler=run_jobs_command)
+
+    bill_cache = commands.add_parser("bill-cache", help="show (or clear) the rendered bill cache")
+    bill_cache.add_argument("--clear", action="store_true")
+    bill_cache.set_defaults(handler=bill_cache_command)
+
+    commands.add_parser("check-plans", help="fail if a hot query does a full table scan").set_defaults(
+        handler=check_plans_command)
+
+    what_if = commands.add_parser("what-if", help="revenue and per-flat bills under candidate tariffs (read-only)")
+    what_if.add_argument("--slabs", nargs="*", default=[], metavar="CSV",
+                         help="candidate slab table: MinUnits, MaxUnits, RatePerUnit[, RateEffectiveDate]")
+    what_if.add_argument("--surcharges", nargs="*", default=[], metavar="CSV",
+                         help="candidate surcharge schedule: TypeName, RatePerUnit[, EffectiveMonth, UnitsFrom, UnitsTo]")
+    what_if.add_argument("--scale", nargs="*", type=float, default=[], metavar="FACTOR",
+                         help="current slab rates times FACTOR, e.g. 1.1")
+    what_if.add_argument("--from", dest="first_month", metavar="YYYY-MM", help="first billing month")
+    what_if.add_argument("--to", dest="last_month", metavar="YYYY-MM", help="last billing month")
+    what_if.add_argument("--output", metavar="DIR", help="write summary.csv, by_month.csv and by_flat.csv here")
+    what_if.set_defaults(handler=what_if_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.profile:
+        return args.handler(args)
+    profiling.enable()
+    try:
+        return args.handler(args)
+    finally:
+        profiling.write_metrics(args.profile)
+        print(f"📈 Timings written to {args.profile}")
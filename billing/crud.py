@@ -0,0 +1,239 @@
+# Description: Record-level operations on users and bills. Every function takes a ConnectionPool
+# and returns data or raises; showing messages and downloads is left to the caller.
+import pandas as pd
+
+from .batch_billing import get_previous_month
+from .migrations import table_exists
+from .money import CHARGE_COLUMNS, bill_columns, bill_lines
+from .profiling import timed
+from .rate_index import get_rate_index
+from .rebilling import rebill_downstream
+from .table_query import table_columns
+from .tariff import get_tariff_index
+
+# The previous month's reading of a flat (first row wins)
+PREVIOUS_READING_QUERY = """
+    SELECT PresentReading FROM BillingReadings
+    WHERE FlatNo = ? AND BillingMonth = ?
+    LIMIT 1
+"""
+
+INSERT_CHARGES = f"""
+    INSERT INTO BillingCharges (ReadingID, RatePerUnit, {", ".join(CHARGE_COLUMNS)}, Status)
+    VALUES (?, ?, {", ".join("?" * len(CHARGE_COLUMNS))}, 'Due')
+"""
+
+# Tables whose rows belong to a reading (ON DELETE CASCADE in the schema)
+READING_CHILD_TABLES = ["BillingCharges", "ReadingSurchargeMapping", "SurchargeGSTDuty", "AdditionalCharges"]
+
+# Charge columns re-pricing the recorded surcharges can change
+SURCHARGE_COLUMNS = ["Surcharge", "SurchargePaisa", "PayableAmount", "PayableAmountPaisa"]
+
+UPDATE_CHARGES = f"""
+    UPDATE BillingCharges SET RatePerUnit = ?, {", ".join(f"{column} = ?" for column in CHARGE_COLUMNS)}
+    WHERE ReadingID = ?
+"""
+
+
+# Fetch table data
+@timed("crud.get_table_data")
+def get_table_data(db, table_name):
+    with db.connection() as conn:
+        table_columns(conn, table_name)
+        return pd.read_sql_query(f'SELECT * FROM "{table_name}"', conn)
+
+
+def insert_user(db, person_id, name, flat_no, user_type, load_sanctioned, phase):
+    with db.transaction() as conn:
+        conn.execute("""
+            INSERT INTO Users (PersonID, Name, FlatNo, UserType, LoadSanctioned, Phase)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (person_id, name, flat_no, user_type, load_sanctioned, phase))
+
+
+def update_user(db, person_id, name, flat_no, user_type, load_sanctioned, phase):
+    with db.transaction() as conn:
+        conn.execute("""
+            UPDATE Users SET Name=?, FlatNo=?, UserType=?, LoadSanctioned=?, Phase=?
+            WHERE PersonID=?
+        """, (name, flat_no, user_type, load_sanctioned, phase, person_id))
+
+
+def delete_user(db, person_id):
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM Users WHERE PersonID=?", (person_id,))
+
+
+# Previous month's PresentReading for a flat, 0 when there is none
+def get_previous_reading(conn, flat_no, month):
+    row = conn.execute(PREVIOUS_READING_QUERY, (flat_no, get_previous_month(month))).fetchone()
+    return row[0] if row else 0.0
+
+
+# Bill arithmetic for one reading (the batch engine applies the same to whole columns). ElectricDuty
+# and GST are percentages of the variable charges; None charges the rate in force for the month.
+# Money comes from money.bill_lines: each amount in rupees and, as <column>Paisa, in integer paisa;
+# ElectricDutyRate and GSTRate keep the percentages charged.
+def calculate_bill(conn, month, previous_reading, present_reading, electric_duty, gst, units_adjusted, surcharge):
+    units_consumed = abs(present_reading - previous_reading) + units_adjusted
+    rate_per_unit = get_tariff_index(conn).rate(units_consumed, month)
+    rates = get_rate_index(conn)
+    electric_duty = rates.electric_duty.rate(month) if electric_duty is None else electric_duty
+    gst = rates.gst.rate(month) if gst is None else gst
+    return {
+        "BillingMonth": month,
+        "PreviousReading": previous_reading,
+        "PresentReading": present_reading,
+        "UnitsAdjusted": units_adjusted,
+        "UnitsConsumed": units_consumed,
+        "RatePerUnit": rate_per_unit,
+        **bill_columns(bill_lines(units_consumed, rate_per_unit, electric_duty, gst, surcharge)),
+        "ElectricDutyRate": electric_duty,
+        "GSTRate": gst,
+    }
+
+
+# (ElectricDuty, GST) percentages a stored bill of the month was charged at, from its ElectricDutyRate
+# and GSTRate; the rates in force for the month where none is recorded. What the bill forms show.
+def bill_tax_rates(conn, month, electric_duty_rate, gst_rate):
+    rates = get_rate_index(conn)
+    return (rates.electric_duty.rate(month) if electric_duty_rate is None else electric_duty_rate,
+            rates.gst.rate(month) if gst_rate is None else gst_rate)
+
+
+# Record a reading and its charges; electric_duty and gst are percentages of the variable charges,
+# None for the rates in force for the month. Returns the bill with FlatNo, PersonID, Name, ReadingID
+# and Rebilled, the later months re-billed because this reading back-fills their previous month
+@timed("crud.insert_bill")
+def insert_bill(db, person_id, flat_no, month, present_reading, electric_duty, gst, units_adjusted, surcharge):
+    with db.transaction() as conn:
+        previous_reading = get_previous_reading(conn, flat_no, month)
+        bill = calculate_bill(conn, month, previous_reading, present_reading, electric_duty, gst, units_adjusted,
+                              surcharge or 0.0)
+
+        reading_id = conn.execute("""
+            INSERT INTO BillingReadings (FlatNo, BillingMonth, PreviousReading, PresentReading, UnitsAdjusted)
+            VALUES (?, ?, ?, ?, ?)
+        """, (flat_no, month, previous_reading, present_reading, units_adjusted)).lastrowid
+
+        conn.execute(INSERT_CHARGES, (reading_id, bill["RatePerUnit"], *(bill[column] for column in CHARGE_COLUMNS)))
+        name = conn.execute("SELECT Name FROM Users WHERE PersonID=?", (person_id,)).fetchone()
+        rebilled = rebill_downstream(conn, [(flat_no, month)])
+
+    return {"FlatNo": flat_no, "PersonID": person_id, "Name": name[0] if name else None,
+            "ReadingID": reading_id, **bill, "Rebilled": rebilled["BillingMonth"].tolist()}
+
+
+# Recalculate an existing bill from new inputs; None inputs keep the stored value, and for electric_duty
+# and gst (percentages of the variable charges) the rate the bill was charged at. Later months
+# whose PreviousReading depended on this reading are re-billed in the same transaction.
+# Returns the updated bill with Rebilled (those months), or None when the flat has no bill for the month.
+@timed("crud.update_bill")
+def update_bill(db, flat_no, month, present_reading=None, electric_duty=None, gst=None, units_adjusted=None,
+                surcharge=None):
+    with db.transaction() as conn:
+        current = conn.execute("""
+            SELECT br.ReadingID, br.PreviousReading, br.PresentReading, COALESCE(br.UnitsAdjusted, 0),
+                   bc.Surcharge, bc.ElectricDutyRate, bc.GSTRate
+            FROM BillingReadings br LEFT JOIN BillingCharges bc ON bc.ReadingID = br.ReadingID
+            WHERE br.FlatNo = ? AND br.BillingMonth = ?
+        """, (flat_no, month)).fetchone()
+        if not current:
+            return None
+
+        reading_id, previous_reading = current[:2]
+        inputs = [present_reading, units_adjusted, surcharge, electric_duty, gst]
+        present_reading, units_adjusted, surcharge, electric_duty, gst = [
+            stored if value is None else value for value, stored in zip(inputs, current[2:])]
+        bill = calculate_bill(conn, month, previous_reading, present_reading, electric_duty, gst, units_adjusted,
+                              surcharge or 0.0)
+
+        conn.execute("""
+            UPDATE BillingReadings
+            SET PresentReading=?, PreviousReading=?, UnitsAdjusted=?
+            WHERE ReadingID=?
+        """, (present_reading, previous_reading, units_adjusted, reading_id))
+        conn.execute(UPDATE_CHARGES, (bill["RatePerUnit"], *(bill[column] for column in CHARGE_COLUMNS), reading_id))
+        rebilled = rebill_downstream(conn, [(flat_no, month)])
+        # Re-pricing the surcharges recorded for this bill may have moved its Surcharge
+        bill.update(zip(SURCHARGE_COLUMNS, conn.execute(
+            f"SELECT {', '.join(SURCHARGE_COLUMNS)} FROM BillingCharges WHERE ReadingID=?", (reading_id,)).fetchone()))
+
+    return {"FlatNo": flat_no, "ReadingID": reading_id, **bill, "Rebilled": rebilled["BillingMonth"].tolist()}
+
+
+# Delete the readings matching `where` (a condition on BillingReadings) and the rows that belong to
+# them. SQLite doesn't enforce foreign keys here, so the schema's cascade is applied by hand.
+# Returns the number of readings deleted.
+def delete_readings(conn, where, params):
+    for table_name in READING_CHILD_TABLES:
+        if table_exists(conn, table_name):
+            conn.execute(f"""
+                DELETE FROM {table_name} WHERE ReadingID IN (SELECT ReadingID FROM BillingReadings WHERE {where})
+            """, params)
+    return conn.execute(f"DELETE FROM BillingReadings WHERE {where}", params).rowcount
+
+
+# Delete a flat's bill for a month and re-bill the month after it, which now starts from 0
+# as get_previous_reading would; returns False when there was no bill
+def delete_bill(db, flat_no, month):
+    with db.transaction() as conn:
+        row = conn.execute("SELECT ReadingID FROM BillingReadings WHERE FlatNo=? AND BillingMonth=?",
+                           (flat_no, month)).fetchone()
+        if not row:
+            return False
+        delete_readings(conn, "ReadingID = ?", (row[0],))
+        rebill_downstream(conn, [(flat_no, month)])
+    return True
+
+
+# Update bill status (Paid/Unpaid/Due)
+def update_bill_status(db, bill_id, status):
+    with db.transaction() as conn:
+        conn.execute("UPDATE BillingCharges SET Status=? WHERE BillID=?", (status, bill_id))
+
+
+# Fetch Consumption History for a user/flat
+def get_consumption_history(db, person_id=None, flat_no=None):
+    query = """
+        SELECT ch.ConsumptionID, u.Name, f.FlatNo, ch.BillingMonth, ch.UnitsConsumed, ch.RecordedAt
+        FROM ConsumptionHistory ch
+        JOIN Users u ON u.PersonID = ch.PersonID
+        JOIN Flats f ON f.FlatNo = ch.FlatNo
+        WHERE 1=1
+    """
+    params = []
+    if person_id:
+        query += " AND ch.PersonID = ?"
+        params.append(person_id)
+    if flat_no:
+        query += " AND ch.FlatNo = ?"
+        params.append(flat_no)
+
+    query += " ORDER BY ch.BillingMonth DESC"
+    with db.connection() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+
+# Months a flat was billed before the given month, newest first
+def get_previous_billing_months(db, flat_no, billing_month):
+    with db.connection() as conn:
+        return [row[0] for row in conn.execute("""
+            SELECT DISTINCT BillingMonth FROM BillingReadings
+            WHERE FlatNo = ? AND BillingMonth < ?
+            ORDER BY BillingMonth DESC
+        """, (flat_no, billing_month))]
+
+
+# One bill with its reading: (ReadingID, PreviousReading, PresentReading, UnitsConsumed, UnitsAdjusted,
+# BillID, RatePerUnit, VariableCharges, ElectricDuty, GST, Surcharge, NetAmount, PayableAmount), or None
+def fetch_complete_bill(db, flat_no, billing_month):
+    with db.connection() as conn:
+        return conn.execute("""
+            SELECT br.ReadingID, br.PreviousReading, br.PresentReading,
+                   ABS(br.PresentReading - br.PreviousReading) + COALESCE(br.UnitsAdjusted, 0),
+                   COALESCE(br.UnitsAdjusted, 0), bc.BillID, bc.RatePerUnit, bc.VariableCharges,
+                   bc.ElectricDuty, bc.GST, bc.Surcharge, bc.NetAmount, bc.PayableAmount
+            FROM BillingReadings br JOIN BillingCharges bc ON bc.ReadingID = br.ReadingID
+            WHERE br.FlatNo = ? AND br.BillingMonth = ?
+        """, (flat_no, billing_month)).fetchone()
@@ -0,0 +1,147 @@
+# Description: Pooled SQLite connection layer shared by the Streamlit pages and helpers.
+import logging
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from .profiling import ProfiledConnection, timed
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = "billing_system.db"
+
+# Pragmas applied once to every pooled connection
+PRAGMAS = {
+    "journal_mode": "WAL",       # readers don't block the writer
+    "synchronous": "NORMAL",     # safe with WAL, avoids an fsync per commit
+    "cache_size": -32000,        # ~32 MB page cache per connection
+    "mmap_size": 268435456,      # 256 MB memory-mapped reads
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+
+class ConnectionPool:
+    def __init__(self, path=DB_PATH, size=4, pragmas=None):
+        self.path = path
+        self.size = size
+        self.pragmas = dict(PRAGMAS if pragmas is None else pragmas)
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # Open a new connection and apply the tuned pragmas
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, factory=ProfiledConnection)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    # Take an idle connection, opening a new one while the pool is below its size
+    @timed("db.acquire")
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return self._connect()
+        return self._idle.get()
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    # Borrow a connection for the current thread. Nested calls on the same thread
+    # reuse the connection already checked out, so helpers can call each other.
+    @contextmanager
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._acquire()
+        self._local.conn, self._local.depth = conn, 1
+        try:
+            yield conn
+        finally:
+            self._local.conn, self._local.depth = None, 0
+            self._release(conn)
+
+    # Run a block inside one transaction: commit on success, roll back on error.
+    # A transaction opened inside another one joins the outer transaction.
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            self._local.after_commit = callbacks = []
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+            finally:
+                self._local.after_commit = None
+            self._run_callbacks(callbacks)
+
+    # The transaction is committed by now, so a failing callback must not look like a failed
+    # write to the caller: each one is logged and the rest still run
+    @staticmethod
+    def _run_callbacks(callbacks):
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception("after_commit callback %r failed", callback)
+
+    # Run a block under a savepoint of the current transaction. An error undoes only the block,
+    # including the after_commit callbacks it registered, and is raised again.
+    @contextmanager
+    def savepoint(self, name="block"):
+        with self.connection() as conn:
+            callbacks = getattr(self._local, "after_commit", None)
+            registered = len(callbacks) if callbacks is not None else 0
+            conn.execute(f"SAVEPOINT {name}")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute(f"ROLLBACK TO {name}")
+                conn.execute(f"RELEASE {name}")
+                if callbacks is not None:
+                    del callbacks[registered:]
+                raise
+            conn.execute(f"RELEASE {name}")
+
+    # Run `callback` once the current thread's transaction commits (right away outside one).
+    # Cache invalidation belongs here: when the write joined an outer or group-committed
+    # transaction, a reader could reload the old rows before the commit and cache them again.
+    def after_commit(self, callback):
+        callbacks = getattr(self._local, "after_commit", None)
+        if callbacks is None:
+            callback()
+        else:
+            callbacks.append(callback)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
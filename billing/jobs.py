@@ -0,0 +1,263 @@
+# Description: Background jobs for long-running bulk operations (bill PDFs, bill ZIPs). Jobs are rows
+# in the Jobs table, so their progress and result files survive page reruns and are shared by every
+# session; a month already being processed is not queued a second time. In the app, writes to the
+# Jobs table go through the sessions' WriteQueue.
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from .pdf_cache import get_bill_cache
+
+JOBS_DIR = "jobs"
+ACTIVE_STATUSES = ("Queued", "Running")
+
+
+# The renderers import bill_pdf (and with it reportlab) on first use, so opening the database
+# or polling a job's status doesn't load them
+def _render_bulk_bills(conn, month, progress=None, **params):
+    from .bill_pdf import render_bulk_bills
+    return render_bulk_bills(conn, month, progress=progress, **params)
+
+
+# Per-flat ZIP through the bill cache next to the job's database, so a rerun only renders bills that changed
+def _render_cached_bills_zip(conn, month, progress=None, **params):
+    from .bill_pdf import render_bills_zip
+    cache = get_bill_cache(conn.execute("PRAGMA database_list").fetchone()[2])
+    return render_bills_zip(conn, month, progress=progress, cache=cache, **params)
+
+
+# Operation name -> (render function, result file name, MIME type). A render function takes
+# (conn, month, progress=None, **params) and returns a rewound file handle, or None when the month
+# has no data.
+OPERATIONS = {
+    "bulk_pdf": (_render_bulk_bills, "Bulk_Bills_{month}.pdf", "application/pdf"),
+    "bills_zip": (_render_cached_bills_zip, "Bills_{month}.zip", "application/zip"),
+}
+
+
+def ensure_jobs_table(conn):
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='Jobs'").fetchone()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS Jobs (
+          JobID INTEGER PRIMARY KEY AUTOINCREMENT,
+          Operation VARCHAR(50) NOT NULL,
+          BillingMonth VARCHAR(7) NOT NULL,
+          Params TEXT DEFAULT '{}' NOT NULL,
+          Status VARCHAR(20) DEFAULT 'Queued' NOT NULL,
+          Done INTEGER DEFAULT 0 NOT NULL,
+          Total INTEGER DEFAULT 0 NOT NULL,
+          ResultPath TEXT,
+          Error TEXT,
+          Worker TEXT,
+          CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+          StartedAt TIMESTAMP,
+          FinishedAt TIMESTAMP
+        )
+    """)
+    # At most one queued or running job per operation and month
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active ON Jobs(Operation, BillingMonth)
+        WHERE Status IN ('Queued', 'Running')
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_lookup ON Jobs(Operation, BillingMonth, JobID)")
+    return not exists
+
+
+def _job_dict(cursor, row):
+    job = dict(zip([column[0] for column in cursor.description], row))
+    job["Params"] = json.loads(job["Params"])
+    return job
+
+
+def get_job(db, job_id):
+    with db.connection() as conn:
+        cursor = conn.execute("SELECT * FROM Jobs WHERE JobID = ?", (job_id,))
+        row = cursor.fetchone()
+        return _job_dict(cursor, row) if row else None
+
+
+# Newest job for an operation and month (the one the UI shows), or None
+def latest_job(db, operation, month):
+    with db.connection() as conn:
+        cursor = conn.execute("""
+            SELECT * FROM Jobs WHERE Operation = ? AND BillingMonth = ?
+            ORDER BY JobID DESC LIMIT 1
+        """, (operation, month))
+        row = cursor.fetchone()
+        return _job_dict(cursor, row) if row else None
+
+
+def list_jobs(db, limit=20):
+    with db.connection() as conn:
+        return pd.read_sql_query("""
+            SELECT JobID, Operation, BillingMonth, Status, Done, Total, Error, CreatedAt, FinishedAt
+            FROM Jobs ORDER BY JobID DESC LIMIT ?
+        """, conn, params=(limit,))
+
+
+# Queue a job unless the same operation is already queued or running for the month.
+# Returns (JobID, created).
+def submit_job(db, operation, month, **params):
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown job operation: {operation}")
+    with db.transaction() as conn:
+        row = conn.execute("""
+            SELECT JobID FROM Jobs WHERE Operation = ? AND BillingMonth = ? AND Status IN ('Queued', 'Running')
+        """, (operation, month)).fetchone()
+        if row:
+            return row[0], False
+        job_id = conn.execute("INSERT INTO Jobs (Operation, BillingMonth, Params) VALUES (?, ?, ?)",
+                              (operation, month, json.dumps(params))).lastrowid
+    return job_id, True
+
+
+def _worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _worker_alive(worker):
+    host, _, pid = (worker or "").rpartition(":")
+    if not pid.isdigit():
+        return False
+    if host != socket.gethostname():
+        return True  # can't check another machine's process; leave its job alone
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# Requeue jobs whose worker process died mid-run. Returns the queued JobIDs, oldest first.
+def requeue_orphaned_jobs(db):
+    with db.transaction() as conn:
+        running = conn.execute("SELECT JobID, Worker FROM Jobs WHERE Status = 'Running'").fetchall()
+        for job_id, worker in running:
+            if not _worker_alive(worker):
+                conn.execute("UPDATE Jobs SET Status = 'Queued', Done = 0, Worker = NULL WHERE JobID = ?",
+                             (job_id,))
+        return [row[0] for row in conn.execute("SELECT JobID FROM Jobs WHERE Status = 'Queued' ORDER BY JobID")]
+
+
+# Take a queued job; False when another worker got it first
+def claim_job(db, job_id):
+    with db.transaction() as conn:
+        return conn.execute("""
+            UPDATE Jobs SET Status = 'Running', Worker = ?, StartedAt = CURRENT_TIMESTAMP
+            WHERE JobID = ? AND Status = 'Queued'
+        """, (_worker_name(), job_id)).rowcount == 1
+
+
+def set_job_progress(db, job_id, done, total):
+    with db.transaction() as conn:
+        conn.execute("UPDATE Jobs SET Done = ?, Total = ? WHERE JobID = ?", (done, total, job_id))
+
+
+def finish_job(db, job_id, status, result_path=None, error=None):
+    with db.transaction() as conn:
+        conn.execute("""
+            UPDATE Jobs SET Status = ?, ResultPath = ?, Error = ?, FinishedAt = CURRENT_TIMESTAMP
+            WHERE JobID = ?
+        """, (status, result_path, error, job_id))
+
+
+# Only the newest result per operation and month is kept on disk
+def remove_older_results(db, job):
+    with db.transaction() as conn:
+        older = conn.execute("""
+            SELECT JobID, ResultPath FROM Jobs
+            WHERE Operation = ? AND BillingMonth = ? AND JobID < ? AND ResultPath IS NOT NULL
+        """, (job["Operation"], job["BillingMonth"], job["JobID"])).fetchall()
+        for job_id, path in older:
+            if os.path.exists(path):
+                os.remove(path)
+            conn.execute("UPDATE Jobs SET ResultPath = NULL WHERE JobID = ?", (job_id,))
+
+
+# Runs queued jobs on a small thread pool. Bill rendering itself fans out to processes, so one or
+# two job threads are enough; the page script only submits and polls. Given a WriteQueue, the runner
+# queues its writes there, as the app's sessions do, instead of taking the write lock itself.
+class JobRunner:
+    def __init__(self, db, workers=1, jobs_dir=JOBS_DIR, progress_interval=0.5, writer=None):
+        self.db = db
+        self.writer = writer
+        self.jobs_dir = jobs_dir
+        self.progress_interval = progress_interval
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="billing-job")
+        self._lock = threading.Lock()
+        self._scheduled = set()
+        os.makedirs(jobs_dir, exist_ok=True)
+        self.recover()
+
+    # Run a write helper through the writer when there is one
+    def _write(self, func, *args, **kwargs):
+        if self.writer is None:
+            return func(self.db, *args, **kwargs)
+        return self.writer.call(func, *args, **kwargs)
+
+    # Requeue jobs whose worker process died mid-run, then schedule everything queued
+    def recover(self):
+        for job_id in self._write(requeue_orphaned_jobs):
+            self._schedule(job_id)
+
+    def submit(self, operation, month, **params):
+        job_id, created = self._write(submit_job, operation, month, **params)
+        self._schedule(job_id)
+        return job_id, created
+
+    def _schedule(self, job_id):
+        with self._lock:
+            if job_id in self._scheduled:
+                return
+            self._scheduled.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def _progress_writer(self, job_id):
+        last = [0.0]
+
+        def progress(done, total):
+            now = time.monotonic()
+            if done != total and now - last[0] < self.progress_interval:
+                return
+            last[0] = now
+            self._write(set_job_progress, job_id, done, total)
+        return progress
+
+    def _finish(self, job_id, status, result_path=None, error=None):
+        self._write(finish_job, job_id, status, result_path, error)
+
+    def _run(self, job_id):
+        try:
+            if not self._write(claim_job, job_id):
+                return
+            job = get_job(self.db, job_id)
+            render, file_name, _ = OPERATIONS[job["Operation"]]
+            try:
+                with self.db.connection() as conn:
+                    out = render(conn, job["BillingMonth"], progress=self._progress_writer(job_id), **job["Params"])
+                if out is None:
+                    self._finish(job_id, "Failed", error=f"No billing data found for {job['BillingMonth']}")
+                    return
+                path = os.path.join(self.jobs_dir, f"{job_id}_" + file_name.format(month=job["BillingMonth"]))
+                with out, open(path + ".tmp", "wb") as result:
+                    shutil.copyfileobj(out, result)
+                os.replace(path + ".tmp", path)
+            except Exception as e:
+                self._finish(job_id, "Failed", error=str(e))
+                return
+            self._finish(job_id, "Done", result_path=path)
+            self._write(remove_older_results, job)
+        finally:
+            with self._lock:
+                self._scheduled.discard(job_id)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
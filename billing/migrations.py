@@ -0,0 +1,105 @@
+# Description: Schema migrations applied at startup. Adds the composite and covering indexes
+# behind the hot billing lookups, the INTEGER paisa columns of BillingCharges and the GST and
+# Electric Duty rates each bill was charged at.
+import pandas as pd
+
+from .money import MONEY_COLUMNS, TAX_RATE_COLUMNS, charged_rate
+from .rate_index import RateHistory
+from .search_index import has_search_index, rebuild_search_index
+
+# (table, id column, rate column) of the GST and Electric Duty rates, by BillingCharges tax column
+RATE_TABLES = {
+    "ElectricDuty": ("ElectricDutyRates", "DutyID", "ElectricDuty"),
+    "GST": ("GSTRates", "GSTID", "GST"),
+}
+
+# (index name, table, indexed columns)
+INDEXES = [
+    # Previous-reading and bill lookups by flat and month; covers the readings themselves
+    ("idx_billingreadings_flat_month", "BillingReadings", "FlatNo, BillingMonth, PresentReading, PreviousReading"),
+    # Month-wide reads: batch billing, bulk PDFs, month filters
+    ("idx_billingreadings_month_flat", "BillingReadings", "BillingMonth, FlatNo, PresentReading"),
+    ("idx_billingcharges_reading", "BillingCharges", "ReadingID"),
+    ("idx_users_flat", "Users", "FlatNo, PersonID, Name"),
+    ("idx_consumptionhistory_person_month", "ConsumptionHistory", "PersonID, BillingMonth"),
+    ("idx_consumptionhistory_flat_month", "ConsumptionHistory", "FlatNo, BillingMonth"),
+]
+
+
+def table_exists(conn, table_name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                        (table_name,)).fetchone() is not None
+
+
+# Create any missing indexes and refresh planner statistics. Safe to run on every start.
+def apply_indexes(conn):
+    created = []
+    for name, table_name, columns in INDEXES:
+        if not table_exists(conn, table_name):
+            continue
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (name,)).fetchone()
+        if not exists:
+            conn.execute(f'CREATE INDEX "{name}" ON "{table_name}" ({columns})')
+            created.append(name)
+    if created:
+        conn.execute("ANALYZE")
+    return created
+
+
+# Add any missing paisa column to BillingCharges and back-fill it from its rupee column with the
+# rounding rule of money.to_paisa; the search index is rebuilt to cover them. A rupee column the
+# table doesn't have (older databases have no ElectricDuty, GST, ...) gets no paisa column.
+# Returns the columns added.
+def apply_money_columns(conn):
+    if not table_exists(conn, "BillingCharges"):
+        return []
+    existing = {row[1] for row in conn.execute('PRAGMA table_info("BillingCharges")')}
+    added = {rupees: paisa for rupees, paisa in MONEY_COLUMNS.items() if rupees in existing and paisa not in existing}
+    for paisa in added.values():
+        conn.execute(f"ALTER TABLE BillingCharges ADD COLUMN {paisa} INTEGER")
+    if added:
+        conn.execute("UPDATE BillingCharges SET " + ", ".join(
+            f"{paisa} = CAST(ROUND(ROUND({rupees} * 100, 6)) AS INTEGER)" for rupees, paisa in added.items()))
+        if has_search_index(conn, "BillingCharges"):
+            rebuild_search_index(conn, "BillingCharges")
+    return list(added.values())
+
+
+# Rates in force for each month of `months` from one of RATE_TABLES, 0 without the table
+def _rates_in_force(conn, tax_column, months):
+    table_name, id_column, rate_column = RATE_TABLES[tax_column]
+    if not table_exists(conn, table_name):
+        return 0.0
+    rows = pd.read_sql_query(f"SELECT {id_column}, EffectiveDate, {rate_column} FROM {table_name}", conn)
+    return RateHistory(rows, id_column, rate_column).rate(months)
+
+
+# GST and Electric Duty used to be entered as rupee amounts and are now percentages of VariableCharges.
+# Add the rate column of each tax column BillingCharges has and back-fill it for the bills already on
+# file: the percentage of VariableCharges their stored amount comes to (money.charged_rate, the rate in
+# force for the month where that reproduces the amount). Stored amounts are left as they are; re-pricing
+# an old bill charges it that percentage of its new variable charges. A bill without a reading keeps a
+# NULL rate, charged at the rate in force. Returns the columns added.
+def apply_tax_rate_columns(conn):
+    if not table_exists(conn, "BillingCharges"):
+        return []
+    existing = {row[1] for row in conn.execute('PRAGMA table_info("BillingCharges")')}
+    added = {tax: rate for tax, rate in TAX_RATE_COLUMNS.items() if tax in existing and rate not in existing}
+    for rate in added.values():
+        conn.execute(f"ALTER TABLE BillingCharges ADD COLUMN {rate} FLOAT")
+    if added:
+        bills = pd.read_sql_query(f"""
+            SELECT bc.BillID, br.BillingMonth, COALESCE(bc.VariableCharges, 0) AS VariableCharges,
+                   {", ".join(f"COALESCE(bc.{tax}, 0) AS {tax}" for tax in added)}
+            FROM BillingCharges bc JOIN BillingReadings br ON br.ReadingID = bc.ReadingID
+        """, conn)
+        months = bills["BillingMonth"].to_numpy(dtype=str)
+        for tax in added:
+            bills[tax] = charged_rate(bills[tax].to_numpy(dtype=float), bills["VariableCharges"].to_numpy(dtype=float),
+                                      _rates_in_force(conn, tax, months))
+        conn.executemany(
+            "UPDATE BillingCharges SET " + ", ".join(f"{rate} = ?" for rate in added.values()) + " WHERE BillID = ?",
+            bills[[*added, "BillID"]].itertuples(index=False, name=None))
+        if has_search_index(conn, "BillingCharges"):
+            rebuild_search_index(conn, "BillingCharges")
+    return list(added.values())
@@ -0,0 +1,99 @@
+# Description: Integer-paisa money arithmetic for bill computation. Amounts are int64 paisa in NumPy
+# arrays: each charge line of a bill is rounded to the paisa once, and NetAmount and PayableAmount
+# are exact integer sums of the rounded lines. insert_bill, update_bill, the batch engine and
+# re-billing all price through bill_lines, and BillingCharges keeps the paisa figures in INTEGER
+# columns next to the rupee ones, so month totals are integer sums with nothing to re-round.
+import numpy as np
+
+PAISA_PER_RUPEE = 100
+MAX_PAISA = 2.0 ** 63  # int64 holds amounts below this
+
+# BillingCharges rupee column -> its INTEGER paisa column
+MONEY_COLUMNS = {
+    "VariableCharges": "VariableChargesPaisa",
+    "ElectricDuty": "ElectricDutyPaisa",
+    "GST": "GSTPaisa",
+    "Surcharge": "SurchargePaisa",
+    "NetAmount": "NetAmountPaisa",
+    "PayableAmount": "PayableAmountPaisa",
+}
+
+# BillingCharges tax amount column -> the column keeping the percentage of VariableCharges it was
+# charged at, which re-pricing a bill charges again
+TAX_RATE_COLUMNS = {
+    "ElectricDuty": "ElectricDutyRate",
+    "GST": "GSTRate",
+}
+
+# Columns written for every bill: the rupee figures, the paisa ones, then the tax rates
+CHARGE_COLUMNS = [*MONEY_COLUMNS, *MONEY_COLUMNS.values(), *TAX_RATE_COLUMNS.values()]
+
+# SQLite sums INTEGER columns exactly in int64 (and raises on overflow), so month totals are
+# summed where the rows are instead of being fetched first
+MONTH_TOTALS_QUERY = f"""
+    SELECT COUNT(*), {", ".join(f"COALESCE(SUM(bc.{column}), 0)" for column in MONEY_COLUMNS.values())}
+    FROM BillingReadings br JOIN BillingCharges bc ON bc.ReadingID = br.ReadingID
+    WHERE br.BillingMonth = ?
+"""
+
+
+# Rupees (a scalar or an array) to int64 paisa, half a paisa rounded away from zero. The scaled
+# value is first cut to 6 decimals so float noise (1.005 * 100 = 100.4999...) can't decide a
+# half-paisa case. Same rule as ROUND(ROUND(x * 100, 6)) in SQLite, used to back-fill old rows.
+# A missing (NaN), infinite or out-of-range amount raises ValueError rather than coming out as INT64_MIN.
+def to_paisa(rupees):
+    scaled = np.round(np.asarray(rupees, dtype=float) * PAISA_PER_RUPEE, 6)
+    valid = np.abs(scaled) < MAX_PAISA  # False for NaN
+    if not valid.all():
+        raise ValueError(f"Amount {float(np.asarray(rupees, dtype=float)[~valid].flat[0])} can't be held in paisa")
+    return (np.sign(scaled) * np.floor(np.abs(scaled) + 0.5)).astype(np.int64)
+
+
+def to_rupees(paisa):
+    return np.asarray(paisa, dtype=np.int64) / PAISA_PER_RUPEE
+
+
+# Charge lines of one bill (scalars) or many (arrays), as {rupee column: int64 paisa}.
+# VariableCharges is units x rate rounded once. ElectricDuty and GST are percentages of the rounded
+# VariableCharges, each rounded to the paisa; Surcharge is the entered amount rounded to the paisa.
+# NetAmount and PayableAmount add the rounded lines exactly.
+def bill_lines(units, rate_per_unit, electric_duty, gst, surcharge):
+    variable = to_paisa(np.multiply(units, rate_per_unit))
+    variable_rupees = to_rupees(variable)
+    # The three percentage and entered lines rounded in one call
+    duty, gst, surcharge = to_paisa(np.broadcast_arrays(
+        variable_rupees * np.divide(electric_duty, 100), variable_rupees * np.divide(gst, 100), surcharge))
+    net = variable + duty + gst
+    return {"VariableCharges": variable, "ElectricDuty": duty, "GST": gst, "Surcharge": surcharge,
+            "NetAmount": net, "PayableAmount": net + surcharge}
+
+
+# Percentage of the variable charges a stored tax amount (ElectricDuty or GST) comes to, for bills
+# without a recorded rate (migrations.apply_tax_rate_columns). Scalars or arrays. Where `in_force`, the
+# rate in force for the bill's month, gives the amount to the paisa it is taken as it is; a bill without
+# variable charges is charged at `in_force`.
+def charged_rate(amount, variable_charges, in_force):
+    amount, variable_charges, in_force = np.broadcast_arrays(
+        np.asarray(amount, dtype=float), np.asarray(variable_charges, dtype=float), np.asarray(in_force, dtype=float))
+    matches = to_paisa(variable_charges * np.divide(in_force, 100)) == to_paisa(amount)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.where(matches | (variable_charges == 0), in_force, amount * 100 / variable_charges)
+    return float(rates) if rates.ndim == 0 else rates
+
+
+# The lines as bill columns: each rupee figure (paisa / 100) next to its paisa column. One bill
+# gives plain floats and ints, ready for a single INSERT or the returned bill dict.
+def bill_columns(lines):
+    columns = {}
+    single = np.ndim(lines["PayableAmount"]) == 0
+    for name, paisa in lines.items():
+        paisa = int(paisa) if single else paisa
+        columns[name] = paisa / PAISA_PER_RUPEE if single else to_rupees(paisa)
+        columns[MONEY_COLUMNS[name]] = paisa
+    return columns
+
+
+# Paisa totals of every money column over one month's bills, plus Bills (the count)
+def month_totals(conn, billing_month):
+    bills, *totals = conn.execute(MONTH_TOTALS_QUERY, (billing_month,)).fetchone()
+    return {"Bills": bills, **dict(zip(MONEY_COLUMNS, totals))}
@@ -0,0 +1,137 @@
+# Description: Content-addressed cache of rendered bill PDFs. A bill is keyed by a hash of everything
+# printed on it (draw_bill's arguments), so an unchanged bill is served from disk and any change to a
+# reading, charge or name produces a new key. The "Bill Generated on" date is printed too, so it is part
+# of the key: a bill is rendered again on a new day. Least recently used files are evicted past a size cap.
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import date
+
+from .db import DB_PATH
+
+CACHE_DIR = "bill_cache"  # next to the database file
+MAX_BYTES = 512 * 1024 * 1024
+
+# Bump when the bill layout changes so old PDFs are no longer served
+LAYOUT_VERSION = 1
+
+
+# Hash of one bill's draw_bill arguments and the generation date printed with them (default today).
+# repr keeps 10 and 10.0 apart, as they print differently.
+def bill_key(bill, generated_on=None):
+    generated_on = (generated_on or date.today()).isoformat()
+    payload = json.dumps([LAYOUT_VERSION, generated_on] + [repr(value) for value in bill])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class BillCache:
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._bytes = sum(os.path.getsize(path) for path in self._files())
+
+    def _files(self):
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(".pdf"):
+                    yield os.path.join(root, name)
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".pdf")
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    # Path of the cached PDF, or None. A hit refreshes the file's mtime, which eviction orders by.
+    def get(self, key):
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return path
+
+    # Store PDF bytes under a key (atomically, so readers never see a partial file)
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        existing = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._bytes += len(data) - existing
+            self._stats["writes"] += 1
+            over = self._bytes > self.max_bytes
+        if over:
+            self.evict()
+        return path
+
+    # Cached PDF path for a bill, rendering it with `render(bill) -> bytes` on a miss
+    def get_or_render(self, bill, render):
+        key = bill_key(bill)
+        return self.get(key) or self.put(key, render(bill))
+
+    # Remove least recently used PDFs until the cache is back under `target` bytes
+    # (default: 90% of the cap, so a full cache doesn't evict on every write)
+    def evict(self, target=None):
+        target = int(self.max_bytes * 0.9) if target is None else target
+        with self._lock:
+            entries = []
+            for path in self._files():
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self._stats["evictions"] += 1
+            self._bytes = total
+
+    def clear(self):
+        self.evict(target=0)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["bytes"] = self._bytes
+        stats["entries"] = sum(1 for _ in self._files())
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+# Cache directory for a database file: CACHE_DIR in the database's directory, whatever the working directory
+def bill_cache_dir(db_path=DB_PATH):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), CACHE_DIR)
+
+
+# Process-wide cache for a database, created on first use
+def get_bill_cache(db_path=DB_PATH):
+    cache_dir = bill_cache_dir(db_path)
+    with _caches_lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = BillCache(cache_dir)
+        return _caches[cache_dir]
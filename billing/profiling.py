@@ -0,0 +1,207 @@
+# Description: Opt-in timing for the billing hot paths: latency histograms per instrumented call,
+# SQL statement counts per Streamlit rerun and the slowest statements. Off unless BILLING_PROFILE=1
+# or enable() is called; while off, each instrumented call costs one flag check.
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf"))
+MAX_STATEMENTS = 500
+RECENT_RUNS = 20
+
+_enabled = os.environ.get("BILLING_PROFILE", "") not in ("", "0")
+_lock = threading.Lock()
+_local = threading.local()
+_histograms = {}
+_statements = {}
+_runs = deque(maxlen=RECENT_RUNS)
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def enabled():
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _statements.clear()
+        _runs.clear()
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    # Upper bound of the bucket holding the q-th quantile
+    def quantile(self, q):
+        rank, seen = q * self.count, 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+def record(name, seconds):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+
+# Time a function into the histogram `name` while profiling is on
+def timed(name):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def _record_query(sql, seconds):
+    record("sql.execute", seconds)
+    statement = " ".join(sql.split())
+    with _lock:
+        stats = _statements.get(statement)
+        if stats is None and len(_statements) < MAX_STATEMENTS:
+            stats = _statements[statement] = {"count": 0, "total": 0.0, "max": 0.0}
+        if stats is not None:
+            stats["count"] += 1
+            stats["total"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run["queries"] += 1
+        run["sql_seconds"] += seconds
+
+
+def _timed_execute(method, self, sql, *args):
+    if not _enabled:
+        return method(self, sql, *args)
+    start = time.perf_counter()
+    try:
+        return method(self, sql, *args)
+    finally:
+        _record_query(sql, time.perf_counter() - start)
+
+
+# Statement time is measured up to the first row, which is where SQLite does the work for
+# the indexed lookups used here; fetching the remaining rows is not included.
+class ProfiledCursor(sqlite3.Cursor):
+    def execute(self, sql, *args):
+        return _timed_execute(sqlite3.Cursor.execute, self, sql, *args)
+
+    def executemany(self, sql, *args):
+        return _timed_execute(sqlite3.Cursor.executemany, self, sql, *args)
+
+
+# Connection class for ConnectionPool: conn.execute and cursors it hands out are timed
+class ProfiledConnection(sqlite3.Connection):
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        return _timed_execute(sqlite3.Connection.execute, self, sql, *args)
+
+    def executemany(self, sql, *args):
+        return _timed_execute(sqlite3.Connection.executemany, self, sql, *args)
+
+
+# Mark the start of a Streamlit rerun on this thread; the previous run (if any) is filed first
+def start_run(label="rerun"):
+    finish_run()
+    if _enabled:
+        _local.run = {"label": label, "started": time.time(), "start": time.perf_counter(),
+                      "queries": 0, "sql_seconds": 0.0}
+
+
+def finish_run():
+    run = getattr(_local, "run", None)
+    if run is None:
+        return None
+    _local.run = None
+    run = dict(run, seconds=time.perf_counter() - run.pop("start"))
+    record(f"run.{run['label']}", run["seconds"])
+    with _lock:
+        _runs.append(run)
+    return run
+
+
+# The run in progress on this thread, with its elapsed time so far
+def current_run():
+    run = getattr(_local, "run", None)
+    if run is None:
+        return None
+    return {key: value for key, value in run.items() if key != "start"} | {
+        "seconds": time.perf_counter() - run["start"]}
+
+
+def snapshot(slowest=20):
+    with _lock:
+        histograms = {
+            name: {"count": h.count, "total_seconds": h.total, "max_seconds": h.max,
+                   "p50_seconds": h.quantile(0.5), "p95_seconds": h.quantile(0.95),
+                   "buckets": {str(bound): count for bound, count in zip(BUCKETS, h.counts)}}
+            for name, h in sorted(_histograms.items())
+        }
+        statements = sorted(({"sql": sql, **stats} for sql, stats in _statements.items()),
+                            key=lambda stats: stats["max"], reverse=True)[:slowest]
+        runs = list(_runs)
+    return {"enabled": _enabled, "histograms": histograms, "slowest_sql": statements, "recent_runs": runs}
+
+
+def to_json(slowest=20):
+    return json.dumps(snapshot(slowest), indent=2)
+
+
+# Prometheus text exposition format: one histogram family, labelled by operation
+def to_prometheus():
+    lines = ["# HELP billing_call_seconds Latency of instrumented billing calls.",
+             "# TYPE billing_call_seconds histogram"]
+    with _lock:
+        for name, h in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'billing_call_seconds_bucket{{op="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'billing_call_seconds_sum{{op="{name}"}} {h.total}')
+            lines.append(f'billing_call_seconds_count{{op="{name}"}} {h.count}')
+    return "\n".join(lines) + "\n"
+
+
+# Write the metrics to a file: Prometheus text for *.prom / *.txt, JSON otherwise
+def write_metrics(path):
+    text = to_prometheus() if path.endswith((".prom", ".txt")) else to_json()
+    with open(path, "w") as out:
+        out.write(text)
@@ -0,0 +1,81 @@
+# Description: EXPLAIN QUERY PLAN checks for the hot billing queries. Fails when any of them
+# falls back to a full table SCAN, e.g. after an index is dropped or a query is rewritten.
+# The database is checked as it is: nothing is migrated first, so a missing index shows up.
+# Usage: python -m billing check-plans [--db billing_system.db]
+import re
+import sqlite3
+
+from .bill_pdf import BULK_BILLS_QUERY
+from .crud import PREVIOUS_READING_QUERY
+
+# name -> (SQL, sample parameters)
+HOT_QUERIES = {
+    "previous reading": (PREVIOUS_READING_QUERY, ("Flat-1", "2025-02")),
+    "bill reading by flat and month": ("""
+        SELECT ReadingID, PreviousReading FROM BillingReadings
+        WHERE FlatNo = ? AND BillingMonth = ?
+    """, ("Flat-1", "2025-03")),
+    "bill with charges": ("""
+        SELECT br.PreviousReading, br.PresentReading, bc.ElectricDuty, bc.GST, bc.Surcharge
+        FROM BillingReadings br
+        JOIN BillingCharges bc ON br.ReadingID = bc.ReadingID
+        WHERE br.FlatNo = ? AND br.BillingMonth = ?
+    """, ("Flat-1", "2025-03")),
+    "charges by reading": ("SELECT BillID FROM BillingCharges WHERE ReadingID = ?", (1,)),
+    "months of a flat": ("SELECT DISTINCT BillingMonth FROM BillingReadings WHERE FlatNo = ?", ("Flat-1",)),
+    "previous readings for a month": ("""
+        SELECT FlatNo, PresentReading AS PreviousReading FROM BillingReadings WHERE BillingMonth = ?
+    """, ("2025-02",)),
+    "users of a flat": ("SELECT PersonID, Name FROM Users WHERE FlatNo = ?", ("Flat-1",)),
+    "consumption history by person": ("""
+        SELECT ch.ConsumptionID, u.Name, f.FlatNo, ch.BillingMonth, ch.UnitsConsumed, ch.RecordedAt
+        FROM ConsumptionHistory ch
+        JOIN Users u ON u.PersonID = ch.PersonID
+        JOIN Flats f ON f.FlatNo = ch.FlatNo
+        WHERE 1=1 AND ch.PersonID = ?
+        ORDER BY ch.BillingMonth DESC
+    """, (1001,)),
+    "consumption history by flat": ("""
+        SELECT ch.ConsumptionID, u.Name, f.FlatNo, ch.BillingMonth, ch.UnitsConsumed, ch.RecordedAt
+        FROM ConsumptionHistory ch
+        JOIN Users u ON u.PersonID = ch.PersonID
+        JOIN Flats f ON f.FlatNo = ch.FlatNo
+        WHERE 1=1 AND ch.FlatNo = ?
+        ORDER BY ch.BillingMonth DESC
+    """, ("Flat-1",)),
+    "bulk bills for a month": (BULK_BILLS_QUERY, ("2025-03",)),
+}
+
+# "SCAN BillingReadings" or "SCAN br" with no index behind it
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?! USING)(?:$| )")
+
+
+def query_plan(conn, sql, params):
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+# Hot queries whose plan contains a full table scan: {name: [plan lines]}
+def find_full_scans(conn, queries=HOT_QUERIES):
+    failures = {}
+    for name, (sql, params) in queries.items():
+        plan = query_plan(conn, sql, params)
+        if any(FULL_SCAN.match(line) for line in plan):
+            failures[name] = plan
+    return failures
+
+
+# Read-only, so checking a database never changes it
+def main(path="billing_system.db"):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    failures = find_full_scans(conn)
+    conn.close()
+
+    for name, plan in failures.items():
+        print(f"❌ {name}: full table scan")
+        for line in plan:
+            print(f"    {line}")
+    if failures:
+        print("Missing indexes are created by `python -m billing migrate`.")
+    else:
+        print(f"✅ {len(HOT_QUERIES)} hot queries use indexes")
+    return 1 if failures else 0
@@ -0,0 +1,162 @@
+# Description: As-of resolution of the GST, Electric Duty and Surcharge rates. Each table is held as
+# arrays sorted by its effective date, so the rate in force for one billing month, or for a whole
+# array of them, comes from one searchsorted call instead of a query per bill.
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .tariff import (_connection_state, _database_key, as_of_dates, normalize_effective_date,
+                     normalize_effective_month)
+
+SURCHARGE_QUERY = """
+    SELECT s.SurchargeID, st.TypeName, s.EffectiveMonth, s.UnitsFrom, s.UnitsTo, s.RatePerUnit
+    FROM Surcharge s JOIN SurchargeType st ON st.SurchargeTypeID = s.SurchargeTypeID
+"""
+
+SURCHARGE_COLUMNS = ["TypeName", "EffectiveMonth", "UnitsFrom", "UnitsTo", "RatePerUnit"]
+
+# (query, columns) of the GST, Electric Duty and Surcharge rows a RateIndex is built from
+RATE_QUERIES = [
+    ("SELECT GSTID, EffectiveDate, GST FROM GSTRates ORDER BY GSTID", ["GSTID", "EffectiveDate", "GST"]),
+    ("SELECT DutyID, EffectiveDate, ElectricDuty FROM ElectricDutyRates ORDER BY DutyID",
+     ["DutyID", "EffectiveDate", "ElectricDuty"]),
+    (SURCHARGE_QUERY + " ORDER BY s.SurchargeID", ["SurchargeID", *SURCHARGE_COLUMNS]),
+]
+
+
+class RateHistory:
+    # GSTRates or ElectricDutyRates rows sorted by EffectiveDate, normalised like tariff dates.
+    # Slot 0 of the id and rate arrays stands for "no rate in force yet", so positions shifted
+    # by one index them directly.
+    def __init__(self, rows, id_column, rate_column):
+        rows = rows.dropna(subset=["EffectiveDate", rate_column])
+        rows = rows.assign(EffectiveDate=rows["EffectiveDate"].map(normalize_effective_date)).sort_values("EffectiveDate")
+        self.dates = rows["EffectiveDate"].to_numpy(dtype=str)
+        self.ids = np.array([None, *rows[id_column].tolist()], dtype=object)
+        self.rates = np.concatenate([[np.nan], rows[rate_column].to_numpy(dtype=float)])
+
+    # Row in force on each date (a billing month means its first day): the latest EffectiveDate
+    # on or before it, -1 when there is none
+    def positions(self, as_of):
+        return np.searchsorted(self.dates, as_of_dates(as_of), side="right") - 1
+
+    # Rate in force for a billing month or date, or an array of them; `default` where none is
+    def rate(self, as_of, default=0.0):
+        rates = self.rates[self.positions(as_of) + 1]
+        rates = np.where(np.isnan(rates), default, rates)
+        return float(rates[0]) if np.ndim(as_of) == 0 else rates
+
+    # Id (GSTID / DutyID) of the row in force, None where no rate is
+    def row_id(self, as_of):
+        ids = self.ids[self.positions(as_of) + 1]
+        return ids[0] if np.ndim(as_of) == 0 else ids
+
+
+class SurchargeRates:
+    # Surcharge rows (SURCHARGE_QUERY) grouped by type and EffectiveMonth. A row without an
+    # EffectiveMonth never applies, as in SURCHARGE_SELECT; without UnitsFrom/UnitsTo it applies
+    # to any number of units.
+    def __init__(self, rows):
+        rows = pd.DataFrame(rows).reindex(columns=["SurchargeID", *SURCHARGE_COLUMNS])
+        rows = rows.dropna(subset=["EffectiveMonth"])
+        rows["EffectiveMonth"] = rows["EffectiveMonth"].map(normalize_effective_month)
+        self.types = {}
+        for name, group in rows.groupby("TypeName"):
+            months = np.unique(group["EffectiveMonth"].to_numpy(dtype=str))
+            self.types[name] = (months, [list(group[group["EffectiveMonth"] == month].itertuples())
+                                         for month in months])
+
+    @classmethod
+    def load(cls, conn):
+        return cls(pd.read_sql_query(SURCHARGE_QUERY, conn))
+
+    # Surcharge rows of one type matched by bills, as surcharges.SURCHARGE_SELECT prices them: the
+    # rows with the latest EffectiveMonth on or before the bill's month, matched on units.
+    # `as_of` is one billing month or an array aligned with `units`.
+    # Returns (bill positions, SurchargeIDs, amounts), one entry per matched row.
+    def matches(self, type_name, units, as_of):
+        units = np.atleast_1d(np.asarray(units, dtype=float))
+        bills, surcharge_ids, amounts = [], [], []
+        months, schedules = self.types.get(type_name, ((), ()))
+        if len(months):
+            # "<U7" keeps the YYYY-MM part of a date
+            positions = np.searchsorted(months, np.asarray(as_of, dtype="<U7"), side="right") - 1
+            positions = np.broadcast_to(positions, units.shape)
+            for position in np.unique(positions[positions >= 0]):
+                in_month = positions == position
+                for row in schedules[position]:
+                    hit = in_month
+                    if not pd.isna(row.UnitsFrom):
+                        hit = in_month & (units >= row.UnitsFrom) & (units <= row.UnitsTo)
+                    index = np.flatnonzero(hit)
+                    bills.append(index)
+                    surcharge_ids.append(np.full(len(index), row.SurchargeID))
+                    amounts.append(units[index] * row.RatePerUnit)
+        if not bills:
+            return np.empty(0, dtype=int), np.empty(0), np.empty(0)
+        return np.concatenate(bills), np.concatenate(surcharge_ids), np.concatenate(amounts)
+
+    # Total surcharge of one type on each bill
+    def amounts(self, type_name, units, as_of):
+        units = np.atleast_1d(np.asarray(units, dtype=float))
+        bills, _, amounts = self.matches(type_name, units, as_of)
+        return np.bincount(bills, weights=amounts, minlength=len(units))
+
+
+class RateIndex:
+    def __init__(self, gst_rates, duty_rates, surcharges):
+        self.gst = RateHistory(gst_rates, "GSTID", "GST")
+        self.electric_duty = RateHistory(duty_rates, "DutyID", "ElectricDuty")
+        self.surcharges = SurchargeRates(surcharges)
+
+    # From the rows of RATE_QUERIES, in order
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(*(pd.DataFrame(table_rows, columns=columns) for table_rows, (_, columns) in zip(rows, RATE_QUERIES)))
+
+    @classmethod
+    def load(cls, conn):
+        return cls.from_rows(_read_rows(conn))
+
+
+def _read_rows(conn):
+    return [conn.execute(query).fetchall() for query, _ in RATE_QUERIES]
+
+
+class _CachedIndex:
+    def __init__(self, rows):
+        self.rows = rows
+        self.index = RateIndex.from_rows(rows)
+        # id(connection) -> tariff._connection_state when it last found the rows unchanged
+        self.checked = {}
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+# Cached index for the connection's database, loaded on first use. As with the tariff index, once the
+# database may have changed (another connection or process committed, or this one wrote), the rate rows
+# are read again and the index is rebuilt if they differ, so edits made outside this process are seen.
+def get_rate_index(conn):
+    key, state = _database_key(conn), _connection_state(conn)
+    cached = _indexes.get(key)
+    if cached is not None and cached.checked.get(id(conn)) == state:
+        return cached.index
+    rows = _read_rows(conn)
+    with _lock:
+        cached = _indexes.get(key)
+        if cached is None or cached.rows != rows:
+            cached = _indexes[key] = _CachedIndex(rows)
+        cached.checked[id(conn)] = state
+    return cached.index
+
+
+# Drop cached indexes so the next lookup loads the rates again
+def invalidate_rate_index(conn=None):
+    with _lock:
+        if conn is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(_database_key(conn), None)
@@ -0,0 +1,144 @@
+# Description: Cached reads of the slow-changing rate tables (GST, Electric Duty, Surcharge) and
+# the lookup tables used by the bill form, with write-through invalidation from the upserts.
+import threading
+import time
+
+import pandas as pd
+
+from .rate_index import get_rate_index, invalidate_rate_index
+
+DEFAULT_TTL = 300  # seconds
+
+# RateIndex attribute and id column of the tables resolved as of a billing month
+RATE_HISTORIES = {"GSTRates": ("gst", "GSTID"), "ElectricDutyRates": ("electric_duty", "DutyID")}
+
+# Tables served from the cache and the query that loads each one
+CACHED_QUERIES = {
+    "GSTRates": "SELECT * FROM GSTRates ORDER BY EffectiveDate",
+    "ElectricDutyRates": "SELECT * FROM ElectricDutyRates ORDER BY EffectiveDate",
+    "Surcharge": """
+        SELECT s.*, st.TypeName AS SurchargeType
+        FROM Surcharge s LEFT JOIN SurchargeType st ON st.SurchargeTypeID = s.SurchargeTypeID
+        ORDER BY s.EffectiveMonth, s.SurchargeTypeID, s.UnitsFrom
+    """,
+    "SurchargeType": "SELECT SurchargeTypeID, TypeName AS SurchargeType FROM SurchargeType ORDER BY SurchargeTypeID",
+    "Users": "SELECT * FROM Users",
+    "Flats": "SELECT * FROM Flats",
+}
+
+
+class RateCache:
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    # Cached value for key, loading it on a miss or once it is older than the TTL
+    def get(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = loader()
+        with self._lock:
+            self._entries[key] = (now, value)
+        return value
+
+    # Drop every entry whose key starts with the given prefix (all entries when omitted)
+    def invalidate(self, *prefix):
+        with self._lock:
+            for key in [k for k in self._entries if k[:len(prefix)] == prefix]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+rate_cache = RateCache()
+
+
+# Cached copy of one of CACHED_QUERIES' tables. Treat the returned frame as read-only.
+def get_cached_table(db, table_name):
+    def load():
+        with db.connection() as conn:
+            return pd.read_sql_query(CACHED_QUERIES[table_name], conn)
+    return rate_cache.get((db.path, table_name), load)
+
+
+def get_gst_rates(db):
+    return get_cached_table(db, "GSTRates")
+
+
+def get_electric_duty_rates(db):
+    return get_cached_table(db, "ElectricDutyRates")
+
+
+def get_surcharge_rates(db):
+    return get_cached_table(db, "Surcharge")
+
+
+def get_surcharge_data(db):
+    return get_cached_table(db, "SurchargeType")
+
+
+# Position in a GSTRates or ElectricDutyRates frame of the row in force for a billing month (0 when
+# none is), used as the default of the bill forms' rate dropdowns
+def in_force_position(db, rates_df, table_name, billing_month):
+    attribute, id_column = RATE_HISTORIES[table_name]
+    with db.connection() as conn:
+        row_id = getattr(get_rate_index(conn), attribute).row_id(billing_month)
+    ids = rates_df[id_column].tolist()
+    return ids.index(row_id) if row_id in ids else 0
+
+
+# Drop a rate table's cached copy and the as-of rate index once the write commits
+def _invalidate_after_commit(db, conn, table_name):
+    db.after_commit(lambda: (rate_cache.invalidate(db.path, table_name), invalidate_rate_index(conn)))
+
+
+def upsert_gst_rate(db, gst_rate, effective_date):
+    with db.transaction() as conn:
+        conn.execute("""
+            INSERT INTO GSTRates (EffectiveDate, GST) VALUES (?, ?)
+            ON CONFLICT(EffectiveDate) DO UPDATE SET GST = excluded.GST
+        """, (effective_date, gst_rate))
+        _invalidate_after_commit(db, conn, "GSTRates")
+
+
+def upsert_electric_duty_rate(db, duty_rate, effective_date):
+    with db.transaction() as conn:
+        conn.execute("""
+            INSERT INTO ElectricDutyRates (EffectiveDate, ElectricDuty) VALUES (?, ?)
+            ON CONFLICT(EffectiveDate) DO UPDATE SET ElectricDuty = excluded.ElectricDuty
+        """, (effective_date, duty_rate))
+        _invalidate_after_commit(db, conn, "ElectricDutyRates")
+
+
+# Unit ranges only apply to slab-based surcharges; 0-0 means "no range"
+def upsert_surcharge_rate(db, surcharge_type_id, rate_per_unit, units_from, units_to, effective_month):
+    if not units_from and not units_to:
+        units_from = units_to = None
+    with db.transaction() as conn:
+        updated = conn.execute("""
+            UPDATE Surcharge SET RatePerUnit = ?
+            WHERE SurchargeTypeID = ? AND EffectiveMonth = ?
+              AND UnitsFrom IS ? AND UnitsTo IS ?
+        """, (rate_per_unit, surcharge_type_id, effective_month, units_from, units_to)).rowcount
+        if not updated:
+            conn.execute("""
+                INSERT INTO Surcharge (SurchargeTypeID, RatePerUnit, UnitsFrom, UnitsTo, EffectiveMonth)
+                VALUES (?, ?, ?, ?, ?)
+            """, (surcharge_type_id, rate_per_unit, units_from, units_to, effective_month))
+        _invalidate_after_commit(db, conn, "Surcharge")
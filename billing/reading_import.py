@@ -0,0 +1,121 @@
+# Description: Bulk meter-reading import. A CSV of (FlatNo, BillingMonth, PresentReading,
+# UnitsAdjusted) is read in chunks, validated column-wise against Flats and the previous readings,
+# and billed with the batch engine's insert_bill arithmetic. Rejected rows go to an error file.
+import numpy as np
+import pandas as pd
+
+from .aggregates import deferred_aggregates
+from .batch_billing import compute_bills, load_previous_readings, prepare_readings, write_bills
+from .rate_index import get_rate_index
+from .rebilling import rebill_downstream
+from .search_index import deferred_search_index
+from .tariff import get_tariff_index
+
+IMPORT_COLUMNS = ["FlatNo", "BillingMonth", "PresentReading", "UnitsAdjusted"]
+REQUIRED_COLUMNS = ["FlatNo", "BillingMonth", "PresentReading"]
+CHUNK_SIZE = 50000
+
+MONTH_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+
+
+# Split a raw chunk into typed candidate rows and rejected rows (with an Error column).
+# Checks that need the database per month (duplicates, previous reading) come later.
+def validate_readings(chunk, flats):
+    flat_no = chunk["FlatNo"].str.strip()
+    billing_month = chunk["BillingMonth"].str.strip()
+    present = pd.to_numeric(chunk["PresentReading"], errors="coerce")
+    adjusted_raw = chunk["UnitsAdjusted"].str.strip()
+    adjusted = pd.to_numeric(adjusted_raw.replace("", "0"), errors="coerce")
+
+    # First failing check wins
+    checks = [
+        (flat_no == "", "Missing FlatNo"),
+        (~billing_month.str.match(MONTH_PATTERN), "Invalid BillingMonth (expected YYYY-MM)"),
+        (present.isna() | (present < 0), "Invalid PresentReading"),
+        (adjusted.isna(), "Invalid UnitsAdjusted"),
+        (~flat_no.isin(flats), "Unknown FlatNo"),
+    ]
+    errors = pd.Series(np.select([mask for mask, _ in checks], [message for _, message in checks], default=""),
+                       index=chunk.index)
+
+    rows = pd.DataFrame({"Row": chunk["Row"], "FlatNo": flat_no, "BillingMonth": billing_month,
+                         "PresentReading": present, "UnitsAdjusted": adjusted})
+    valid = errors == ""
+    return rows[valid], chunk[~valid].assign(Error=errors[~valid])
+
+
+# Reject rows that repeat a (FlatNo, month) already billed or seen earlier in the file, and
+# readings below the previous month's. Returns (accepted, rejected, previous readings).
+def check_against_month(conn, rows, billing_month):
+    billed = {row[0] for row in conn.execute(
+        "SELECT FlatNo FROM BillingReadings WHERE BillingMonth = ?", (billing_month,))}
+    previous = load_previous_readings(conn, billing_month)
+    previous_reading = rows["FlatNo"].map(previous.set_index("FlatNo")["PreviousReading"]).fillna(0.0)
+
+    checks = [
+        (rows["FlatNo"].isin(billed), "Reading already recorded for this month"),
+        (rows.duplicated("FlatNo", keep="first"), "Duplicate reading in file"),
+        (rows["PresentReading"] < previous_reading, "PresentReading is below the previous reading"),
+    ]
+    errors = pd.Series(np.select([mask for mask, _ in checks], [message for _, message in checks], default=""),
+                       index=rows.index)
+    valid = errors == ""
+    return rows[valid], rows[~valid].assign(Error=errors[~valid]), previous
+
+
+def _write_errors(rejected, errors, header):
+    rejected.to_csv(errors, index=False, header=header, columns=["Row", *IMPORT_COLUMNS, "Error"])
+
+
+# Import a readings CSV (path or file object) in one transaction. Months inside each chunk are
+# billed oldest first, so a file may carry consecutive months for the same flat. Rejected rows
+# are written to `errors` (path or file object) with the file row number and the reason.
+# Search indexes, ConsumptionHistory and the summaries are brought up to date once at the end
+# rather than by per-row triggers. Bills already on file for the month after an imported reading
+# are then re-billed if it changes their PreviousReading (a back-filled month).
+# ElectricDuty and GST default to the rates in force for each row's billing month, as percentages of the
+# variable charges.
+# Returns {"imported": n, "rejected": n, "rebilled": n}.
+def import_readings(db, source, errors, electric_duty=None, gst=None, surcharge=0.0, chunk_size=CHUNK_SIZE,
+                    progress=None):
+    imported = rejected_count = 0
+    imported_pairs = []
+    chunks = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_size)
+
+    with db.transaction() as conn:
+        with deferred_search_index(conn), deferred_aggregates(conn):
+            flats = {row[0] for row in conn.execute("SELECT FlatNo FROM Flats")}
+            tariff, rates = get_tariff_index(conn), get_rate_index(conn)
+            start_row = 2  # row 1 is the header
+            for chunk in chunks:
+                missing = [column for column in REQUIRED_COLUMNS if column not in chunk]
+                if missing:
+                    raise ValueError(f"Missing column(s): {', '.join(missing)}")
+                if "UnitsAdjusted" not in chunk:
+                    chunk["UnitsAdjusted"] = ""
+                chunk.insert(0, "Row", range(start_row, start_row + len(chunk)))
+                start_row += len(chunk)
+
+                rows, rejected = validate_readings(chunk, flats)
+                rejected_parts = [rejected]
+                for billing_month, month_rows in rows.groupby("BillingMonth"):
+                    accepted, month_rejected, previous = check_against_month(conn, month_rows, billing_month)
+                    rejected_parts.append(month_rejected)
+                    if accepted.empty:
+                        continue
+                    readings = prepare_readings(accepted, electric_duty, gst, surcharge)
+                    write_bills(conn, billing_month, compute_bills(readings, previous, tariff, billing_month, rates))
+                    imported_pairs.extend((flat_no, billing_month) for flat_no in accepted["FlatNo"])
+                    imported += len(accepted)
+
+                rejected = pd.concat(rejected_parts).sort_values("Row")
+                if not rejected.empty:
+                    _write_errors(rejected, errors, header=rejected_count == 0)
+                    rejected_count += len(rejected)
+                if progress:
+                    progress(imported, rejected_count)
+
+        # After the deferred blocks, so the update triggers see fully counted rows
+        rebilled = rebill_downstream(conn, imported_pairs)
+
+    return {"imported": imported, "rejected": rejected_count, "rebilled": len(rebilled)}
@@ -0,0 +1,215 @@
+# Description: Cascading re-billing after a reading is corrected or a past month is back-filled.
+# A bill's PreviousReading is the prior calendar month's PresentReading, so a change to month M
+# leaves M+1 with a stale PreviousReading and stale charges. The walk goes forward one month at a
+# time and only follows bills whose PreviousReading no longer matches; everything else is untouched.
+# ElectricDuty and GST follow the new variable charges. Surcharges recorded for the edited and
+# re-billed bills are re-priced from their new units, and each bill's Surcharge and PayableAmount
+# move with them.
+import numpy as np
+import pandas as pd
+
+from .money import bill_columns, bill_lines, to_paisa, to_rupees
+from .profiling import timed
+from .rate_index import get_rate_index
+from .tariff import get_tariff_index
+
+MAX_PAIRS_PER_QUERY = 10000  # 2 bound parameters each
+
+BILLS_QUERY = """
+    WITH req(FlatNo, BillingMonth) AS (VALUES {values})
+    SELECT br.ReadingID, br.FlatNo, br.BillingMonth, br.PreviousReading, br.PresentReading,
+           COALESCE(br.UnitsAdjusted, 0) AS UnitsAdjusted, COALESCE(bc.ElectricDuty, 0) AS ElectricDuty,
+           COALESCE(bc.GST, 0) AS GST, COALESCE(bc.Surcharge, 0) AS Surcharge, bc.ElectricDutyRate, bc.GSTRate
+    FROM req
+    JOIN BillingReadings br ON br.FlatNo = req.FlatNo AND br.BillingMonth = req.BillingMonth
+    LEFT JOIN BillingCharges bc ON bc.ReadingID = br.ReadingID
+    ORDER BY br.ReadingID
+"""
+
+BILL_COLUMNS = ["ReadingID", "FlatNo", "BillingMonth", "PreviousReading", "PresentReading", "UnitsAdjusted",
+                "ElectricDuty", "GST", "Surcharge", "ElectricDutyRate", "GSTRate"]
+_NO_BILLS = pd.DataFrame(columns=BILL_COLUMNS)  # copied per call: far cheaper than building an empty frame
+
+# Surcharges recorded for each bill's own month (populate_month_surcharges' rows) with its units and
+# what the recorded surcharges come to with their GST and Electric Duty (Charged)
+RECORDED_SURCHARGES_QUERY = """
+    WITH req(FlatNo, BillingMonth) AS (VALUES {values})
+    SELECT br.ReadingID, br.BillingMonth, st.TypeName,
+           COALESCE(ABS(br.PresentReading - br.PreviousReading) + COALESCE(br.UnitsAdjusted, 0), 0) AS Units,
+           m.SurchargeID, m.SurchargeAmount,
+           COALESCE(gd.TotalSurcharge + gd.GSTAmount + gd.ElectricDutyAmount, 0) AS Charged
+    FROM req
+    JOIN BillingReadings br ON br.FlatNo = req.FlatNo AND br.BillingMonth = req.BillingMonth
+    JOIN ReadingSurchargeMapping m ON m.ReadingID = br.ReadingID AND m.BillingMonth = br.BillingMonth
+    JOIN Surcharge s ON s.SurchargeID = m.SurchargeID
+    JOIN SurchargeType st ON st.SurchargeTypeID = s.SurchargeTypeID
+    LEFT JOIN SurchargeGSTDuty gd ON gd.ReadingID = br.ReadingID
+"""
+
+# A bill's Surcharge moves by the change in its recorded surcharges; PayableAmount follows
+SURCHARGE_CHANGE_UPDATE = """
+    UPDATE BillingCharges
+    SET SurchargePaisa = COALESCE(SurchargePaisa, 0) + ?1, Surcharge = (COALESCE(SurchargePaisa, 0) + ?1) / 100.0,
+        PayableAmountPaisa = NetAmountPaisa + COALESCE(SurchargePaisa, 0) + ?1,
+        PayableAmount = (NetAmountPaisa + COALESCE(SurchargePaisa, 0) + ?1) / 100.0
+    WHERE ReadingID = ?2
+"""
+
+
+# (sql, params) for a query with a `req` VALUES CTE of (FlatNo, BillingMonth) pairs, 10000 pairs at a time
+def _pair_queries(query, pairs):
+    pairs = list(dict.fromkeys(pairs))
+    for start in range(0, len(pairs), MAX_PAIRS_PER_QUERY):
+        chunk = pairs[start:start + MAX_PAIRS_PER_QUERY]
+        yield query.format(values=", ".join(["(?, ?)"] * len(chunk))), [p for pair in chunk for p in pair]
+
+
+# Bills for the given (FlatNo, BillingMonth) pairs as {pair: BILLS_QUERY row}; the first reading of
+# a flat and month wins, like insert_bill's LIMIT 1 lookup of the previous reading
+def load_bills(conn, pairs):
+    bills = {}
+    for sql, params in _pair_queries(BILLS_QUERY, pairs):
+        for row in conn.execute(sql, params):
+            bills.setdefault((row[1], row[2]), row)
+    return bills
+
+
+def next_month(month):
+    year, month = int(month[:4]), int(month[5:7])
+    return f"{year + month // 12}-{month % 12 + 1:02d}"
+
+
+# Downstream bills whose PreviousReading no longer matches, as BILLS_QUERY rows carrying the
+# corrected PreviousReading. `edits` are (FlatNo, BillingMonth) pairs whose reading was changed,
+# inserted or removed. The walk works on plain rows: it runs inside every single-bill save.
+def find_stale_bills(conn, edits):
+    edits = list(dict.fromkeys(edits))
+    # Billing the newest month, the usual case, has nothing downstream: one indexed probe per month
+    followed = {month for month in {month for _, month in edits} if conn.execute(
+        "SELECT 1 FROM BillingReadings WHERE BillingMonth = ? LIMIT 1", (next_month(month),)).fetchone()}
+    edits = [(flat_no, month) for flat_no, month in edits if month in followed]
+    if not edits:
+        return []
+    present = load_bills(conn, edits)
+    # A month without a bill hands on 0, as get_previous_reading does
+    frontier = {pair: present[pair][4] if pair in present else 0.0 for pair in edits}
+
+    stale = []
+    while frontier:
+        expected = {(flat_no, next_month(month)): reading for (flat_no, month), reading in frontier.items()}
+        frontier = {}
+        for pair, bill in load_bills(conn, expected).items():
+            if bill[3] != expected[pair]:
+                stale.append((*bill[:3], expected[pair], *bill[4:]))
+                # Only a month whose bill changed can make the month after it stale
+                frontier[pair] = bill[4]
+    return stale
+
+
+# Same arithmetic as insert_bill, for a frame of bills that may span several months. ElectricDuty and
+# GST are charged again at the ElectricDutyRate and GSTRate each bill was charged at (as update_bill
+# keeps them), now on the new variable charges; a bill without a recorded rate gets the rate in force.
+def recompute_bills(conn, bills):
+    units_consumed = (bills["PresentReading"] - bills["PreviousReading"]).abs() + bills["UnitsAdjusted"]
+    months = bills["BillingMonth"].to_numpy()
+    rate_per_unit = get_tariff_index(conn).rate(units_consumed.to_numpy(), months)
+    rates = get_rate_index(conn)
+    electric_duty = bills["ElectricDutyRate"].astype(float).fillna(
+        pd.Series(rates.electric_duty.rate(months), index=bills.index))
+    gst = bills["GSTRate"].astype(float).fillna(pd.Series(rates.gst.rate(months), index=bills.index))
+    lines = bill_lines(units_consumed.to_numpy(), rate_per_unit, electric_duty.to_numpy(), gst.to_numpy(),
+                       bills["Surcharge"].to_numpy())
+    return bills.assign(UnitsConsumed=units_consumed, RatePerUnit=rate_per_unit, ElectricDutyRate=electric_duty,
+                        GSTRate=gst, **bill_columns(lines))
+
+
+# Rewrite the ReadingSurchargeMapping and SurchargeGSTDuty rows recorded for the bills of `pairs`
+# from their current units, as populate_month_surcharges would: surcharge rows and the GST and
+# Electric Duty on them are those in force for each bill's month, resolved for all bills at once.
+# Each re-priced bill's Surcharge moves by what its recorded surcharges, taxes included, changed
+# by, so any part entered by hand is kept, and PayableAmount is NetAmount plus the new Surcharge.
+# Bills whose surcharges come out unchanged (same units) are left alone. Plain rows rather than
+# DataFrames, since a single edited bill is the common case.
+# Returns {ReadingID: change in Surcharge, in paisa} for the bills re-priced.
+def reprice_recorded_surcharges(conn, pairs):
+    recorded = [row for sql, params in _pair_queries(RECORDED_SURCHARGES_QUERY, pairs)
+                for row in conn.execute(sql, params)]
+    if not recorded:
+        return {}
+    rates = get_rate_index(conn)
+    current, charged, by_type = {}, {}, {}
+    for reading_id, billing_month, type_name, units, surcharge_id, amount, charged_amount in recorded:
+        current.setdefault((reading_id, billing_month), set()).add((surcharge_id, round(amount, 6)))
+        charged[(reading_id, billing_month)] = charged_amount
+        by_type.setdefault(type_name, {})[(reading_id, billing_month)] = units
+
+    repriced = {key: [] for key in current}
+    for type_name, bills in by_type.items():
+        keys = list(bills)
+        positions, surcharge_ids, amounts = rates.surcharges.matches(
+            type_name, list(bills.values()), [month for _, month in keys])
+        for position, surcharge_id, amount in zip(positions.tolist(), surcharge_ids.tolist(), amounts.tolist()):
+            repriced[keys[position]].append((surcharge_id, amount))
+    repriced = {key: rows for key, rows in repriced.items()
+                if {(surcharge_id, round(amount, 6)) for surcharge_id, amount in rows} != current[key]}
+    if not repriced:
+        return {}
+
+    conn.executemany("DELETE FROM ReadingSurchargeMapping WHERE ReadingID = ? AND BillingMonth = ?", repriced)
+    conn.executemany("DELETE FROM SurchargeGSTDuty WHERE ReadingID = ?", [(reading_id,) for reading_id, _ in repriced])
+    conn.executemany("""
+        INSERT INTO ReadingSurchargeMapping (ReadingID, BillingMonth, SurchargeID, SurchargeAmount) VALUES (?, ?, ?, ?)
+    """, [(*key, surcharge_id, amount) for key, rows in repriced.items() for surcharge_id, amount in rows])
+    totals = {key: sum(amount for _, amount in rows) for key, rows in repriced.items() if rows}
+    new_charged = dict.fromkeys(repriced, 0.0)
+    if totals:
+        months = [month for _, month in totals]
+        gst, duty = rates.gst.rate(months).tolist(), rates.electric_duty.rate(months).tolist()
+        rows = [(reading_id, total, gst_id, duty_id, total * gst_rate / 100, total * duty_rate / 100)
+                for ((reading_id, _), total), gst_id, duty_id, gst_rate, duty_rate in zip(
+                    totals.items(), rates.gst.row_id(months), rates.electric_duty.row_id(months), gst, duty)]
+        conn.executemany("""
+            INSERT INTO SurchargeGSTDuty (ReadingID, TotalSurcharge, GSTID, ElectricDutyID, GSTAmount, ElectricDutyAmount)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        new_charged.update((key, total + gst_amount + duty_amount)
+                           for key, (_, total, _, _, gst_amount, duty_amount) in zip(totals, rows))
+
+    keys = list(repriced)
+    changes = (to_paisa([new_charged[key] for key in keys]) - to_paisa([charged[key] for key in keys])).tolist()
+    conn.executemany(SURCHARGE_CHANGE_UPDATE, [(change, reading_id) for change, (reading_id, _) in zip(changes, keys)])
+    return {reading_id: change for change, (reading_id, _) in zip(changes, keys)}
+
+
+# Re-bill the later months made stale by `edits`, inside the caller's transaction: one vectorized
+# recompute, one executemany per table, CorrectionStatus set to 'Corrected'. ElectricDuty and GST
+# follow the new variable charges at the rates the bills were charged at; the surcharges recorded for
+# the edited and re-billed bills are re-priced and their Surcharge moves with them. Returns the re-billed bills, oldest first.
+@timed("rebilling.rebill_downstream")
+def rebill_downstream(conn, edits):
+    edits = list(edits)
+    stale = find_stale_bills(conn, edits)
+    bills = _NO_BILLS.copy()
+    if stale:
+        bills = recompute_bills(conn, pd.DataFrame(stale, columns=BILL_COLUMNS)).sort_values(
+            ["BillingMonth", "FlatNo"], ignore_index=True)
+        conn.executemany("""
+            UPDATE BillingReadings SET PreviousReading = ?, CorrectionStatus = 'Corrected' WHERE ReadingID = ?
+        """, bills[["PreviousReading", "ReadingID"]].itertuples(index=False, name=None))
+        conn.executemany("""
+            UPDATE BillingCharges SET RatePerUnit = ?, VariableCharges = ?, ElectricDuty = ?, GST = ?, NetAmount = ?,
+                PayableAmount = ?, VariableChargesPaisa = ?, ElectricDutyPaisa = ?, GSTPaisa = ?, NetAmountPaisa = ?,
+                PayableAmountPaisa = ?, ElectricDutyRate = ?, GSTRate = ?
+            WHERE ReadingID = ?
+        """, bills[["RatePerUnit", "VariableCharges", "ElectricDuty", "GST", "NetAmount", "PayableAmount",
+                    "VariableChargesPaisa", "ElectricDutyPaisa", "GSTPaisa", "NetAmountPaisa", "PayableAmountPaisa",
+                    "ElectricDutyRate", "GSTRate", "ReadingID"]].itertuples(index=False, name=None))
+
+    changes = reprice_recorded_surcharges(conn, [*edits, *((bill[1], bill[2]) for bill in stale)])
+    if changes and len(bills):
+        # The returned bills as stored after the re-pricing
+        surcharge = bills["SurchargePaisa"].to_numpy() + bills["ReadingID"].map(changes).fillna(0).to_numpy(np.int64)
+        payable = bills["NetAmountPaisa"].to_numpy() + surcharge
+        bills = bills.assign(Surcharge=to_rupees(surcharge), SurchargePaisa=surcharge,
+                             PayableAmount=to_rupees(payable), PayableAmountPaisa=payable)
+    return bills
@@ -0,0 +1,29 @@
+# Description: Startup schema work shared by the Streamlit apps and the CLI: lookup indexes, the
+# paisa and tax rate columns of BillingCharges, full-text shadow indexes for the General Search, the
+# trigger-maintained billing aggregates and the background jobs table.
+from .aggregates import ensure_aggregates
+from .db import ConnectionPool, DB_PATH
+from .jobs import ensure_jobs_table
+from .migrations import apply_indexes, apply_money_columns, apply_tax_rate_columns
+from .search_index import ensure_search_indexes
+
+
+# Safe to run on every start; each step only creates what is missing. Returns what was created.
+def prepare_database(conn):
+    return {
+        "indexes": apply_indexes(conn),
+        # Before the aggregates: the summary triggers read PayableAmountPaisa
+        "money_columns": apply_money_columns(conn),
+        "tax_rate_columns": apply_tax_rate_columns(conn),
+        "search_indexes": ensure_search_indexes(conn),
+        "aggregates": ensure_aggregates(conn),
+        "jobs": ensure_jobs_table(conn),
+    }
+
+
+# Connection pool for a database file, prepared for the billing code
+def open_database(path=DB_PATH, size=4):
+    db = ConnectionPool(path, size)
+    with db.transaction() as conn:
+        prepare_database(conn)
+    return db
@@ -0,0 +1,133 @@
+# Description: SQLite FTS5 shadow indexes for the General Search box. Each indexed table gets an
+# external-content "<Table>_fts" table kept current by insert/update/delete triggers.
+import re
+from contextlib import contextmanager
+
+import pandas as pd
+
+SEARCH_TABLES = ["Users", "BillingReadings", "BillingCharges", "ConsumptionHistory"]
+
+# Keep decimals ("943.2") as single tokens. Hyphens split, so "12" finds "Flat-12"; a hyphenated
+# search term ("Flat-12", "2025-03") is matched as a phrase of its parts.
+FTS_TOKENIZER = "unicode61 tokenchars '.'"
+
+
+def fts_table(table_name):
+    return f"{table_name}_fts"
+
+
+def _indexed_columns(conn, table_name):
+    return [row[1] for row in conn.execute("SELECT * FROM pragma_table_info(?)", (table_name,))]
+
+
+def has_search_index(conn, table_name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                        (fts_table(table_name),)).fetchone() is not None
+
+
+def _create_insert_trigger(conn, table_name, columns):
+    fts = fts_table(table_name)
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    new_values = ", ".join(f'new."{c}"' for c in columns)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS "{fts}_ai" AFTER INSERT ON "{table_name}" BEGIN
+            INSERT INTO "{fts}"(rowid, {column_list}) VALUES (new.rowid, {new_values});
+        END
+    """)
+
+
+# Create the FTS table and its triggers for one table, populating it on first creation
+def create_search_index(conn, table_name):
+    columns = _indexed_columns(conn, table_name)
+    if not columns or has_search_index(conn, table_name):
+        return False
+
+    fts = fts_table(table_name)
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    new_values = ", ".join(f'new."{c}"' for c in columns)
+    old_values = ", ".join(f'old."{c}"' for c in columns)
+
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE "{fts}" USING fts5({column_list},
+            content='{table_name}', content_rowid='rowid', tokenize="{FTS_TOKENIZER}")
+    """)
+    _create_insert_trigger(conn, table_name, columns)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS "{fts}_ad" AFTER DELETE ON "{table_name}" BEGIN
+            INSERT INTO "{fts}"("{fts}", rowid, {column_list}) VALUES ('delete', old.rowid, {old_values});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS "{fts}_au" AFTER UPDATE ON "{table_name}" BEGIN
+            INSERT INTO "{fts}"("{fts}", rowid, {column_list}) VALUES ('delete', old.rowid, {old_values});
+            INSERT INTO "{fts}"(rowid, {column_list}) VALUES (new.rowid, {new_values});
+        END
+    """)
+    conn.execute(f"""INSERT INTO "{fts}"("{fts}") VALUES ('rebuild')""")
+    return True
+
+
+# An index built with another tokenizer (an older FTS_TOKENIZER) has to be rebuilt
+def _stale_tokenizer(conn, table_name):
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (fts_table(table_name),)).fetchone()
+    return sql is not None and FTS_TOKENIZER not in sql[0]
+
+
+# Make sure every searchable table has a current shadow index (safe to call on every start)
+def ensure_search_indexes(conn, tables=SEARCH_TABLES):
+    return [table for table in tables if create_search_index(conn, table)
+            or (_stale_tokenizer(conn, table) and rebuild_search_index(conn, table))]
+
+
+# For insert-only bulk loads inside the caller's transaction: the per-row insert triggers are
+# dropped for the duration and the new rows are indexed with one INSERT ... SELECT per table.
+# On error the transaction rollback restores the triggers.
+@contextmanager
+def deferred_search_index(conn, tables=SEARCH_TABLES):
+    tables = [table for table in tables if has_search_index(conn, table)]
+    marks = {table: conn.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM "{table}"').fetchone()[0] for table in tables}
+    for table in tables:
+        conn.execute(f'DROP TRIGGER IF EXISTS "{fts_table(table)}_ai"')
+    yield
+    for table in tables:
+        columns = _indexed_columns(conn, table)
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        conn.execute(f"""
+            INSERT INTO "{fts_table(table)}"(rowid, {column_list})
+            SELECT rowid, {column_list} FROM "{table}" WHERE rowid > ?
+        """, (marks[table],))
+        _create_insert_trigger(conn, table, columns)
+
+
+# Drop and rebuild one index, e.g. after the base table's columns change
+def rebuild_search_index(conn, table_name):
+    fts = fts_table(table_name)
+    for suffix in ("ai", "ad", "au"):
+        conn.execute(f'DROP TRIGGER IF EXISTS "{fts}_{suffix}"')
+    conn.execute(f'DROP TABLE IF EXISTS "{fts}"')
+    return create_search_index(conn, table_name)
+
+
+# Turn free text into an FTS5 query: every word must match, each as a prefix
+def match_query(search_term):
+    terms = [t for t in re.split(r"\s+", str(search_term).strip()) if t]
+    return " ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+
+
+# Matching row ids, best match first
+def search_ids(conn, table_name, search_term, limit=None):
+    query = f'SELECT rowid FROM "{fts_table(table_name)}" WHERE "{fts_table(table_name)}" MATCH ? ORDER BY rank'
+    params = [match_query(search_term)]
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    return [row[0] for row in conn.execute(query, params)]
+
+
+# Matching rows of the base table, best match first
+def search_rows(conn, table_name, search_term, limit=50, offset=0):
+    fts = fts_table(table_name)
+    return pd.read_sql_query(f"""
+        SELECT t.* FROM "{fts}" JOIN "{table_name}" t ON t.rowid = "{fts}".rowid
+        WHERE "{fts}" MATCH ? ORDER BY "{fts}".rank LIMIT ? OFFSET ?
+    """, conn, params=(match_query(search_term), limit, offset))
@@ -0,0 +1,120 @@
+# Description: Set-based surcharge computation. Amounts for many (flat, month, surcharge type)
+# combinations come from one query, and a whole month's ReadingSurchargeMapping and
+# SurchargeGSTDuty rows are populated with INSERT ... SELECT.
+import pandas as pd
+
+from .profiling import timed
+from .rate_index import get_rate_index
+from .tariff import normalize_effective_month
+
+MAX_REQUESTS_PER_QUERY = 5000  # 4 bound parameters each, well under SQLite's limit
+
+# Amount per requested (FlatNo, BillingMonth, TypeName): the surcharge of that type with the
+# latest EffectiveMonth on or before the billing month, matched to the unit range for
+# slab-based types, times the units billed that month. Both parts expect a `req` CTE and
+# effective_month() (use_effective_month), which reads EffectiveMonth as SurchargeRates does.
+SURCHARGE_CTES = """
+    units AS (
+        SELECT req.idx, req.FlatNo, req.BillingMonth, req.TypeName, st.SurchargeTypeID, br.ReadingID,
+               COALESCE(ABS(br.PresentReading - br.PreviousReading) + COALESCE(br.UnitsAdjusted, 0), 0) AS Units
+        FROM req
+        LEFT JOIN SurchargeType st ON st.TypeName = req.TypeName
+        LEFT JOIN BillingReadings br ON br.FlatNo = req.FlatNo AND br.BillingMonth = req.BillingMonth
+    ),
+    -- A per-row lookup on Surcharge's (SurchargeTypeID, ...) index; joining a grouped CTE back
+    -- by idx is planned as a nested scan when the database has no ANALYZE statistics
+    effective AS (
+        SELECT u.*, (SELECT MAX(effective_month(s.EffectiveMonth)) FROM Surcharge s
+                     WHERE s.SurchargeTypeID = u.SurchargeTypeID
+                       AND effective_month(s.EffectiveMonth) <= u.BillingMonth) AS EffectiveMonth
+        FROM units u
+    )
+"""
+
+SURCHARGE_SELECT = """
+    SELECT u.idx, u.FlatNo, u.BillingMonth, u.TypeName AS SurchargeType, u.ReadingID, s.SurchargeID,
+           u.Units, COALESCE(s.RatePerUnit, 0) AS RatePerUnit,
+           u.Units * COALESCE(s.RatePerUnit, 0) AS SurchargeAmount
+    FROM effective u
+    LEFT JOIN Surcharge s ON s.SurchargeTypeID = u.SurchargeTypeID
+        AND effective_month(s.EffectiveMonth) = u.EffectiveMonth
+        AND (s.UnitsFrom IS NULL OR u.Units BETWEEN s.UnitsFrom AND s.UnitsTo)
+"""
+
+
+# Make effective_month() available to SURCHARGE_CTES and SURCHARGE_SELECT on this connection
+def use_effective_month(conn):
+    conn.create_function("effective_month", 1, normalize_effective_month, deterministic=True)
+
+
+# Expand flat(s) x [(month, surcharge type), ...] into (flat, month, type) requests
+def surcharge_requests(flat_nos, month_types):
+    if isinstance(flat_nos, str):
+        flat_nos = [flat_nos]
+    return [(flat_no, month, surcharge_type) for flat_no in flat_nos for month, surcharge_type in month_types]
+
+
+# Surcharge amounts for every request, in request order, from one query per 5000 requests
+@timed("surcharges.get_surcharge_amounts")
+def get_surcharge_amounts(conn, flat_nos, month_types):
+    requests = surcharge_requests(flat_nos, month_types)
+    use_effective_month(conn)
+    frames = []
+    for start in range(0, len(requests), MAX_REQUESTS_PER_QUERY):
+        chunk = requests[start:start + MAX_REQUESTS_PER_QUERY]
+        values = ", ".join(["(?, ?, ?, ?)"] * len(chunk))
+        params = [p for i, request in enumerate(chunk, start) for p in (i, *request)]
+        frames.append(pd.read_sql_query(
+            f"WITH req(idx, FlatNo, BillingMonth, TypeName) AS (VALUES {values}), {SURCHARGE_CTES} {SURCHARGE_SELECT} ORDER BY u.idx",
+            conn, params=params))
+    if not frames:
+        return pd.DataFrame(columns=["idx", "FlatNo", "BillingMonth", "SurchargeType", "ReadingID",
+                                     "SurchargeID", "Units", "RatePerUnit", "SurchargeAmount"])
+    return pd.concat(frames, ignore_index=True)
+
+
+# Total surcharge for one flat over several (month, type) pairs
+@timed("surcharges.get_total_surcharge")
+def get_total_surcharge(conn, flat_no, month_types):
+    return float(get_surcharge_amounts(conn, flat_no, month_types)["SurchargeAmount"].sum())
+
+
+# Fill ReadingSurchargeMapping and SurchargeGSTDuty for every reading of a month and the given
+# surcharge types with two INSERT ... SELECT statements, inside the caller's transaction.
+# GST and Electric Duty on the surcharge are the rates in force for the month (rate_index), the
+# same ones batch billing and re-billing use.
+@timed("surcharges.populate_month_surcharges")
+def populate_month_surcharges(conn, billing_month, surcharge_types):
+    type_marks = ", ".join("?" * len(surcharge_types))
+    use_effective_month(conn)
+    conn.execute(f"""
+        WITH req(idx, FlatNo, BillingMonth, TypeName) AS (
+            SELECT ROW_NUMBER() OVER (), br.FlatNo, br.BillingMonth, st.TypeName
+            FROM BillingReadings br CROSS JOIN SurchargeType st
+            WHERE br.BillingMonth = ? AND st.TypeName IN ({type_marks})
+        ), {SURCHARGE_CTES}, amounts AS ({SURCHARGE_SELECT})
+        INSERT INTO ReadingSurchargeMapping (ReadingID, SurchargeID, BillingMonth, SurchargeAmount)
+        SELECT ReadingID, SurchargeID, BillingMonth, SurchargeAmount FROM amounts
+        WHERE ReadingID IS NOT NULL AND SurchargeID IS NOT NULL
+        ON CONFLICT(ReadingID, SurchargeID, BillingMonth) DO UPDATE SET SurchargeAmount = excluded.SurchargeAmount
+    """, [billing_month, *surcharge_types])
+
+    rates = get_rate_index(conn)
+    conn.execute("""
+        INSERT INTO SurchargeGSTDuty (ReadingID, TotalSurcharge, GSTID, ElectricDutyID, GSTAmount, ElectricDutyAmount)
+        SELECT t.ReadingID, t.TotalSurcharge, ?, ?, t.TotalSurcharge * ? / 100, t.TotalSurcharge * ? / 100
+        FROM (SELECT ReadingID, SUM(SurchargeAmount) AS TotalSurcharge
+              FROM ReadingSurchargeMapping WHERE BillingMonth = ? GROUP BY ReadingID) t
+        WHERE true
+        ON CONFLICT(ReadingID) DO UPDATE SET
+            TotalSurcharge = excluded.TotalSurcharge, GSTID = excluded.GSTID, ElectricDutyID = excluded.ElectricDutyID,
+            GSTAmount = excluded.GSTAmount, ElectricDutyAmount = excluded.ElectricDutyAmount
+    """, (rates.gst.row_id(billing_month), rates.electric_duty.row_id(billing_month),
+          rates.gst.rate(billing_month), rates.electric_duty.rate(billing_month), billing_month))
+
+
+# populate_month_surcharges in its own transaction, with the (db, ...) signature of the write helpers
+# so the app can queue it on its WriteQueue
+def record_month_surcharges(db, billing_month, surcharge_types):
+    with db.transaction() as conn:
+        populate_month_surcharges(conn, billing_month, surcharge_types)
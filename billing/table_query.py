@@ -0,0 +1,92 @@
+# Description: Server-side table views. Filters, ordering and LIMIT/OFFSET are pushed into SQL
+# so report pages read only the rows they display.
+import pandas as pd
+
+from .search_index import fts_table, has_search_index, match_query
+
+# Supported filters per table: filter name -> SQL condition with one placeholder
+TABLE_FILTERS = {
+    "Users": {
+        "PersonID": "PersonID = ?",
+        "FlatNo": "FlatNo = ?",
+        "Name": "Name LIKE ?",
+    },
+    "BillingReadings": {
+        "FlatNo": "FlatNo = ?",
+        "BillingMonth": "BillingMonth = ?",
+    },
+    "BillingCharges": {
+        "FlatNo": "ReadingID IN (SELECT ReadingID FROM BillingReadings WHERE FlatNo = ?)",
+        "BillingMonth": "ReadingID IN (SELECT ReadingID FROM BillingReadings WHERE BillingMonth = ?)",
+    },
+    "ConsumptionHistory": {
+        "PersonID": "PersonID = ?",
+        "FlatNo": "FlatNo = ?",
+        "BillingMonth": "BillingMonth = ?",
+    },
+}
+
+# Filters matched as case-insensitive "contains"
+LIKE_FILTERS = {"Name"}
+
+
+# Column names of a table; also serves as the whitelist for table and column identifiers
+def table_columns(conn, table_name):
+    columns = [row[1] for row in conn.execute("SELECT * FROM pragma_table_info(?)", (table_name,))]
+    if not columns:
+        raise ValueError(f"Unknown table: {table_name}")
+    return columns
+
+
+# FROM/WHERE clause and parameters for the given filters and free-text search. Tables with
+# an FTS5 shadow index are searched through it; others fall back to LIKE over every column.
+def build_where(conn, table_name, filters=None, search=None):
+    clauses, params = [], []
+    source = f'"{table_name}"'
+    allowed = TABLE_FILTERS.get(table_name, {})
+    for name, value in (filters or {}).items():
+        if value in (None, ""):
+            continue
+        if name not in allowed:
+            raise ValueError(f"Unsupported filter {name} for {table_name}")
+        clauses.append(f'"{table_name}".' + allowed[name])
+        params.append(f"%{value}%" if name in LIKE_FILTERS else value)
+
+    if search and has_search_index(conn, table_name):
+        fts = fts_table(table_name)
+        source += f' JOIN "{fts}" ON "{fts}".rowid = "{table_name}".rowid'
+        clauses.append(f'"{fts}" MATCH ?')
+        params.append(match_query(search))
+    elif search:
+        columns = table_columns(conn, table_name)
+        clauses.append("(" + " OR ".join(f'CAST("{c}" AS TEXT) LIKE ?' for c in columns) + ")")
+        params.extend([f"%{search}%"] * len(columns))
+
+    return source + (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def count_rows(conn, table_name, filters=None, search=None):
+    table_columns(conn, table_name)
+    source, params = build_where(conn, table_name, filters, search)
+    return conn.execute(f"SELECT COUNT(*) FROM {source}", params).fetchone()[0]
+
+
+# One page of a table (1-based page number). page_size=None returns every matching row.
+# Full-text searches without an explicit order come back best match first.
+def fetch_page(conn, table_name, filters=None, search=None, order_by=None, descending=False,
+               page=1, page_size=50):
+    columns = table_columns(conn, table_name)
+    source, params = build_where(conn, table_name, filters, search)
+
+    query = f'SELECT "{table_name}".* FROM {source}'
+    if order_by:
+        if order_by not in columns:
+            raise ValueError(f"Unknown column {order_by} for {table_name}")
+        query += f' ORDER BY "{table_name}"."{order_by}" {"DESC" if descending else "ASC"}'
+    elif search and has_search_index(conn, table_name):
+        query += f' ORDER BY "{fts_table(table_name)}".rank'
+    if page_size:
+        query += " LIMIT ? OFFSET ?"
+        params = params + [page_size, (max(page, 1) - 1) * page_size]
+
+    return pd.read_sql_query(query, conn, params=params)
@@ -0,0 +1,139 @@
+# Description: In-memory TariffSlabs index. Slabs are loaded once per database, grouped by
+# RateEffectiveDate into sorted boundary arrays, and rates are resolved with searchsorted. The
+# cached index is checked against the table whenever the database may have changed.
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+SLAB_COLUMNS = ["MinUnits", "MaxUnits", "RatePerUnit", "RateEffectiveDate"]
+SLABS_QUERY = f"SELECT {', '.join(SLAB_COLUMNS)} FROM TariffSlabs ORDER BY SlabID"
+
+
+# Normalise effective dates ("1-10-2024", "10/06/2024", "2024-10-01", stray newlines) to YYYY-MM-DD
+def normalize_effective_date(value):
+    text = str(value).strip()
+    dayfirst = len(re.split(r"[-/]", text)[0]) <= 2
+    parsed = pd.to_datetime(text, dayfirst=dayfirst, errors="coerce")
+    return text if pd.isna(parsed) else parsed.strftime("%Y-%m-%d")
+
+
+# Billing month (YYYY-MM) a surcharge EffectiveMonth ("01/01/2025", "2025-01", "2025-01-01") takes effect in
+def normalize_effective_month(value):
+    return None if value is None else normalize_effective_date(value)[:7]
+
+
+# As-of dates (YYYY-MM or YYYY-MM-DD) as YYYY-MM-DD text, comparable with normalised effective
+# dates. A billing month is resolved at its first day, the meter reading date printed on its bill;
+# tariff slabs, GST, Electric Duty and the taxes on surcharges all follow this.
+def as_of_dates(as_of):
+    as_of = np.atleast_1d(np.asarray(as_of, dtype=str))
+    return np.char.add(as_of, np.where(np.char.str_len(as_of) == 7, "-01", ""))
+
+
+class TariffSchedule:
+    # Slab i covers [MinUnits_i, MinUnits_i+1); the top slab runs up to its MaxUnits, or is
+    # open-ended (the 701+ slab) when MaxUnits is NULL, 0 or not above its MinUnits, since
+    # MaxUnits is NOT NULL in the schema.
+    def __init__(self, effective_date, slabs):
+        slabs = slabs.sort_values("MinUnits")
+        self.effective_date = effective_date
+        self.mins = slabs["MinUnits"].to_numpy(dtype=float)
+        self.rates = slabs["RatePerUnit"].to_numpy(dtype=float)
+        top = pd.to_numeric(slabs["MaxUnits"], errors="coerce").iloc[-1]
+        self.ceiling = np.inf if pd.isna(top) or top <= self.mins[-1] else float(top)
+
+    # Units above the ceiling fall in the top slab and are rated 0, like units below the first slab
+    def rate(self, units):
+        units = np.asarray(units, dtype=float)
+        idx = np.searchsorted(self.mins, units, side="right") - 1
+        safe = np.clip(idx, 0, len(self.mins) - 1)
+        matched = (idx >= 0) & ~((idx == len(self.mins) - 1) & (units > self.ceiling))
+        return np.where(matched, self.rates[safe], 0.0)
+
+
+class TariffIndex:
+    def __init__(self, slabs):
+        slabs = slabs.dropna(subset=["MinUnits", "RatePerUnit"]).copy()
+        slabs["RateEffectiveDate"] = slabs["RateEffectiveDate"].map(normalize_effective_date)
+        self.schedules = [TariffSchedule(date, group)
+                          for date, group in sorted(slabs.groupby("RateEffectiveDate"), key=lambda g: g[0])]
+        self.effective_dates = np.array([s.effective_date for s in self.schedules])
+
+    @classmethod
+    def load(cls, conn):
+        return cls(pd.read_sql_query(SLABS_QUERY, conn))
+
+    # Schedule in force for each as-of date (YYYY-MM or YYYY-MM-DD). Dates before the first
+    # schedule fall back to the earliest one; no date means the latest schedule.
+    def _schedule_positions(self, as_of):
+        if as_of is None:
+            return np.full(1, len(self.schedules) - 1)
+        return np.clip(np.searchsorted(self.effective_dates, as_of_dates(as_of), side="right") - 1, 0, None)
+
+    # RatePerUnit for a scalar or an array of units. `as_of` is a single date or an array
+    # of dates aligned with `units`.
+    def rate(self, units, as_of=None):
+        scalar = np.ndim(units) == 0
+        units = np.atleast_1d(np.asarray(units, dtype=float))
+        if not self.schedules:
+            rates = np.zeros_like(units)
+        else:
+            positions = self._schedule_positions(as_of)
+            if len(positions) == 1:
+                rates = self.schedules[positions[0]].rate(units)
+            else:
+                rates = np.empty_like(units)
+                for position in np.unique(positions):
+                    mask = positions == position
+                    rates[mask] = self.schedules[position].rate(units[mask])
+        return float(rates[0]) if scalar else rates
+
+
+class _CachedIndex:
+    def __init__(self, rows):
+        self.rows = rows
+        self.index = TariffIndex(pd.DataFrame(rows, columns=SLAB_COLUMNS))
+        # id(connection) -> _connection_state when it last found the rows unchanged
+        self.checked = {}
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _database_key(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2] or id(conn)
+
+
+# Changes whenever anything may have been committed since: data_version moves with commits of any
+# other connection or process, total_changes with this connection's own writes
+def _connection_state(conn):
+    return conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes
+
+
+# Cached index for the connection's database, loaded on first use. Once the database may have changed
+# (for this connection), the slab rows, a handful, are read again and the index is rebuilt if they differ.
+def get_tariff_index(conn):
+    key, state = _database_key(conn), _connection_state(conn)
+    cached = _indexes.get(key)
+    if cached is not None and cached.checked.get(id(conn)) == state:
+        return cached.index
+    rows = conn.execute(SLABS_QUERY).fetchall()
+    with _lock:
+        cached = _indexes.get(key)
+        if cached is None or cached.rows != rows:
+            cached = _indexes[key] = _CachedIndex(rows)
+        cached.checked[id(conn)] = state
+    return cached.index
+
+
+# Drop cached indexes so the next lookup loads the slabs again
+def invalidate_tariff_index(conn=None):
+    with _lock:
+        if conn is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(_database_key(conn), None)
@@ -0,0 +1,232 @@
+# Description: Tariff what-if simulator. Billing history (live and archived months) is read once into
+# NumPy arrays sorted by month; each scenario, a candidate TariffSlabs table and/or Surcharge schedule,
+# re-prices every bill one month slice at a time and is compared with the same bills priced under the
+# current tables.
+# Electric Duty and GST are percentages of the variable charges, so each bill's are charged again, at
+# the rates it was charged at (ElectricDutyRate, GSTRate), on its re-priced variable charges.
+# Nothing is written to the database.
+import numpy as np
+import pandas as pd
+
+from .money import charged_rate
+from .rate_index import RateIndex, SurchargeRates
+from .tariff import SLAB_COLUMNS, TariffIndex
+
+# Units billed, the recorded payable amount, the GST and Electric Duty rates charged on the variable
+# charges, and the tax charged on each bill's surcharge (GST plus Electric Duty as a fraction of the surcharge)
+HISTORY_QUERY = """
+    SELECT br.ReadingID, br.FlatNo, br.BillingMonth,
+           ABS(br.PresentReading - br.PreviousReading) + COALESCE(br.UnitsAdjusted, 0) AS Units,
+           bc.PayableAmount, bc.ElectricDutyRate, bc.GSTRate,
+           COALESCE((gd.GSTAmount + gd.ElectricDutyAmount) / NULLIF(gd.TotalSurcharge, 0), 0) AS SurchargeTax
+    FROM BillingReadings br
+    JOIN BillingCharges bc ON bc.ReadingID = br.ReadingID
+    LEFT JOIN SurchargeGSTDuty gd ON gd.ReadingID = br.ReadingID
+"""
+
+# Surcharge types charged on each bill
+APPLIED_QUERY = """
+    SELECT DISTINCT m.ReadingID, st.TypeName
+    FROM ReadingSurchargeMapping m
+    JOIN Surcharge s ON s.SurchargeID = m.SurchargeID
+    JOIN SurchargeType st ON st.SurchargeTypeID = s.SurchargeTypeID
+"""
+
+HISTORY_COLUMNS = ["ReadingID", "FlatNo", "BillingMonth", "Units", "PayableAmount", "ElectricDutyRate", "GSTRate",
+                   "SurchargeTax"]
+SUMMARY_COLUMNS = ["Scenario", "Bills", "RecordedRevenue", "ScenarioRevenue", "Delta", "DeltaPct",
+                   "FlatsPayingMore", "FlatsPayingLess", "MaxFlatIncrease"]
+
+
+# Archived BillingCharges rows with ElectricDutyRate and GSTRate. Months archived before the rates
+# were recorded get the rates their amounts come to (money.charged_rate), as the migration back-fills them.
+def _archived_tax_rates(charges, readings, rates):
+    if {"ElectricDutyRate", "GSTRate"} <= set(charges.columns):
+        return charges
+    months = charges["ReadingID"].map(readings.set_index("ReadingID")["BillingMonth"]).to_numpy(dtype=str)
+    variable = charges["VariableCharges"].fillna(0).to_numpy(dtype=float)
+    return charges.assign(
+        ElectricDutyRate=charged_rate(charges["ElectricDuty"].fillna(0).to_numpy(dtype=float), variable,
+                                      rates.electric_duty.rate(months)),
+        GSTRate=charged_rate(charges["GST"].fillna(0).to_numpy(dtype=float), variable, rates.gst.rate(months)))
+
+
+# Bills from archived months, shaped like HISTORY_QUERY and APPLIED_QUERY rows
+def _archived_history(conn, surcharge_types, rates):
+    from .archive import iter_archived_batches
+
+    def frame(table_name):
+        batches = [batch.to_pandas() for batch in iter_archived_batches(conn, table_name)]
+        return pd.concat(batches, ignore_index=True) if batches else None
+
+    readings = frame("BillingReadings")
+    if readings is None:
+        return None, None
+    charges = _archived_tax_rates(frame("BillingCharges"), readings, rates)
+    bills = readings.merge(charges[["ReadingID", "PayableAmount", "ElectricDutyRate", "GSTRate"]], on="ReadingID")
+    bills["Units"] = (bills["PresentReading"] - bills["PreviousReading"]).abs() + bills["UnitsAdjusted"].fillna(0)
+    bills["SurchargeTax"] = 0.0
+    taxes = frame("SurchargeGSTDuty")
+    if taxes is not None:
+        taxes = taxes[taxes["TotalSurcharge"] > 0]
+        tax = (taxes["GSTAmount"] + taxes["ElectricDutyAmount"]) / taxes["TotalSurcharge"]
+        bills["SurchargeTax"] = bills["ReadingID"].map(pd.Series(tax.to_numpy(), index=taxes["ReadingID"])).fillna(0.0)
+    mapping = frame("ReadingSurchargeMapping")
+    applied = None
+    if mapping is not None:
+        applied = mapping.merge(surcharge_types, on="SurchargeID")[["ReadingID", "TypeName"]].drop_duplicates()
+    return bills[HISTORY_COLUMNS], applied
+
+
+# GST plus Electric Duty of each bill as a fraction of its variable charges: the rates it was charged
+# at, the rates in force for its month where none is recorded
+def bill_tax(bills, rates):
+    months = bills["BillingMonth"].to_numpy(dtype=str)
+    duty = bills["ElectricDutyRate"].astype(float).fillna(pd.Series(rates.electric_duty.rate(months), index=bills.index))
+    gst = bills["GSTRate"].astype(float).fillna(pd.Series(rates.gst.rate(months), index=bills.index))
+    return ((duty + gst) / 100).to_numpy()
+
+
+class BillingHistory:
+    def __init__(self, bills, applied, tariff, surcharges):
+        bills = bills.sort_values(["BillingMonth", "FlatNo"], ignore_index=True)
+        self.flat_codes, self.flats = pd.factorize(bills["FlatNo"], sort=True)
+        self.month_codes, self.months = pd.factorize(bills["BillingMonth"], sort=True)
+        # Bills are sorted by month, so each month is one contiguous slice
+        self.month_bounds = np.searchsorted(self.month_codes, np.arange(len(self.months) + 1))
+        self.units = bills["Units"].to_numpy(dtype=float)
+        self.recorded = bills["PayableAmount"].fillna(0).to_numpy(dtype=float)
+        self.surcharge_tax = bills["SurchargeTax"].to_numpy(dtype=float)
+        self.bill_tax = bills["BillTax"].to_numpy(dtype=float)
+        # Surcharge type -> which bills carry it
+        positions = pd.Series(np.arange(len(bills)), index=bills["ReadingID"])
+        self.applied = {}
+        for type_name, group in applied.groupby("TypeName"):
+            mask = np.zeros(len(bills), dtype=bool)
+            mask[positions.reindex(group["ReadingID"]).dropna().to_numpy(dtype=int)] = True
+            self.applied[type_name] = mask
+        self.tariff = tariff
+        self.surcharges = surcharges
+        self._baseline = None
+
+    # Every billed month between first_month and last_month (YYYY-MM, inclusive), archived
+    # months included, with the tariff, surcharge, GST and Electric Duty tables in force today
+    @classmethod
+    def load(cls, conn, first_month=None, last_month=None, include_archive=True):
+        bills = pd.read_sql_query(HISTORY_QUERY, conn)
+        applied = pd.read_sql_query(APPLIED_QUERY, conn)
+        rates = RateIndex.load(conn)
+        if include_archive:
+            surcharge_types = pd.read_sql_query(
+                "SELECT s.SurchargeID, st.TypeName FROM Surcharge s "
+                "JOIN SurchargeType st ON st.SurchargeTypeID = s.SurchargeTypeID", conn)
+            archived_bills, archived_applied = _archived_history(conn, surcharge_types, rates)
+            if archived_bills is not None:
+                bills = pd.concat([archived_bills, bills], ignore_index=True)
+            if archived_applied is not None:
+                applied = pd.concat([archived_applied, applied], ignore_index=True)
+        in_range = pd.Series(True, index=bills.index)
+        if first_month:
+            in_range &= bills["BillingMonth"] >= first_month
+        if last_month:
+            in_range &= bills["BillingMonth"] <= last_month
+        bills = bills[in_range]
+        return cls(bills.assign(BillTax=bill_tax(bills, rates)), applied, TariffIndex.load(conn), rates.surcharges)
+
+    def __len__(self):
+        return len(self.units)
+
+    def _month_slices(self):
+        for month, start, stop in zip(self.months, self.month_bounds[:-1], self.month_bounds[1:]):
+            yield month, slice(start, stop)
+
+    # Variable charges with the GST and Electric Duty charged on them
+    def variable_charges(self, tariff):
+        amounts = np.empty_like(self.units)
+        for month, bills in self._month_slices():
+            units = self.units[bills]
+            amounts[bills] = units * tariff.rate(units, month) * (1 + self.bill_tax[bills])
+        return amounts
+
+    # Surcharges of the types each bill carries, with the GST and Electric Duty charged on them
+    def surcharge_charges(self, surcharges):
+        amounts = np.zeros_like(self.units)
+        for month, bills in self._month_slices():
+            units, month_amounts = self.units[bills], amounts[bills]
+            for type_name, applied in self.applied.items():
+                mask = applied[bills]
+                if mask.any():
+                    surcharge = surcharges.amounts(type_name, units[mask], month)
+                    month_amounts[mask] += surcharge * (1 + self.surcharge_tax[bills][mask])
+        return amounts
+
+    # Tariff-dependent part of every bill: taxed variable charges plus taxed surcharges. A part the
+    # scenario doesn't replace reuses today's pricing, computed once.
+    def price(self, tariff=None, surcharges=None):
+        if self._baseline is None:
+            self._baseline = (self.variable_charges(self.tariff), self.surcharge_charges(self.surcharges))
+        variable, surcharge = self._baseline
+        if tariff is not None:
+            variable = self.variable_charges(tariff)
+        if surcharges is not None:
+            surcharge = self.surcharge_charges(surcharges)
+        return variable + surcharge
+
+
+# A candidate slab table. Without RateEffectiveDate the slabs apply to every month.
+def tariff_from_slabs(slabs):
+    slabs = pd.DataFrame(slabs).reindex(columns=SLAB_COLUMNS)
+    slabs["RateEffectiveDate"] = slabs["RateEffectiveDate"].fillna("1970-01-01")
+    return TariffIndex(slabs)
+
+
+# Current slabs with every rate multiplied by `factor`
+def scaled_slabs(conn, factor):
+    slabs = pd.read_sql_query(f"SELECT {', '.join(SLAB_COLUMNS)} FROM TariffSlabs", conn)
+    return slabs.assign(RatePerUnit=slabs["RatePerUnit"] * factor)
+
+
+def _totals(codes, labels, values, count):
+    return pd.Series(np.bincount(codes, weights=values, minlength=count), index=labels)
+
+
+# Re-price the history under each scenario: {name: {"slabs": ..., "surcharges": ...}}, either
+# part optional (missing means today's table). Returns {"summary", "by_month", "by_flat"}
+# DataFrames; ScenarioRevenue is the recorded revenue plus the re-pricing delta.
+def simulate(history, scenarios):
+    baseline = history.price()
+    month_count, flat_count = len(history.months), len(history.flats)
+    recorded_by_month = _totals(history.month_codes, history.months, history.recorded, month_count)
+    recorded_by_flat = _totals(history.flat_codes, history.flats, history.recorded, flat_count)
+    bills_by_month = pd.Series(np.bincount(history.month_codes, minlength=month_count), index=history.months)
+
+    summary, by_month, by_flat = [], [], []
+    for name, scenario in scenarios.items():
+        tariff = tariff_from_slabs(scenario["slabs"]) if scenario.get("slabs") is not None else None
+        surcharges = (SurchargeRates(scenario["surcharges"])
+                      if scenario.get("surcharges") is not None else None)
+        delta = history.price(tariff, surcharges) - baseline
+
+        month_delta = _totals(history.month_codes, history.months, delta, month_count)
+        flat_delta = _totals(history.flat_codes, history.flats, delta, flat_count)
+        by_month.append(pd.DataFrame({
+            "Scenario": name, "BillingMonth": history.months, "Bills": bills_by_month.to_numpy(),
+            "RecordedRevenue": recorded_by_month.to_numpy(),
+            "ScenarioRevenue": (recorded_by_month + month_delta).to_numpy(), "Delta": month_delta.to_numpy()}))
+        by_flat.append(pd.DataFrame({
+            "Scenario": name, "FlatNo": history.flats, "RecordedTotal": recorded_by_flat.to_numpy(),
+            "ScenarioTotal": (recorded_by_flat + flat_delta).to_numpy(), "Delta": flat_delta.to_numpy()}))
+        recorded, total_delta = float(history.recorded.sum()), float(delta.sum())
+        summary.append({
+            "Scenario": name, "Bills": len(history), "RecordedRevenue": recorded,
+            "ScenarioRevenue": recorded + total_delta, "Delta": total_delta,
+            "DeltaPct": total_delta / recorded * 100 if recorded else 0.0,
+            "FlatsPayingMore": int((flat_delta > 0.005).sum()), "FlatsPayingLess": int((flat_delta < -0.005).sum()),
+            "MaxFlatIncrease": float(flat_delta.max()) if flat_count else 0.0,
+        })
+
+    return {
+        "summary": pd.DataFrame(summary, columns=SUMMARY_COLUMNS),
+        "by_month": pd.concat(by_month, ignore_index=True) if by_month else pd.DataFrame(),
+        "by_flat": pd.concat(by_flat, ignore_index=True) if by_flat else pd.DataFrame(),
+    }
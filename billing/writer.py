@@ -0,0 +1,139 @@
+# Description: Single-writer queue for interactive writes. Sessions hand write helpers (insert_bill,
+# update_user, upsert_gst_rate, ...) to one writer thread that owns a pooled connection. Whatever is
+# queued when the thread is free runs in one transaction, so a burst of saves shares a single commit
+# instead of every session racing for SQLite's write lock. Each request runs under its own savepoint:
+# a failing request is rolled back alone and its exception is raised to the caller that queued it.
+# Every app write goes through the queue: the pages' saves, readings imports, archiving, month
+# surcharges and the background jobs' Jobs rows. Other processes (the CLI, benchmarks) write with
+# db.transaction() directly and meet the queue at SQLite's write lock, which it retries while busy.
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from .profiling import timed
+
+MAX_BATCH = 32  # requests per commit
+BUSY_RETRIES = 5
+BUSY_BACKOFF = 0.05  # seconds before the first retry, doubled for each further one
+
+_STOP = object()
+
+
+# Another process (a CLI import, a second app server) held the write lock past busy_timeout
+def is_busy_error(error):
+    return isinstance(error, sqlite3.OperationalError) and (
+        "database is locked" in str(error) or "database is busy" in str(error))
+
+
+class WriteQueue:
+    def __init__(self, db, max_batch=MAX_BATCH, retries=BUSY_RETRIES, backoff=BUSY_BACKOFF):
+        self.db = db
+        self.max_batch = max_batch
+        self.retries = retries
+        self.backoff = backoff
+        self.batches = 0
+        self.requests = 0
+        self.busy_retries = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()  # nothing can be queued behind _STOP
+        self._thread = threading.Thread(target=self._run, name="billing-writer", daemon=True)
+        self._thread.start()
+
+    # Queue func(db, *args, **kwargs), the call signature of the write helpers. Returns a Future
+    # resolved once the batch holding the request has committed.
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        if threading.current_thread() is self._thread:
+            # Queued from inside a request: run it in the open batch rather than wait on ourselves
+            try:
+                future.set_result(func(self.db, *args, **kwargs))
+            except Exception as error:
+                future.set_exception(error)
+            return future
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("WriteQueue is closed")
+            self._queue.put((func, args, kwargs, future))
+        return future
+
+    # Queue a write and wait for it: the drop-in replacement for calling the helper directly
+    @timed("writer.call")
+    def call(self, func, *args, **kwargs):
+        return self.submit(func, *args, **kwargs).result()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "busy_retries": self.busy_retries,
+            "queued": self._queue.qsize(),
+            "requests_per_commit": self.requests / self.batches if self.batches else 0.0,
+        }
+
+    # Finish what is queued, then stop the writer thread
+    def close(self):
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(_STOP)
+        self._thread.join()
+
+    # The writer keeps one connection checked out for its whole life; requests reach it through
+    # the pool's per-thread connection, so the helpers' own transactions join the batch's
+    def _run(self):
+        with self.db.connection():
+            stopping = False
+            while not stopping:
+                batch = [self._queue.get()]
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stopping = any(request is _STOP for request in batch)
+                batch = [request for request in batch if request is not _STOP]
+                if batch:
+                    self._commit(batch)
+
+    # Run a batch until it commits, retrying the whole batch while the database is busy, then
+    # hand each caller its result or exception
+    @timed("writer.batch")
+    def _commit(self, batch):
+        for attempt in range(self.retries + 1):
+            try:
+                outcomes = self._run_batch(batch)
+                break
+            except Exception as error:
+                if not is_busy_error(error) or attempt == self.retries:
+                    outcomes = [(None, error)] * len(batch)
+                    break
+                self.busy_retries += 1
+                time.sleep(self.backoff * 2 ** attempt)
+        self.batches += 1
+        self.requests += len(batch)
+        for (_, _, _, future), (result, error) in zip(batch, outcomes):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    # One transaction for the batch and a savepoint per request. A busy error from a request
+    # aborts the batch so it can be retried; any other error only undoes that request, along
+    # with the after_commit callbacks it registered.
+    def _run_batch(self, batch):
+        outcomes = []
+        with self.db.transaction():
+            for func, args, kwargs, _ in batch:
+                try:
+                    with self.db.savepoint("request"):
+                        result = func(self.db, *args, **kwargs)
+                except Exception as error:
+                    if is_busy_error(error):
+                        raise
+                    outcomes.append((None, error))
+                else:
+                    outcomes.append((result, None))
+        return outcomes
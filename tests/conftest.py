@@ -0,0 +1,32 @@
+# Description: Shared fixtures: a small synthetic colony (benchmarks/synthetic_data.py) generated once
+# per session, and a fresh copy of it opened the way the app opens it for each test.
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from billing.schema import open_database
+from synthetic_data import generate
+
+FLATS = 40
+MONTHS = 6  # 2023-01 to 2023-06
+
+
+@pytest.fixture(scope="session")
+def colony_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("colony") / "colony.db")
+    generate(path, flats=FLATS, months=MONTHS, start_month="2023-01", seed=7)
+    return path
+
+
+@pytest.fixture
+def db(colony_path, tmp_path):
+    path = str(tmp_path / "billing.db")
+    shutil.copyfile(colony_path, path)
+    db = open_database(path)
+    yield db
+    db.close()
@@ -0,0 +1,34 @@
+# Description: Trigger-maintained billing summaries and their upgrade to integer paisa revenue.
+from billing.aggregates import SUMMARY_TABLES, _trigger_statements, ensure_aggregates
+from billing.archive import archive_months
+
+LIVE_REVENUE_QUERY = """
+    SELECT br.BillingMonth, SUM(c.PayableAmountPaisa)
+    FROM BillingCharges c JOIN BillingReadings br ON br.ReadingID = c.ReadingID GROUP BY br.BillingMonth
+"""
+
+
+def _monthly(conn):
+    return {month: (bills, revenue, paisa) for month, bills, revenue, paisa in conn.execute(
+        "SELECT BillingMonth, Bills, Revenue, RevenuePaisa FROM MonthlyBillingSummary")}
+
+
+# Summaries from before RevenuePaisa are migrated in place: archived months keep their share and
+# live months sum their bills exactly
+def test_revenue_paisa_upgrade_keeps_archived_months(db, tmp_path):
+    archive_months(db, ["2023-01"], archive_dir=str(tmp_path / "archive"))
+    with db.transaction() as conn:
+        before = _monthly(conn)
+        for name in _trigger_statements():
+            conn.execute(f"DROP TRIGGER {name}")
+        for table_name in SUMMARY_TABLES:
+            conn.execute(f"ALTER TABLE {table_name} DROP COLUMN RevenuePaisa")
+        ensure_aggregates(conn)
+        after = _monthly(conn)
+        live = dict(conn.execute(LIVE_REVENUE_QUERY).fetchall())
+        flat_paisa = conn.execute("SELECT SUM(RevenuePaisa) FROM FlatBillingSummary").fetchone()[0]
+
+    assert after.keys() == before.keys() and "2023-01" in after
+    assert after["2023-01"] == before["2023-01"]
+    assert all(after[month][2] == paisa for month, paisa in live.items())
+    assert flat_paisa == sum(paisa for _, _, paisa in after.values())
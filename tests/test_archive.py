@@ -0,0 +1,51 @@
+# Description: Archiving closed months to Parquet and reading the history back.
+import pandas as pd
+
+from billing.archive import ARCHIVE_TABLES, archive_months, archived_months, read_history
+from conftest import FLATS, MONTHS
+
+FLAT = "Flat-0000003"
+MONTHS_ARCHIVED = ["2023-01", "2023-02"]
+
+
+def _history(db, archive_dir, table_name, filters=None):
+    with db.connection() as conn:
+        history = read_history(conn, table_name, filters, archive_dir=str(archive_dir))
+    return history.sort_values(list(history.columns[:1])).reset_index(drop=True)
+
+
+def _summary(db):
+    with db.connection() as conn:
+        return pd.read_sql_query("SELECT * FROM MonthlyBillingSummary ORDER BY BillingMonth", conn)
+
+
+# Archived months leave the live tables but read back unchanged, and keep their place in the summaries
+def test_archive_round_trip(db, tmp_path):
+    before = {table_name: _history(db, tmp_path, table_name) for table_name in ARCHIVE_TABLES}
+    summary = _summary(db)
+
+    assert archive_months(db, MONTHS_ARCHIVED, archive_dir=str(tmp_path)) == dict.fromkeys(MONTHS_ARCHIVED, FLATS)
+    assert archived_months("BillingCharges", str(tmp_path)) == MONTHS_ARCHIVED
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM BillingReadings WHERE BillingMonth IN (?, ?)",
+                            MONTHS_ARCHIVED).fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM BillingCharges").fetchone()[0] == FLATS * (MONTHS - 2)
+        assert conn.execute("SELECT COUNT(*) FROM ConsumptionHistory WHERE BillingMonth IN (?, ?)",
+                            MONTHS_ARCHIVED).fetchone()[0] == 0
+    for table_name, rows in before.items():
+        pd.testing.assert_frame_equal(_history(db, tmp_path, table_name), rows, check_dtype=False)
+    pd.testing.assert_frame_equal(_summary(db), summary)
+
+    # Archiving a month again keeps its archived rows
+    assert archive_months(db, MONTHS_ARCHIVED[:1], archive_dir=str(tmp_path)) == {MONTHS_ARCHIVED[0]: 0}
+    pd.testing.assert_frame_equal(_history(db, tmp_path, "BillingCharges"), before["BillingCharges"],
+                                  check_dtype=False)
+
+
+def test_history_filters_span_archive_and_live_rows(db, tmp_path):
+    archive_months(db, MONTHS_ARCHIVED, archive_dir=str(tmp_path))
+    charges = _history(db, tmp_path, "BillingCharges", {"FlatNo": FLAT})
+    assert sorted(charges["BillingMonth"]) == [f"2023-0{month}" for month in range(1, MONTHS + 1)]
+    assert (charges["FlatNo"] == FLAT).all()
+    readings = _history(db, tmp_path, "BillingReadings", {"FlatNo": FLAT, "BillingMonth": "2023-02"})
+    assert readings[["FlatNo", "BillingMonth"]].values.tolist() == [[FLAT, "2023-02"]]
@@ -0,0 +1,78 @@
+# Description: Month-end batch billing against the synthetic colony.
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from billing.batch_billing import run_billing_month
+from billing.crud import insert_bill
+from billing.money import CHARGE_COLUMNS
+from billing.schema import open_database
+
+MONTH = "2023-07"  # the month after the synthetic history; its rates took effect 2023-01-01
+GST_PERCENT, DUTY_PERCENT = 17.0, 1.5
+
+
+def _readings(db):
+    with db.connection() as conn:
+        readings = pd.read_sql_query(
+            "SELECT FlatNo, PresentReading + 150 AS PresentReading FROM BillingReadings WHERE BillingMonth = '2023-06'",
+            conn)
+    return readings
+
+
+def _month_charges(db):
+    with db.connection() as conn:
+        return pd.read_sql_query(f"""
+            SELECT br.FlatNo, br.PreviousReading, br.PresentReading, bc.RatePerUnit,
+                   {", ".join(f"bc.{column}" for column in CHARGE_COLUMNS)}, bc.Status
+            FROM BillingCharges bc JOIN BillingReadings br ON br.ReadingID = bc.ReadingID
+            WHERE br.BillingMonth = ? ORDER BY br.FlatNo
+        """, conn, params=(MONTH,))
+
+
+# GST and Electric Duty left out are charged at the month's rates on the variable charges
+def test_default_rates_are_percentages_of_variable_charges(db):
+    run_billing_month(db, MONTH, _readings(db))
+    with db.connection() as conn:
+        bills = pd.read_sql_query("""
+            SELECT bc.VariableCharges, bc.ElectricDuty, bc.GST, bc.NetAmount, bc.GSTPaisa
+            FROM BillingCharges bc JOIN BillingReadings br ON br.ReadingID = bc.ReadingID
+            WHERE br.BillingMonth = ?
+        """, conn, params=(MONTH,))
+
+    assert len(bills) and (bills["VariableCharges"] > 0).all()
+    np.testing.assert_allclose(bills["GST"], bills["VariableCharges"] * GST_PERCENT / 100, atol=0.005)
+    np.testing.assert_allclose(bills["ElectricDuty"], bills["VariableCharges"] * DUTY_PERCENT / 100, atol=0.005)
+    np.testing.assert_allclose(bills["NetAmount"], bills["VariableCharges"] + bills["ElectricDuty"] + bills["GST"],
+                               atol=1e-9)
+    assert (bills["GSTPaisa"] == np.round(bills["GST"] * 100)).all()
+
+
+# Rates given explicitly replace the month's, still as percentages
+def test_given_rates_are_percentages(db):
+    bills = run_billing_month(db, MONTH, _readings(db), electric_duty=2.5, gst=10.0)
+    np.testing.assert_allclose(bills["GST"], bills["VariableCharges"] * 10.0 / 100, atol=0.005)
+    np.testing.assert_allclose(bills["ElectricDuty"], bills["VariableCharges"] * 2.5 / 100, atol=0.005)
+
+
+# The batch engine bills a month exactly as insert_bill bills each reading, with the month's rates or given ones
+def test_batch_matches_insert_bill(db, colony_path, tmp_path):
+    shutil.copyfile(colony_path, tmp_path / "single.db")
+    single = open_database(str(tmp_path / "single.db"))
+    try:
+        readings = _readings(db)
+        with single.connection() as conn:
+            people = dict(conn.execute("SELECT FlatNo, MIN(PersonID) FROM Users GROUP BY FlatNo").fetchall())
+        half = len(readings) // 2
+        run_billing_month(db, MONTH, readings[:half])
+        run_billing_month(db, MONTH, readings[half:], electric_duty=2.5, gst=10.0)
+        for i, (flat_no, present_reading) in enumerate(readings.itertuples(index=False)):
+            duty, gst = (None, None) if i < half else (2.5, 10.0)
+            insert_bill(single, people[flat_no], flat_no, MONTH, present_reading, duty, gst, 0.0, 0.0)
+
+        batch = _month_charges(db)
+        assert len(batch) == len(readings) and (batch["GST"] > 0).all()
+        pd.testing.assert_frame_equal(batch, _month_charges(single))
+    finally:
+        single.close()
@@ -0,0 +1,38 @@
+# Description: The benchmark suite and the page renders of the startup benchmark, run as tests.
+# Every benchmark runs once on the small colony so a broken one fails here. The timings are only
+# compared with benchmarks/baselines.json when BILLING_BENCHMARKS=1 is set, since that needs the
+# baseline's scale and a quiet machine:
+#     BILLING_BENCHMARKS=1 python -m pytest tests/test_benchmarks.py
+# Query plans are checked in test_query_plans.py.
+import os
+import shutil
+
+import pytest
+
+import bench_import
+import bench_suite
+from bench_startup import page_render_seconds
+from conftest import FLATS, MONTHS
+
+
+# Every page of the sidebar menu renders against the colony without raising
+def test_every_page_renders(colony_path, tmp_path):
+    shutil.copyfile(colony_path, tmp_path / "billing_system.db")
+    pages = page_render_seconds(cwd=tmp_path)
+    assert "📊 Billing Management / Generate Bill" in pages
+    assert len(pages) >= 20
+
+
+def test_every_benchmark_runs(tmp_path):
+    assert bench_suite.main(["--flats", str(FLATS), "--months", str(MONTHS), "--rounds", "1",
+                             "--baseline", str(tmp_path / "baselines.json")]) == 0
+
+
+# The import benchmark asserts that the bills it imports come to a non-zero total
+def test_import_benchmark_runs():
+    bench_import.main(["--rows", "400", "--flats", str(FLATS)])
+
+
+@pytest.mark.skipif(not os.environ.get("BILLING_BENCHMARKS"), reason="set BILLING_BENCHMARKS=1 to compare with baselines")
+def test_no_regression_against_baselines():
+    assert bench_suite.main([]) == 0
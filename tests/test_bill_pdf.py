@@ -0,0 +1,35 @@
+# Description: Bulk bill PDFs: every bill of a month drawn onto one reportlab document.
+import re
+
+import pytest
+
+from billing.bill_pdf import BULK_BILLS_QUERY, render_bulk_bills
+
+MONTH = "2023-03"
+
+
+# Read back by pypdf, a parser independent of the renderer: one page per bill, in flat order
+# across chunk boundaries
+def test_chunks_make_one_document(db):
+    pypdf = pytest.importorskip("pypdf")
+    with db.connection() as conn:
+        flats = [row[0] for row in conn.execute(BULK_BILLS_QUERY, (MONTH,))]
+        out = render_bulk_bills(conn, MONTH, chunk_size=7, spool_size=1)
+    reader = pypdf.PdfReader(out)
+
+    assert len(reader.pages) == len(flats)
+    assert [re.search(r"Flat-\d+", page.extract_text()).group(0) for page in reader.pages] == flats
+
+
+# The static layer is drawn once for the whole month and shared by every page
+def test_static_layer_is_shared(db):
+    with db.connection() as conn:
+        pages = conn.execute("SELECT COUNT(*) FROM BillingReadings WHERE BillingMonth = ?", (MONTH,)).fetchone()[0]
+        data = render_bulk_bills(conn, MONTH, chunk_size=7).read()
+    assert data.count(b"/Subtype /Form") == 1
+    assert re.search(rb"/Count (\d+)", data).group(1) == b"%d" % pages
+
+
+def test_month_without_bills(db):
+    with db.connection() as conn:
+        assert render_bulk_bills(conn, "1999-01") is None
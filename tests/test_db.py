@@ -0,0 +1,45 @@
+# Description: The pooled connection layer and the record helpers built on it.
+import pytest
+
+from billing.crud import delete_bill, delete_user, insert_user
+
+READING_ROWS_QUERY = """
+    SELECT (SELECT COUNT(*) FROM BillingCharges WHERE ReadingID = ?1),
+           (SELECT COUNT(*) FROM ReadingSurchargeMapping WHERE ReadingID = ?1),
+           (SELECT COUNT(*) FROM SurchargeGSTDuty WHERE ReadingID = ?1)
+"""
+
+
+# Foreign keys stay unenforced: deleting a user keeps the flat's history, and a user may name a
+# flat that isn't in Flats yet, as before the pool
+def test_user_writes_are_not_constrained(db):
+    with db.connection() as conn:
+        person_id, history = conn.execute("""
+            SELECT PersonID, COUNT(*) FROM ConsumptionHistory GROUP BY PersonID LIMIT 1
+        """).fetchone()
+    delete_user(db, person_id)
+    insert_user(db, 999999, "New Tenant", "Flat-Unlisted", "Residential", 2.0, "1-Phase")
+    with db.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM ConsumptionHistory WHERE PersonID = ?",
+                            (person_id,)).fetchone()[0] == history
+        assert conn.execute("SELECT FlatNo FROM Users WHERE PersonID = 999999").fetchone() == ("Flat-Unlisted",)
+
+
+# Deleting a bill removes the rows recorded for its reading along with it
+def test_delete_bill_removes_reading_rows(db):
+    with db.connection() as conn:
+        reading_id, flat_no, month = conn.execute("""
+            SELECT br.ReadingID, br.FlatNo, br.BillingMonth FROM BillingReadings br
+            JOIN SurchargeGSTDuty gd ON gd.ReadingID = br.ReadingID LIMIT 1
+        """).fetchone()
+        assert all(conn.execute(READING_ROWS_QUERY, (reading_id,)).fetchone())
+    assert delete_bill(db, flat_no, month)
+    with db.connection() as conn:
+        assert conn.execute(READING_ROWS_QUERY, (reading_id,)).fetchone() == (0, 0, 0)
+
+
+@pytest.mark.parametrize("name", ["journal_mode", "synchronous", "foreign_keys"])
+def test_pragmas(db, name):
+    expected = {"journal_mode": "wal", "synchronous": 1, "foreign_keys": 0}
+    with db.connection() as conn:
+        assert conn.execute(f"PRAGMA {name}").fetchone()[0] == expected[name]
@@ -0,0 +1,62 @@
+# Description: Background jobs: one active job per operation and month, recovery of jobs left by a
+# dead worker, and result files.
+import os
+import socket
+
+import pytest
+
+from billing.jobs import JobRunner, get_job, submit_job
+
+DEAD_WORKER = f"{socket.gethostname()}:99999999"
+
+
+def test_submit_dedupes_active_jobs(db):
+    job_id, created = submit_job(db, "bulk_pdf", "2023-06")
+    assert created
+    assert submit_job(db, "bulk_pdf", "2023-06") == (job_id, False)
+    assert submit_job(db, "bills_zip", "2023-06")[1] and submit_job(db, "bulk_pdf", "2023-05")[1]
+
+    with db.transaction() as conn:
+        conn.execute("UPDATE Jobs SET Status = 'Running' WHERE JobID = ?", (job_id,))
+    assert submit_job(db, "bulk_pdf", "2023-06") == (job_id, False)
+    with db.transaction() as conn:
+        conn.execute("UPDATE Jobs SET Status = 'Done' WHERE JobID = ?", (job_id,))
+    rerun, created = submit_job(db, "bulk_pdf", "2023-06")
+    assert created and rerun > job_id
+
+    with pytest.raises(ValueError):
+        submit_job(db, "unknown", "2023-06")
+
+
+# A job whose worker died is queued again and run; jobs of live or remote workers are left alone
+def test_recover_requeues_jobs_of_dead_workers(db, tmp_path):
+    workers = {"2099-01": DEAD_WORKER, "2099-02": f"{socket.gethostname()}:{os.getpid()}", "2099-03": "elsewhere:1"}
+    with db.transaction() as conn:
+        for month, worker in workers.items():
+            conn.execute("INSERT INTO Jobs (Operation, BillingMonth, Status, Done, Worker) VALUES ('bulk_pdf', ?, "
+                         "'Running', 5, ?)", (month, worker))
+    runner = JobRunner(db, jobs_dir=str(tmp_path / "jobs"))
+    runner.shutdown()
+
+    with db.connection() as conn:
+        jobs = dict(conn.execute("SELECT BillingMonth, JobID FROM Jobs"))
+    dead = get_job(db, jobs["2099-01"])
+    assert dead["Status"] == "Failed" and dead["Error"] == "No billing data found for 2099-01"
+    assert dead["Worker"] != DEAD_WORKER
+    for month in ("2099-02", "2099-03"):
+        job = get_job(db, jobs[month])
+        assert (job["Status"], job["Done"], job["Worker"]) == ("Running", 5, workers[month])
+
+
+# Only the newest result per operation and month stays on disk
+def test_rerun_replaces_the_result_file(db, tmp_path):
+    results = []
+    for _ in range(2):
+        runner = JobRunner(db, jobs_dir=str(tmp_path / "jobs"))
+        job_id, _ = runner.submit("bulk_pdf", "2023-06")
+        runner.shutdown()
+        job = get_job(db, job_id)
+        assert job["Status"] == "Done" and job["Done"] == job["Total"] > 0
+        results.append(job)
+    assert not os.path.exists(results[0]["ResultPath"]) and get_job(db, results[0]["JobID"])["ResultPath"] is None
+    assert os.listdir(tmp_path / "jobs") == [os.path.basename(results[1]["ResultPath"])]
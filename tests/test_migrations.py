@@ -0,0 +1,102 @@
+# Description: Startup migrations against a database shaped like the shipped billing_system.db.
+import sqlite3
+
+import pytest
+
+from billing.migrations import apply_money_columns, apply_tax_rate_columns
+from billing.schema import open_database
+
+# The shipped tables the migrations touch: BillingCharges has VariableCharges and NetPayableAmount
+# but none of ElectricDuty, GST, Surcharge, NetAmount or PayableAmount
+SHIPPED_SCHEMA = """
+CREATE TABLE Flats (FlatNo VARCHAR(50) PRIMARY KEY, Location VARCHAR(255));
+CREATE TABLE Users (
+  PersonID INTEGER PRIMARY KEY, Name VARCHAR(255), FlatNo VARCHAR(50) REFERENCES Flats(FlatNo) ON DELETE CASCADE,
+  UserType VARCHAR(20) DEFAULT 'Residential', LoadSanctioned FLOAT, Phase VARCHAR(10)
+);
+CREATE TABLE BillingReadings (
+  ReadingID INTEGER PRIMARY KEY AUTOINCREMENT,
+  FlatNo VARCHAR(50) REFERENCES Flats(FlatNo) ON DELETE CASCADE,
+  BillingMonth DATE DEFAULT (DATE('now', 'start of month')),
+  ReadingDate DATE DEFAULT (DATE('now')),
+  PreviousReading FLOAT DEFAULT 0.0 NOT NULL,
+  PresentReading FLOAT DEFAULT 0.0 NOT NULL,
+  UnitsConsumed FLOAT GENERATED ALWAYS AS (ABS(PresentReading - PreviousReading)) STORED,
+  UnitsAdjusted FLOAT DEFAULT 0,
+  CorrectionStatus VARCHAR(20) DEFAULT 'Original' CHECK (CorrectionStatus IN ('Original', 'Corrected'))
+);
+CREATE TABLE BillingCharges (
+  BillID INTEGER PRIMARY KEY AUTOINCREMENT,
+  ReadingID INTEGER REFERENCES BillingReadings(ReadingID) ON DELETE CASCADE,
+  RatePerUnit FLOAT,
+  VariableCharges FLOAT,
+  AdditionalChargeID INTEGER NOT NULL,
+  NetPayableAmount FLOAT DEFAULT 0,
+  BillGenerationDate DATE DEFAULT CURRENT_DATE,
+  Status VARCHAR(20) CHECK (Status IN ('Paid', 'Unpaid', 'Due')),
+  Remarks TEXT DEFAULT 'No remarks'
+);
+CREATE TABLE ConsumptionHistory (
+  ConsumptionID INTEGER PRIMARY KEY AUTOINCREMENT,
+  PersonID INTEGER REFERENCES Users(PersonID) ON DELETE CASCADE,
+  FlatNo VARCHAR(50) REFERENCES Flats(FlatNo) ON DELETE CASCADE,
+  BillingMonth DATE NOT NULL,
+  UnitsConsumed FLOAT,
+  RecordedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO Flats VALUES ('Flat-1', 'Block-B');
+INSERT INTO BillingReadings (FlatNo, BillingMonth, PresentReading) VALUES ('Flat-1', '2025-01', 131);
+INSERT INTO BillingCharges (ReadingID, RatePerUnit, VariableCharges, AdditionalChargeID, Status)
+VALUES (1, 7.2, 943.205, 1, 'Due');
+"""
+
+
+def _shipped_database(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(SHIPPED_SCHEMA)
+    conn.close()
+
+
+# Only rupee columns the table has get a paisa column, back-filled with to_paisa's rounding
+def test_money_columns_follow_existing_rupee_columns(tmp_path):
+    path = str(tmp_path / "shipped.db")
+    _shipped_database(path)
+    conn = sqlite3.connect(path)
+    assert apply_money_columns(conn) == ["VariableChargesPaisa"]
+    assert conn.execute("SELECT VariableChargesPaisa FROM BillingCharges").fetchone() == (94321,)
+    assert apply_money_columns(conn) == []
+    conn.close()
+
+
+# The apps open the shipped database, and open it again on the next start
+def test_open_shipped_database(tmp_path):
+    path = str(tmp_path / "shipped.db")
+    _shipped_database(path)
+    for _ in range(2):
+        db = open_database(path)
+        with db.connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM BillingCharges").fetchone() == (1,)
+        db.close()
+
+
+
+# Bills from before GST and Electric Duty became percentages keep their amounts; the rate columns get
+# the rate in force where it reproduces the amount, else the percentage the amount comes to
+def test_tax_rates_back_filled_from_stored_amounts(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "amounts.db"))
+    conn.executescript("""
+        CREATE TABLE GSTRates (GSTID INTEGER PRIMARY KEY, EffectiveDate DATE, GST FLOAT);
+        CREATE TABLE ElectricDutyRates (DutyID INTEGER PRIMARY KEY, EffectiveDate DATE, ElectricDuty FLOAT);
+        CREATE TABLE BillingReadings (ReadingID INTEGER PRIMARY KEY, FlatNo TEXT, BillingMonth DATE);
+        CREATE TABLE BillingCharges (BillID INTEGER PRIMARY KEY, ReadingID INTEGER, VariableCharges FLOAT,
+                                     ElectricDuty FLOAT, GST FLOAT);
+        INSERT INTO GSTRates VALUES (1, '2024-01-01', 17.0);
+        INSERT INTO ElectricDutyRates VALUES (1, '2024-01-01', 1.5);
+        INSERT INTO BillingReadings VALUES (1, 'Flat-1', '2024-03'), (2, 'Flat-2', '2024-03');
+        INSERT INTO BillingCharges VALUES (1, 1, 4510.5, 67.66, 766.79), (2, 2, 1000.0, 15.05, 14.35);
+    """)
+    assert apply_tax_rate_columns(conn) == ["ElectricDutyRate", "GSTRate"]
+    rows = conn.execute("SELECT ElectricDuty, GST, ElectricDutyRate, GSTRate FROM BillingCharges ORDER BY BillID")
+    assert rows.fetchall() == [(67.66, 766.79, 1.5, 17.0), (15.05, 14.35, pytest.approx(1.505), pytest.approx(1.435))]
+    assert apply_tax_rate_columns(conn) == []
+    conn.close()
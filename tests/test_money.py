@@ -0,0 +1,46 @@
+# Description: Integer-paisa money arithmetic.
+import numpy as np
+import pytest
+
+from billing.crud import insert_bill
+from billing.money import bill_lines, charged_rate, to_paisa
+
+
+def test_half_paisa_rounds_away_from_zero():
+    assert to_paisa(1.005) == 101
+    assert to_paisa([2.675, -2.675, 0.0049]).tolist() == [268, -268, 0]
+
+
+@pytest.mark.parametrize("rupees", [np.nan, np.inf, -np.inf, 1e17, [1.0, np.nan]])
+def test_unrepresentable_amounts_raise(rupees):
+    with pytest.raises(ValueError):
+        to_paisa(rupees)
+
+
+# Net and payable are exact sums of the rounded lines; taxes are percentages of the variable charges
+def test_bill_lines_sum_rounded_lines():
+    lines = bill_lines(123.4, 23.59, 1.5, 17.0, 2.675)
+    assert lines["VariableCharges"] == 291101
+    assert (lines["ElectricDuty"], lines["GST"], lines["Surcharge"]) == (4367, 49487, 268)
+    assert lines["NetAmount"] == lines["VariableCharges"] + lines["ElectricDuty"] + lines["GST"]
+    assert lines["PayableAmount"] == lines["NetAmount"] + lines["Surcharge"]
+
+
+# Duty and GST left out are the month's rates (1.5% and 17% in the colony); a missing surcharge is 0
+def test_insert_bill_without_duty_or_gst(db):
+    with db.connection() as conn:
+        person_id, flat_no = conn.execute("SELECT PersonID, FlatNo FROM Users LIMIT 1").fetchone()
+    bill = insert_bill(db, person_id, flat_no, "2023-07", 99999.0, None, None, 0.0, None)
+    with db.connection() as conn:
+        stored = conn.execute("SELECT ElectricDutyPaisa, GSTPaisa, SurchargePaisa FROM BillingCharges WHERE ReadingID = ?",
+                              (bill["ReadingID"],)).fetchone()
+    variable = to_paisa(bill["VariableCharges"])
+    assert variable > 0
+    assert stored == (to_paisa(variable * 1.5 / 10000), to_paisa(variable * 17.0 / 10000), 0)
+
+
+# A stored tax amount gives back the rate in force when that reproduces it, else its own ratio
+def test_charged_rate():
+    assert charged_rate(67.66, 4510.5, 1.5) == 1.5
+    assert charged_rate(0.0, 0.0, 17.0) == 17.0
+    np.testing.assert_allclose(charged_rate([45.11, 0.0], [4510.5, 100.0], 17.0), [1.0001, 0.0], atol=1e-4)
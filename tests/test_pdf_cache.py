@@ -0,0 +1,71 @@
+# Description: Content-addressed bill PDF cache: keys, reuse and least-recently-used eviction by size.
+import os
+from datetime import date
+
+from billing.pdf_cache import CACHE_DIR, BillCache, bill_key, get_bill_cache
+
+PDF = b"%PDF" + b"x" * 96  # 100 bytes
+
+
+def _fill(cache, count):
+    keys = [bill_key(("Flat-1", "2023-01", units)) for units in range(count)]
+    for age, key in enumerate(keys):
+        cache.put(key, PDF)
+        # Oldest first, a minute apart, so eviction order doesn't depend on the clock's resolution
+        os.utime(cache.path(key), (1000 + age * 60, 1000 + age * 60))
+    return keys
+
+
+def test_keys_follow_printed_values():
+    bill = ("Flat-1", 1001, "A Name", "2023-01", 10, 10.0)
+    assert bill_key(bill) == bill_key(list(bill))
+    assert bill_key(bill) != bill_key(bill[:-1] + (10,))
+
+
+# The "Bill Generated on" date is printed too: a bill cached yesterday is rendered again today
+def test_keys_follow_generation_date():
+    bill = ("Flat-1", 1001, "A Name", "2023-01", 10)
+    assert bill_key(bill) == bill_key(bill, date.today())
+    assert bill_key(bill, date(2024, 1, 1)) != bill_key(bill, date(2024, 1, 2))
+
+
+# The cache sits next to the database file, not in the working directory
+def test_cache_lives_next_to_database(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db_dir = tmp_path / "data"
+    cache = get_bill_cache(str(db_dir / "billing.db"))
+    assert cache.cache_dir == str(db_dir / CACHE_DIR) and os.path.isdir(cache.cache_dir)
+    assert get_bill_cache(str(db_dir / "billing.db")) is cache
+    assert not os.path.exists(tmp_path / CACHE_DIR)
+
+
+def test_get_or_render_renders_once(tmp_path):
+    cache, rendered = BillCache(str(tmp_path), max_bytes=10_000), []
+
+    def render(bill):
+        rendered.append(bill)
+        return PDF
+    path = cache.get_or_render(("Flat-1", 100.0), render)
+    assert cache.get_or_render(("Flat-1", 100.0), render) == path
+    cache.get_or_render(("Flat-1", 100.5), render)
+    assert len(rendered) == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["writes"], stats["entries"], stats["bytes"]) == (1, 2, 2, 2, 200)
+
+
+# Past the cap, least recently used files go until the cache is at 90% of it; a read counts as a use
+def test_eviction_by_size(tmp_path):
+    cache = BillCache(str(tmp_path), max_bytes=1000)
+    keys = _fill(cache, 10)
+    assert cache.stats()["evictions"] == 0
+    assert cache.get(keys[0])  # now the most recently used
+
+    cache.put(bill_key(("Flat-1", "2023-01", "new")), PDF)
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["evictions"]) == (9, 900, 2)
+    assert [key for key in keys if cache.get(key) is None] == keys[1:3]
+
+    # A new cache over the same folder counts what is on disk
+    assert BillCache(str(tmp_path), max_bytes=1000).stats()["bytes"] == 900
+    cache.clear()
+    assert (cache.stats()["entries"], cache.stats()["bytes"]) == (0, 0)
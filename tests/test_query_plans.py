@@ -0,0 +1,20 @@
+# Description: EXPLAIN QUERY PLAN regression checks for the hot billing queries.
+from billing.query_plans import find_full_scans, main
+
+READING_INDEXES = ["idx_billingreadings_flat_month", "idx_billingreadings_month_flat"]
+
+
+def test_hot_queries_use_indexes(db):
+    with db.connection() as conn:
+        assert find_full_scans(conn) == {}
+
+
+# The check runs against the database as it is: a dropped index fails it and stays dropped
+def test_dropped_index_fails_the_check(db, capsys):
+    with db.transaction() as conn:
+        for name in READING_INDEXES:
+            conn.execute(f"DROP INDEX {name}")
+    assert main(db.path) == 1
+    assert "previous reading: full table scan" in capsys.readouterr().out
+    with db.connection() as conn:
+        assert not conn.execute("SELECT 1 FROM sqlite_master WHERE name IN (?, ?)", READING_INDEXES).fetchone()
@@ -0,0 +1,87 @@
+# Description: As-of resolution of tariff slabs, GST, Electric Duty and surcharges: one convention
+# for a billing month, shared by the in-memory indexes and the SQL that records surcharges.
+import sqlite3
+
+import pandas as pd
+
+from billing.rate_index import SURCHARGE_QUERY, RateHistory, SurchargeRates, get_rate_index
+from billing.rates import upsert_gst_rate
+from billing.surcharges import get_surcharge_amounts, populate_month_surcharges
+from billing.tariff import TariffIndex
+
+# GST as the shipped gst_rates.csv has it: day-first dates, changing mid-month
+GST_ROWS = pd.DataFrame({"GSTID": [1, 2], "EffectiveDate": ["10/06/2024", "26/07/2024"], "GST": [14.35, 15.95]})
+
+
+# A month is resolved at its first day: a rate from 26 July applies from the August bill
+def test_month_resolves_at_its_first_day():
+    gst = RateHistory(GST_ROWS, "GSTID", "GST")
+    assert gst.rate("2024-06") == 0.0
+    assert gst.rate("2024-07") == 14.35
+    assert gst.rate("2024-08") == 15.95
+    assert gst.rate("2024-07-26") == 15.95
+    assert gst.row_id(["2024-07", "2024-08"]).tolist() == [1, 2]
+
+    tariff = TariffIndex(pd.DataFrame({"MinUnits": [0, 0], "MaxUnits": [None, None], "RatePerUnit": [10.0, 20.0],
+                                       "RateEffectiveDate": ["10/06/2024", "26/07/2024"]}))
+    assert tariff.rate([100, 100], ["2024-07", "2024-08"]).tolist() == [10.0, 20.0]
+
+
+def test_surcharge_without_effective_month_never_applies():
+    rows = pd.DataFrame({"SurchargeID": [1, 2], "TypeName": ["Fuel Charge"] * 2, "EffectiveMonth": [None, "2024-01"],
+                         "UnitsFrom": [None, None], "UnitsTo": [None, None], "RatePerUnit": [9.0, 0.5]})
+    bills, surcharge_ids, amounts = SurchargeRates(rows).matches("Fuel Charge", [100, 100], ["2023-12", "2024-02"])
+    assert bills.tolist() == [1] and surcharge_ids.tolist() == [2] and amounts.tolist() == [50.0]
+
+
+# Taxes recorded on surcharges follow the same months as batch billing: a rate effective
+# mid-March applies from April
+def test_recorded_surcharge_taxes_use_the_rate_in_force(db):
+    upsert_gst_rate(db, 20.0, "2023-03-15")
+    with db.transaction() as conn:
+        for month in ("2023-03", "2023-04"):
+            populate_month_surcharges(conn, month, ["Fuel Charge"])
+        recorded = pd.read_sql_query("""
+            SELECT br.BillingMonth, gd.TotalSurcharge, gd.GSTAmount FROM SurchargeGSTDuty gd
+            JOIN BillingReadings br ON br.ReadingID = gd.ReadingID
+            WHERE br.BillingMonth IN ('2023-03', '2023-04') AND br.FlatNo = 'Flat-0000001'
+        """, conn).set_index("BillingMonth")
+    assert abs(recorded.loc["2023-03", "GSTAmount"] - recorded.loc["2023-03", "TotalSurcharge"] * 0.17) < 1e-9
+    assert abs(recorded.loc["2023-04", "GSTAmount"] - recorded.loc["2023-04", "TotalSurcharge"] * 0.20) < 1e-9
+
+
+# Surcharge months as the shipped Surcharge.csv writes them ("01/01/2025") apply from January 2025
+# only, in the in-memory index and in the SQL that records surcharges
+def test_day_first_surcharge_months(db):
+    with db.transaction() as conn:
+        conn.execute("""
+            INSERT INTO Surcharge (SurchargeTypeID, RatePerUnit, UnitsFrom, UnitsTo, EffectiveMonth)
+            SELECT SurchargeTypeID, 100.0, NULL, NULL, '01/01/2025' FROM SurchargeType WHERE TypeName = 'Fuel Charge'
+        """)
+        rows = pd.read_sql_query(SURCHARGE_QUERY, conn)
+        amounts = get_surcharge_amounts(conn, "Flat-0000001", [("2023-06", "Fuel Charge")])
+
+    fuel = SurchargeRates(rows)
+    assert "2025-01" in fuel.types["Fuel Charge"][0]
+    assert fuel.matches("Fuel Charge", [100, 100], ["2023-06", "2025-02"])[2].max() == 100 * 100.0
+    assert fuel.amounts("Fuel Charge", [100], "2023-06")[0] < 100 * 100.0
+    assert amounts["RatePerUnit"].iloc[0] < 100.0
+
+
+
+# The cached index is read again once the rates may have changed: committed by another connection
+# (the CLI, a second server, manual SQL) or written by this one
+def test_cached_index_follows_rate_edits(db):
+    with db.connection() as conn:
+        assert get_rate_index(conn).gst.rate("2023-06") == 17.0
+        assert get_rate_index(conn) is get_rate_index(conn)
+
+        other = sqlite3.connect(db.path)
+        other.execute("UPDATE GSTRates SET GST = 18.0")
+        other.commit()
+        other.close()
+        assert get_rate_index(conn).gst.rate("2023-06") == 18.0
+
+        conn.execute("UPDATE ElectricDutyRates SET ElectricDuty = 2.0")
+        assert get_rate_index(conn).electric_duty.rate("2023-06") == 2.0
+        conn.rollback()
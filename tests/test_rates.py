@@ -0,0 +1,45 @@
+# Description: Cached rate tables: hits, TTL expiry and write-through invalidation once the upsert commits.
+import pytest
+
+from billing.rate_index import get_rate_index
+from billing.rates import RateCache, get_cached_table, get_gst_rates, upsert_electric_duty_rate, upsert_gst_rate
+
+
+def test_cache_hits_and_ttl():
+    cache, loads = RateCache(ttl=60), []
+    assert cache.get("key", lambda: loads.append(1) or len(loads)) == 1
+    assert cache.get("key", lambda: loads.append(1) or len(loads)) == 1
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1, "hit_rate": 0.5}
+
+    expired = RateCache(ttl=0)
+    assert [expired.get("key", lambda: loads.append(1) or len(loads)) for _ in range(2)] == [2, 3]
+
+
+# An upsert drops only its own table's copy, and the as-of rate index with it
+def test_upsert_invalidates_its_table(db):
+    gst, users = get_gst_rates(db), get_cached_table(db, "Users")
+    assert get_gst_rates(db) is gst
+    with db.connection() as conn:
+        assert get_rate_index(conn).gst.rate("2023-05") == 17.0
+
+    upsert_gst_rate(db, 18.0, "2023-04-01")
+    assert get_gst_rates(db)["GST"].tolist() == [17.0, 18.0]
+    assert get_cached_table(db, "Users") is users
+    with db.connection() as conn:
+        assert get_rate_index(conn).gst.rate("2023-05") == 18.0
+
+
+# Inside an outer transaction the cached copy is kept until the commit, and a rollback keeps it
+def test_invalidation_waits_for_the_commit(db):
+    duty = get_cached_table(db, "ElectricDutyRates")
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            upsert_electric_duty_rate(db, 2.0, "2023-04-01")
+            assert get_cached_table(db, "ElectricDutyRates") is duty
+            raise RuntimeError("rolled back")
+    assert get_cached_table(db, "ElectricDutyRates") is duty
+
+    with db.transaction():
+        upsert_electric_duty_rate(db, 2.0, "2023-04-01")
+        assert get_cached_table(db, "ElectricDutyRates") is duty
+    assert get_cached_table(db, "ElectricDutyRates")["ElectricDuty"].tolist() == [1.5, 2.0]
@@ -0,0 +1,88 @@
+# Description: Bulk meter-reading import: chunked reads, the rejected-row file and re-billing of back-filled months.
+import io
+import shutil
+
+import pandas as pd
+
+from billing.crud import delete_bill
+from billing.reading_import import import_readings
+from billing.schema import open_database
+from conftest import FLATS
+
+FLAT = "Flat-0000003"
+
+JULY_QUERY = """
+    SELECT br.FlatNo, br.PreviousReading, br.PresentReading, bc.PayableAmountPaisa
+    FROM BillingReadings br JOIN BillingCharges bc ON bc.ReadingID = br.ReadingID
+    WHERE br.BillingMonth = '2023-07' ORDER BY br.FlatNo
+"""
+
+
+def _reading(conn, flat_no, month):
+    return conn.execute("SELECT PresentReading FROM BillingReadings WHERE FlatNo = ? AND BillingMonth = ?",
+                        (flat_no, month)).fetchone()[0]
+
+
+# A July reading for every flat, with bad rows mixed in; returns the CSV and the errors expected, by file row,
+# when it is read 7 rows at a time
+def _july_csv(db):
+    with db.connection() as conn:
+        june = dict(conn.execute("SELECT FlatNo, PresentReading FROM BillingReadings WHERE BillingMonth = '2023-06'"))
+    lines, bad = ["FlatNo,BillingMonth,PresentReading,UnitsAdjusted"], {}
+    for flat_no, reading in sorted(june.items()):
+        lines.append(f"{flat_no},2023-07,{reading + 180},")
+        if len(lines) % 9 == 0:
+            bad[len(lines) + 1] = "Unknown FlatNo"
+            lines.append(f"Flat-X,2023-07,{reading},")
+    # Its first reading was written with an earlier chunk
+    bad[len(lines) + 1] = "Reading already recorded for this month"
+    lines.append(f"{FLAT},2023-07,{june[FLAT] + 200},")
+    bad[len(lines) + 1] = "Invalid BillingMonth (expected YYYY-MM)"
+    lines.append(f"{FLAT},2023-13,{june[FLAT] + 200},")
+    bad[len(lines) + 1] = "Reading already recorded for this month"
+    lines.append(f"{FLAT},2023-06,{june[FLAT]},")
+    return "\n".join(lines) + "\n", bad
+
+
+def _import(db, chunk_size):
+    source, bad = _july_csv(db)
+    errors = io.StringIO()
+    result = import_readings(db, io.StringIO(source), errors, chunk_size=chunk_size)
+    with db.connection() as conn:
+        bills = pd.read_sql_query(JULY_QUERY, conn)
+    errors.seek(0)
+    return result, bills, pd.read_csv(errors), bad
+
+
+# Small chunks bill the same as one chunk, and every rejected row is reported once under a single header
+def test_chunked_import_matches_single_chunk(db, colony_path, tmp_path):
+    result, bills, rejected, bad = _import(db, chunk_size=7)
+    assert result == {"imported": FLATS, "rejected": len(bad), "rebilled": 0}
+    assert (bills["PayableAmountPaisa"] > 0).all()
+    assert list(rejected.columns) == ["Row", "FlatNo", "BillingMonth", "PresentReading", "UnitsAdjusted", "Error"]
+    assert rejected["Row"].tolist() == sorted(bad)
+    assert dict(zip(rejected["Row"], rejected["Error"])) == bad
+
+    path = str(tmp_path / "single.db")
+    shutil.copyfile(colony_path, path)
+    single = open_database(path)
+    try:
+        single_result, single_bills, _, _ = _import(single, chunk_size=10000)
+    finally:
+        single.close()
+    assert single_result == result
+    pd.testing.assert_frame_equal(single_bills, bills)
+
+
+# Importing a missing March re-bills April from the new reading
+def test_backfilled_month_rebills_the_next(db):
+    with db.connection() as conn:
+        february = _reading(conn, FLAT, "2023-02")
+    assert delete_bill(db, FLAT, "2023-03")
+
+    source = f"FlatNo,BillingMonth,PresentReading\n{FLAT},2023-03,{february + 90}\n"
+    result = import_readings(db, io.StringIO(source), io.StringIO())
+    assert result == {"imported": 1, "rejected": 0, "rebilled": 1}
+    with db.connection() as conn:
+        assert conn.execute("SELECT PreviousReading FROM BillingReadings WHERE FlatNo = ? AND BillingMonth = '2023-04'",
+                            (FLAT,)).fetchone()[0] == february + 90
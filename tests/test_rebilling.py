@@ -0,0 +1,78 @@
+# Description: Cascading re-billing after a past reading is corrected or removed.
+import numpy as np
+import pandas as pd
+
+from billing.crud import delete_bill, update_bill
+from billing.money import to_paisa
+
+FLAT = "Flat-0000003"
+
+# Each bill's Surcharge next to what its recorded surcharges come to with GST and Electric Duty
+BREAKDOWN_QUERY = """
+    SELECT br.BillingMonth, br.PreviousReading, br.PresentReading, bc.Surcharge, bc.SurchargePaisa,
+           bc.NetAmountPaisa, bc.PayableAmountPaisa,
+           COALESCE(gd.TotalSurcharge + gd.GSTAmount + gd.ElectricDutyAmount, 0) AS Recorded
+    FROM BillingReadings br JOIN BillingCharges bc ON bc.ReadingID = br.ReadingID
+    LEFT JOIN SurchargeGSTDuty gd ON gd.ReadingID = br.ReadingID
+    WHERE br.FlatNo = ? ORDER BY br.BillingMonth
+"""
+
+
+def _bills(db, flat_no=FLAT):
+    with db.connection() as conn:
+        return pd.read_sql_query(BREAKDOWN_QUERY, conn, params=(flat_no,)).set_index("BillingMonth")
+
+
+def _assert_bills_agree(bills):
+    assert ((bills["Surcharge"] - bills["Recorded"]).abs() < 0.01).all(), bills
+    assert (bills["PayableAmountPaisa"] == bills["NetAmountPaisa"] + bills["SurchargePaisa"]).all()
+
+
+# A corrected March re-bills April; both bills' surcharges follow their re-priced breakdowns
+def test_correction_keeps_surcharges_in_step(db):
+    before = _bills(db)
+    _assert_bills_agree(before)
+
+    result = update_bill(db, FLAT, "2023-03", present_reading=before.loc["2023-03", "PresentReading"] + 400)
+    after = _bills(db)
+    assert result["Rebilled"] == ["2023-04"]
+    assert after.loc["2023-04", "PreviousReading"] == after.loc["2023-03", "PresentReading"]
+    assert after.loc["2023-03", "Recorded"] != before.loc["2023-03", "Recorded"]
+    _assert_bills_agree(after)
+    assert result["SurchargePaisa"] == after.loc["2023-03", "SurchargePaisa"]
+    assert result["PayableAmountPaisa"] == after.loc["2023-03", "PayableAmountPaisa"]
+
+
+# Deleting March re-bills April from a previous reading of 0, as a new April bill would get
+def test_delete_rebills_the_next_month(db):
+    before = _bills(db)
+    assert delete_bill(db, FLAT, "2023-03")
+    after = _bills(db)
+    assert "2023-03" not in after.index
+    assert after.loc["2023-04", "PreviousReading"] == 0
+    assert after.loc["2023-04", "Recorded"] != before.loc["2023-04", "Recorded"]
+    assert after.loc["2023-05", "PreviousReading"] == before.loc["2023-05", "PreviousReading"]
+    _assert_bills_agree(after)
+    with db.connection() as conn:
+        assert conn.execute("""
+            SELECT CorrectionStatus FROM BillingReadings WHERE FlatNo = ? AND BillingMonth = '2023-04'
+        """, (FLAT,)).fetchone()[0] == "Corrected"
+    assert not delete_bill(db, FLAT, "2023-03")
+
+
+# Re-billed months charge GST and Electric Duty (17% and 1.5% in the colony) on their new variable charges
+def test_rebilled_taxes_follow_variable_charges(db):
+    before = _bills(db)
+    update_bill(db, FLAT, "2023-03", present_reading=before.loc["2023-03", "PresentReading"] + 400)
+    delete_bill(db, FLAT, "2023-05")
+    with db.connection() as conn:
+        bills = pd.read_sql_query("""
+            SELECT br.BillingMonth, bc.VariableCharges, bc.VariableChargesPaisa, bc.ElectricDutyPaisa, bc.GSTPaisa
+            FROM BillingReadings br JOIN BillingCharges bc ON bc.ReadingID = br.ReadingID
+            WHERE br.FlatNo = ? AND br.BillingMonth IN ('2023-04', '2023-06')
+        """, conn, params=(FLAT,)).set_index("BillingMonth")
+
+    assert len(bills) == 2
+    variable = bills["VariableCharges"].to_numpy()
+    np.testing.assert_array_equal(bills["ElectricDutyPaisa"], to_paisa(variable * (1.5 / 100)))
+    np.testing.assert_array_equal(bills["GSTPaisa"], to_paisa(variable * (17.0 / 100)))
@@ -0,0 +1,34 @@
+# Description: General Search through the FTS5 shadow indexes.
+from billing import search_index
+from billing.search_index import ensure_search_indexes, rebuild_search_index
+from billing.table_query import count_rows, fetch_page
+
+FLAT = "Flat-0000003"
+
+
+# A number finds the flat it is part of, as the LIKE search did
+def test_search_by_flat_number(db):
+    with db.connection() as conn:
+        users = fetch_page(conn, "Users", search="0000003")
+        assert users["FlatNo"].tolist() == [FLAT]
+        assert fetch_page(conn, "Users", search=FLAT)["FlatNo"].tolist() == [FLAT]
+
+
+# Hyphenated terms match as a phrase: the flat's March reading only
+def test_hyphenated_terms(db):
+    with db.connection() as conn:
+        readings = fetch_page(conn, "BillingReadings", search=f"{FLAT} 2023-03")
+        assert readings[["FlatNo", "BillingMonth"]].values.tolist() == [[FLAT, "2023-03"]]
+        assert count_rows(conn, "BillingReadings", search="Flat-0000003 2023-13") == 0
+
+
+# Indexes built with the old tokenizer ('-' kept inside tokens) are rebuilt on the next start
+def test_old_tokenizer_is_rebuilt(db, monkeypatch):
+    with db.transaction() as conn:
+        with monkeypatch.context() as patch:
+            patch.setattr(search_index, "FTS_TOKENIZER", "unicode61 tokenchars '-.'")
+            rebuild_search_index(conn, "Users")
+        assert fetch_page(conn, "Users", search="0000003").empty
+        assert ensure_search_indexes(conn) == ["Users"]
+        assert fetch_page(conn, "Users", search="0000003")["FlatNo"].tolist() == [FLAT]
+        assert ensure_search_indexes(conn) == []
@@ -0,0 +1,56 @@
+# Description: Server-side table views: whitelisted filters and identifiers, and SQL pagination.
+import pandas as pd
+import pytest
+
+from billing.table_query import count_rows, fetch_page
+from conftest import FLATS, MONTHS
+
+FLAT = "Flat-0000003"
+
+
+# Pages are consecutive slices of the ordered table; the last one is short and past it is empty
+def test_pages_cover_the_table_once(db):
+    with db.connection() as conn:
+        total = count_rows(conn, "BillingReadings")
+        assert total == FLATS * MONTHS
+        pages = [fetch_page(conn, "BillingReadings", order_by="ReadingID", page=page, page_size=70)
+                 for page in range(1, 6)]
+        everything = fetch_page(conn, "BillingReadings", order_by="ReadingID", page_size=None)
+    assert [len(page) for page in pages] == [70, 70, 70, 30, 0]
+    pd.testing.assert_frame_equal(pd.concat(pages[:4], ignore_index=True), everything)
+    assert everything["ReadingID"].is_monotonic_increasing
+
+
+def test_descending_order_and_page_zero(db):
+    with db.connection() as conn:
+        first = fetch_page(conn, "BillingReadings", order_by="ReadingID", descending=True, page=0, page_size=3)
+        highest = conn.execute("SELECT MAX(ReadingID) FROM BillingReadings").fetchone()[0]
+    assert first["ReadingID"].tolist() == [highest, highest - 1, highest - 2]
+
+
+def test_filters(db):
+    with db.connection() as conn:
+        readings = fetch_page(conn, "BillingReadings", filters={"FlatNo": FLAT, "BillingMonth": ""}, page_size=None)
+        assert readings["FlatNo"].unique().tolist() == [FLAT] and len(readings) == MONTHS
+        charges = fetch_page(conn, "BillingCharges", filters={"FlatNo": FLAT, "BillingMonth": "2023-03"})
+        assert len(charges) == 1
+        assert charges["ReadingID"][0] in readings.loc[readings["BillingMonth"] == "2023-03", "ReadingID"].tolist()
+        name = conn.execute("SELECT Name FROM Users WHERE FlatNo = ?", (FLAT,)).fetchone()[0]
+        assert FLAT in fetch_page(conn, "Users", filters={"Name": name[1:-1].lower()})["FlatNo"].tolist()
+        assert count_rows(conn, "Users", filters={"Name": name[1:-1]}) >= 1
+
+
+# Only known tables, filters and columns reach the SQL text
+@pytest.mark.parametrize("call", [
+    lambda conn: fetch_page(conn, "Users; DROP TABLE Users"),
+    lambda conn: fetch_page(conn, "Users", filters={"Location": "Block A"}),
+    lambda conn: fetch_page(conn, "BillingReadings", filters={"1=1 OR FlatNo": "x"}),
+    lambda conn: fetch_page(conn, "Users", order_by="Name; DROP TABLE Users"),
+    lambda conn: count_rows(conn, "NoSuchTable"),
+])
+def test_unknown_identifiers_are_rejected(db, call):
+    with db.connection() as conn:
+        users = conn.execute("SELECT COUNT(*) FROM Users").fetchone()[0]
+        with pytest.raises(ValueError):
+            call(conn)
+        assert count_rows(conn, "Users") == users
@@ -0,0 +1,40 @@
+# Description: Tariff slab resolution and the cached slab index.
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from billing.tariff import TariffIndex, get_tariff_index
+
+
+def _slabs(top_max):
+    return pd.DataFrame({"MinUnits": [0, 101, 701], "MaxUnits": [100, 700, top_max], "RatePerUnit": [10.0, 20.0, 30.0],
+                         "RateEffectiveDate": ["1-10-2024"] * 3})
+
+
+# MaxUnits is NOT NULL, so the open 701+ slab is written as 0 (or NULL, or not above its MinUnits)
+@pytest.mark.parametrize("top_max", [None, 0, 701])
+def test_open_top_slab(top_max):
+    assert TariffIndex(_slabs(top_max)).rate([50, 150, 800, 1e6]).tolist() == [10.0, 20.0, 30.0, 30.0]
+
+
+# A top slab with a real MaxUnits caps only the units above it
+def test_top_slab_ceiling():
+    assert TariffIndex(_slabs(1000)).rate([50, 800, 1000, 1001]).tolist() == [10.0, 30.0, 30.0, 0.0]
+
+
+# Slab edits made outside the app, or on the same connection, reach the cached index without an invalidate
+def test_cached_index_follows_slab_edits(db):
+    with db.connection() as conn:
+        before = get_tariff_index(conn).rate(150, "2023-06")
+        assert get_tariff_index(conn) is get_tariff_index(conn)
+
+        other = sqlite3.connect(db.path)
+        other.execute("UPDATE TariffSlabs SET RatePerUnit = RatePerUnit * 2")
+        other.commit()
+        other.close()
+        assert get_tariff_index(conn).rate(150, "2023-06") == pytest.approx(before * 2)
+
+        conn.execute("UPDATE TariffSlabs SET RatePerUnit = RatePerUnit / 2")
+        assert get_tariff_index(conn).rate(150, "2023-06") == pytest.approx(before)
+        conn.rollback()
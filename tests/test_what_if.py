@@ -0,0 +1,30 @@
+# Description: Tariff what-if scenarios re-priced over the synthetic colony's history.
+import numpy as np
+import pandas as pd
+import pytest
+
+from billing.what_if import BillingHistory, scaled_slabs, simulate
+
+
+def _variable_and_taxes(conn):
+    return pd.read_sql_query("SELECT SUM(VariableCharges), SUM(ElectricDuty + GST) FROM BillingCharges", conn).iloc[0]
+
+
+# Today's tariff re-priced is the recorded history
+def test_current_tariff_changes_nothing(db):
+    with db.connection() as conn:
+        history = BillingHistory.load(conn, include_archive=False)
+        summary = simulate(history, {"same": {"slabs": scaled_slabs(conn, 1.0)}})["summary"].iloc[0]
+    assert summary["Bills"] == len(history) > 0
+    assert abs(summary["Delta"]) < 0.01 * len(history)
+
+
+# GST and Electric Duty (18.5% of the variable charges in the colony) move with the scaled rates
+def test_scaled_tariff_moves_taxes_with_it(db):
+    with db.connection() as conn:
+        variable, taxes = _variable_and_taxes(conn)
+        history = BillingHistory.load(conn, include_archive=False)
+        results = simulate(history, {"x1.1": {"slabs": scaled_slabs(conn, 1.1)}})
+    assert taxes == pytest.approx(variable * 0.185, rel=1e-4)
+    assert results["summary"].iloc[0]["Delta"] == pytest.approx((variable + taxes) * 0.1, rel=1e-4)
+    np.testing.assert_allclose(results["by_month"]["Delta"].sum(), results["summary"].iloc[0]["Delta"])
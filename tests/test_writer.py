@@ -0,0 +1,124 @@
+# Description: Group-commit writer: shutdown while sessions are still submitting, what a failed request
+# leaves behind, and the app's other writers queued on it.
+import sys
+import threading
+import time
+
+import pytest
+
+from billing.jobs import JobRunner, get_job
+from billing.surcharges import record_month_surcharges
+from billing.writer import WriteQueue
+
+
+def touch(db):
+    with db.transaction() as conn:
+        conn.execute("UPDATE Users SET Name = Name WHERE PersonID = (SELECT MIN(PersonID) FROM Users)")
+
+
+# Sessions keep submitting while the writer closes: a request is either refused or resolved,
+# never left queued behind the stop marker. Thread switches are forced often to hit the window.
+def test_every_accepted_request_resolves_across_close(db):
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for _ in range(20):
+            writer, futures = WriteQueue(db), []
+
+            def submit_until_closed():
+                while True:
+                    try:
+                        futures.append(writer.submit(touch))
+                    except RuntimeError:
+                        return
+
+            threads = [threading.Thread(target=submit_until_closed) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.001)
+            writer.close()
+            for thread in threads:
+                thread.join()
+            assert all(future.done() for future in futures)
+    finally:
+        sys.setswitchinterval(switch_interval)
+    with pytest.raises(RuntimeError):
+        writer.submit(touch)
+
+
+def test_rolled_back_request_drops_its_after_commit_callbacks(db):
+    ran = []
+
+    def register_then_fail(db):
+        touch(db)
+        db.after_commit(lambda: ran.append("failed"))
+        raise ValueError("rejected")
+
+    def register(db):
+        touch(db)
+        db.after_commit(lambda: ran.append("saved"))
+
+    writer = WriteQueue(db)
+    try:
+        failed = writer.submit(register_then_fail)
+        saved = writer.submit(register)
+        with pytest.raises(ValueError):
+            failed.result(timeout=5)
+        saved.result(timeout=5)
+    finally:
+        writer.close()
+    assert ran == ["saved"]
+
+
+# A callback failing after COMMIT is logged; the committed requests still get their results
+def test_failing_after_commit_callback_keeps_results(db, caplog):
+    ran = []
+
+    def register_broken(db):
+        touch(db)
+        db.after_commit(lambda: 1 / 0)
+        return "broken"
+
+    def register(db):
+        touch(db)
+        db.after_commit(lambda: ran.append("saved"))
+        return "saved"
+
+    writer = WriteQueue(db)
+    try:
+        futures = [writer.submit(register_broken), writer.submit(register)]
+        assert [future.result(timeout=5) for future in futures] == ["broken", "saved"]
+    finally:
+        writer.close()
+    assert ran == ["saved"]
+    assert "after_commit callback" in caplog.text
+
+
+# A job runner given the writer queues every Jobs write on it: recovery, submit, claim and finish
+def test_job_runner_writes_through_the_writer(db, tmp_path):
+    writer = WriteQueue(db)
+    try:
+        runner = JobRunner(db, jobs_dir=str(tmp_path), writer=writer)
+        job_id, created = runner.submit("bulk_pdf", "2099-01")
+        runner.shutdown()
+        assert created and get_job(db, job_id)["Status"] == "Failed"
+        assert writer.stats()["requests"] == 4
+    finally:
+        writer.close()
+
+
+def test_month_surcharges_queue_on_the_writer(db):
+    writer = WriteQueue(db)
+    try:
+        with db.connection() as conn:
+            conn.execute("DELETE FROM SurchargeGSTDuty")
+            conn.commit()
+            types = [row[0] for row in conn.execute("SELECT TypeName FROM SurchargeType")]
+        writer.call(record_month_surcharges, "2023-06", types)
+    finally:
+        writer.close()
+    with db.connection() as conn:
+        assert conn.execute("""
+            SELECT COUNT(*) FROM SurchargeGSTDuty gd JOIN BillingReadings br ON br.ReadingID = gd.ReadingID
+            WHERE br.BillingMonth = '2023-06'
+        """).fetchone()[0] > 0